@@ -1,9 +1,66 @@
-from django.contrib import admin
-from django.utils.safestring import mark_safe
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count
+from django.http import (
+    FileResponse, Http404, HttpResponse, StreamingHttpResponse
+)
+from django.shortcuts import redirect
+from django.template.defaultfilters import pluralize
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 import os
 from .models import (
-    TimeSlot, Reservation, MenuCategory, MenuItem
+    ALLERGENS, TimeSlot, Reservation, MenuCategory, MenuItem
+)
+from .bulk import cancel_reservations, move_reservations
+from .exports import csv_lines, filter_reservations
+from .images import sized_image_url
+from .menu_io import MenuImportError, export_menu, import_menu, parse_menu
+from .occupancy import (
+    SlotCapacityError,
+    delete_reservation,
+    ledger_transaction,
+    release_reservations,
+    save_reservation,
 )
+from .profiling import capture_file_path, list_captures
+from .search import allergen_pattern, filter_by_search
+from .uploads import save_with_deferred_image
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts PostgreSQL's row estimate for huge tables.
+
+    ``COUNT(*)`` over millions of rows is a full scan on PostgreSQL. For
+    an unfiltered changelist the planner's estimate from ``pg_class`` is
+    close enough to size the page links, so it is used once the table is
+    larger than ``estimate_threshold``. Filtered lists, smaller tables and
+    other databases get an exact count.
+    """
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > self.estimate_threshold:
+                return int(row[0])
+        return super().count
 
 
 @admin.register(TimeSlot)
@@ -13,6 +70,38 @@ class TimeSlotAdmin(admin.ModelAdmin):
     list_editable = ('is_active',)
 
 
+class MoveReservationsForm(forms.Form):
+    """New date and/or slot for the move reservations admin action."""
+    date = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={'type': 'date'}),
+        help_text='Leave blank to keep each reservation\'s date'
+    )
+    time_slot = forms.ModelChoiceField(
+        TimeSlot.objects.order_by('start_time'), required=False,
+        help_text='Leave blank to keep each reservation\'s time slot'
+    )
+    enforce_capacity = forms.BooleanField(
+        required=False, initial=True,
+        help_text='Refuse the move if it would overbook a time slot'
+    )
+    notify = forms.BooleanField(
+        required=False, initial=True, help_text='Email each guest'
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('date') and not cleaned_data.get('time_slot'):
+            raise forms.ValidationError('Choose a new date or time slot.')
+        return cleaned_data
+
+
+class CancelReservationsForm(forms.Form):
+    """Confirmation step of the cancel reservations admin action."""
+    notify = forms.BooleanField(
+        required=False, initial=True, help_text='Email each guest'
+    )
+
+
 @admin.register(Reservation)
 class ReservationAdmin(admin.ModelAdmin):
     """
@@ -22,23 +111,143 @@ class ReservationAdmin(admin.ModelAdmin):
     """
     list_display = ('name', 'date', 'time_slot', 'guests', 'is_cancelled')
     list_filter = ('date', 'is_cancelled')
+    list_select_related = ('time_slot',)
     search_fields = ('name', 'email')
+    date_hierarchy = 'date'
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) shown next to search results
+    show_full_result_count = False
+
+    actions = ('export_csv', 'cancel_selected', 'move_selected')
+
+    @admin.action(
+        description='Cancel selected reservations and email guests',
+        permissions=('change',)
+    )
+    def cancel_selected(self, request, queryset):
+        """Confirm, then cancel the selection in one transaction."""
+        form = CancelReservationsForm(
+            request.POST if 'apply' in request.POST else None
+        )
+        if form.is_valid():
+            count = cancel_reservations(
+                queryset, notify=form.cleaned_data['notify']
+            )
+            self.message_user(
+                request, f'Cancelled {count} reservations.', messages.SUCCESS
+            )
+            return None
+
+        count = queryset.filter(is_cancelled=False).count()
+        return self._bulk_action_page(
+            request, 'cancel_selected', form, 'Cancel reservations',
+            f'Cancel {count} active reservation{pluralize(count)}? '
+            'Their seats are released at once.'
+        )
+
+    @admin.action(
+        description='Move selected reservations to another date or time',
+        permissions=('change',)
+    )
+    def move_selected(self, request, queryset):
+        """Ask for the new date/slot, then move the selection at once."""
+        form = MoveReservationsForm(
+            request.POST if 'apply' in request.POST else None
+        )
+        if form.is_valid():
+            try:
+                count = move_reservations(
+                    queryset, date=form.cleaned_data['date'],
+                    time_slot=form.cleaned_data['time_slot'],
+                    enforce_capacity=form.cleaned_data['enforce_capacity'],
+                    notify=form.cleaned_data['notify']
+                )
+            except SlotCapacityError as e:
+                form.add_error(None, f'Nothing was moved. {e}')
+            else:
+                self.message_user(
+                    request, f'Moved {count} reservations.', messages.SUCCESS
+                )
+                return None
+
+        count = queryset.filter(is_cancelled=False).count()
+        return self._bulk_action_page(
+            request, 'move_selected', form, 'Move reservations',
+            f'Move {count} active reservation{pluralize(count)} to a new '
+            'date and/or time slot. Cancelled reservations are left where '
+            'they are.'
+        )
+
+    def _bulk_action_page(self, request, action, form, title, intro):
+        """Intermediate page asking for an action's options."""
+        return TemplateResponse(
+            request, 'admin/reservations/reservation/bulk_action.html', {
+                **self.admin_site.each_context(request),
+                'opts': self.model._meta,
+                'form': form,
+                'action': action,
+                'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+                'select_across': request.POST.get('select_across', '0'),
+                'title': title,
+                'intro': intro,
+            }
+        )
+
+    @admin.action(
+        description='Export selected reservations as CSV',
+        permissions=('view',)
+    )
+    def export_csv(self, request, queryset):
+        """
+        Stream the selected reservations as a CSV file (Excel-friendly).
+
+        With "select all" this covers every reservation matching the
+        changelist filters, however many there are.
+        """
+        response = StreamingHttpResponse(
+            csv_lines(filter_reservations(queryset), excel=True),
+            content_type='text/csv; charset=utf-8'
+        )
+        filename = f'reservations-{timezone.localdate():%Y%m%d}.csv'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def save_model(self, request, obj, form, change):
+        """Keep the slot occupancy ledger in step with admin edits."""
+        # Staff may deliberately overbook, so capacity is not enforced
+        save_reservation(obj, enforce_capacity=False)
+
+    def delete_model(self, request, obj):
+        """Release the reservation's guests from the ledger."""
+        delete_reservation(obj)
+
+    def delete_queryset(self, request, queryset):
+        """Release the selection's seats in bulk, then delete it at once."""
+        with ledger_transaction():
+            release_reservations(queryset)
+            queryset.delete()
 
 
 class MenuItemInline(admin.TabularInline):
     model = MenuItem
     extra = 1
-    fields = ('name', 'price', 'is_available', 'order', 'image_preview')
+    fields = (
+        'name', 'price', 'is_available', 'order', 'image', 'image_preview'
+    )
     readonly_fields = ('image_preview',)
 
     def image_preview(self, obj):
+        if obj.image_status == MenuItem.IMAGE_PENDING:
+            return "Uploading..."
         if obj.image:
             try:
-                # Convert to string to get the URL (works for CloudinaryField)
-                image_url = str(obj.image)
-                return mark_safe(
+                # 100px square thumbnail (50px displayed, sharp on 2x)
+                image_url = sized_image_url(
+                    obj.image, 100, height=100, crop='fill'
+                )
+                return format_html(
                     '<img src="{}" width="50" height="50" '
-                    'style="object-fit: cover;" />'.format(image_url)
+                    'style="object-fit: cover;" />', image_url
                 )
             except Exception as e:
                 return "Error: {}".format(str(e))
@@ -53,31 +262,182 @@ class MenuCategoryAdmin(admin.ModelAdmin):
     list_editable = ('order',)
     inlines = [MenuItemInline]
 
+    def get_queryset(self, request):
+        """Count each category's items in the changelist query itself."""
+        return super().get_queryset(request).annotate(
+            item_count=Count('menu_items')
+        )
+
     def menu_item_count(self, obj):
-        return obj.menu_items.count()
+        return obj.item_count
 
     menu_item_count.short_description = 'Menu Items'
+    menu_item_count.admin_order_field = 'item_count'
+
+    def save_formset(self, request, form, formset, change):
+        """Upload inline images in parallel after the save commits."""
+        if formset.model is not MenuItem:
+            return super().save_formset(request, form, formset, change)
+        for item in formset.save(commit=False):
+            save_with_deferred_image(item)
+        for item in formset.deleted_objects:
+            item.delete()
+        formset.save_m2m()
+
+
+class FreeFromFilter(admin.SimpleListFilter):
+    """Changelist filter showing items that do not contain an allergen."""
+    title = 'free from'
+    parameter_name = 'free_from'
+
+    def lookups(self, request, model_admin):
+        return [(allergen, allergen.title()) for allergen in ALLERGENS]
+
+    def queryset(self, request, queryset):
+        if self.value() in ALLERGENS:
+            return queryset.exclude(
+                allergens__iregex=allergen_pattern(self.value())
+            )
+        return queryset
+
+
+class MenuImportForm(forms.Form):
+    """Upload form for the menu import admin view."""
+    file = forms.FileField(help_text='CSV or JSON written by the export')
+    delete_missing = forms.BooleanField(
+        required=False,
+        help_text='Delete items and categories that are not in the file'
+    )
+    dry_run = forms.BooleanField(
+        required=False, help_text='Show what would change without saving'
+    )
 
 
 @admin.register(MenuItem)
 class MenuItemAdmin(admin.ModelAdmin):
     list_display = (
         'name', 'category', 'price', 'is_available',
-        'is_featured', 'order', 'image_preview'
+        'is_featured', 'order', 'image_preview', 'image_status'
     )
-    list_filter = ('category', 'is_available', 'is_featured')
+    list_filter = ('category', 'is_available', 'is_featured', FreeFromFilter)
+    list_select_related = ('category',)
     list_editable = ('price', 'is_available', 'is_featured', 'order')
-    search_fields = ('name', 'description', 'ingredients')
-    readonly_fields = ('image_preview',)
+    search_fields = ('name', 'description', 'ingredients', 'allergens')
+    actions = ('export_csv', 'export_json')
+    change_list_template = 'admin/reservations/menuitem/change_list.html'
+    readonly_fields = ('image_preview', 'image_status')
+
+    def save_model(self, request, obj, form, change):
+        """Save without waiting for a new image to upload."""
+        save_with_deferred_image(obj)
+
+    def _export(self, queryset, fmt, content_type):
+        response = HttpResponse(
+            export_menu(fmt, queryset), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="menu.{fmt}"'
+        )
+        return response
+
+    @admin.action(
+        description='Export selected items as CSV',
+        permissions=('view',)
+    )
+    def export_csv(self, request, queryset):
+        return self._export(queryset, 'csv', 'text/csv')
+
+    @admin.action(
+        description='Export selected items as JSON',
+        permissions=('view',)
+    )
+    def export_json(self, request, queryset):
+        return self._export(queryset, 'json', 'application/json')
+
+    def get_urls(self):
+        return [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_view),
+                name='reservations_menuitem_import'
+            ),
+        ] + super().get_urls()
+
+    def has_import_permission(self, request):
+        """An import adds, changes and (optionally) deletes menu items."""
+        return (
+            self.has_add_permission(request)
+            and self.has_change_permission(request)
+            and self.has_delete_permission(request)
+        )
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {
+            'has_import_permission': self.has_import_permission(request),
+            **(extra_context or {}),
+        }
+        return super().changelist_view(request, extra_context)
+
+    def import_view(self, request):
+        """Import the menu from an uploaded CSV or JSON file."""
+        if not self.has_import_permission(request):
+            return redirect('admin:index')
+
+        form = MenuImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            fmt = 'json' if upload.name.lower().endswith('.json') else 'csv'
+            try:
+                rows = parse_menu(upload.read().decode('utf-8-sig'), fmt)
+            except (MenuImportError, UnicodeDecodeError) as e:
+                form.add_error('file', str(e))
+            else:
+                dry_run = form.cleaned_data['dry_run']
+                stats = import_menu(
+                    rows, delete_missing=form.cleaned_data['delete_missing'],
+                    dry_run=dry_run
+                )
+                summary = ', '.join(
+                    f'{count} {label.replace("_", " ")}'
+                    for label, count in stats.items() if count
+                )
+                messages.success(
+                    request,
+                    f'{"Dry run" if dry_run else "Import"}: '
+                    f'{summary or "no changes"}.'
+                )
+                if dry_run:
+                    form = MenuImportForm()
+                else:
+                    return redirect(
+                        'admin:reservations_menuitem_changelist'
+                    )
+
+        return TemplateResponse(
+            request, 'admin/reservations/menuitem/import_menu.html', {
+                **self.admin_site.each_context(request),
+                'opts': self.model._meta,
+                'form': form,
+                'title': 'Import menu',
+            }
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """Search with the menu search index instead of icontains scans."""
+        if not search_term.strip():
+            return queryset, False
+        return filter_by_search(queryset, search_term), False
 
     def image_preview(self, obj):
+        if obj.image_status == MenuItem.IMAGE_PENDING:
+            return "Uploading..."
         if obj.image:
             try:
-                # For CloudinaryField, just convert to string to get the URL
-                image_url = str(obj.image)
-                return mark_safe(
-                    '<img src="{}" style="width: 100px; height: auto;" />'
-                    .format(image_url)
+                # 200px wide copy, displayed at 100px (sharp on 2x)
+                image_url = sized_image_url(obj.image, 200)
+                return format_html(
+                    '<img src="{}" style="width: 100px; height: auto;" />',
+                    image_url
                 )
             except Exception as e:
                 return "Error: {}".format(str(e))
@@ -87,7 +447,9 @@ class MenuItemAdmin(admin.ModelAdmin):
 
     fieldsets = (
         (None, {
-            'fields': ('name', 'category', 'description', 'ingredients')
+            'fields': (
+                'name', 'category', 'description', 'ingredients', 'allergens'
+            )
         }),
         ('Pricing & Availability', {
             'fields': ('price', 'is_available', 'is_featured', 'order')
@@ -97,7 +459,25 @@ class MenuItemAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Image', {
-            'fields': ('image', 'image_preview'),
+            'fields': ('image', 'image_preview', 'image_status'),
             'classes': ('collapse',)
         })
     )
+
+
+def profile_captures_view(request):
+    """Admin page listing recent request profiles (reservations.profiling)."""
+    return TemplateResponse(request, 'admin/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'captures': list_captures(limit=100),
+        'enabled': settings.PROFILING_ENABLED,
+    })
+
+
+def profile_capture_file_view(request, name):
+    """Download one saved profile file."""
+    path = capture_file_path(name)
+    if path is None:
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
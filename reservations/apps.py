@@ -9,3 +9,7 @@ class ReservationsConfig(AppConfig):
 
     # Name of the Django application
     name = 'reservations'
+
+    def ready(self):
+        """Connect cache signal handlers."""
+        from . import signals  # noqa: F401
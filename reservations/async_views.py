@@ -0,0 +1,107 @@
+"""
+Async implementations of the read-heavy endpoints, for ASGI deployments.
+
+``index``, ``menu_view``, ``get_available_slots`` and
+``get_availability_range`` behave exactly like their counterparts in
+``reservations.views`` (same caches, ETags and JSON), but read the
+database through Django's async ORM and the cache through its async API,
+so an ASGI worker can hold many slow requests open without a thread per
+request. ``reservations.urls`` routes to them when ``ASYNC_VIEWS`` is set;
+it is off by default, and WSGI deployments keep the sync views and pay
+nothing for this module.
+
+Templates are still rendered with ``sync_to_async``: the base template
+reads ``request.user`` and the session, which are sync-only in Django
+4.2. Those renders, like Django's async ORM queries, run thread
+sensitive, i.e. one at a time on a single thread per worker, so only
+cache hits are truly concurrent. Compare both deployments with
+``manage.py bench_asgi`` before enabling ``ASYNC_VIEWS``.
+"""
+import logging
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse
+from django.shortcuts import render
+
+from .availability import aavailability_range, acached_available_slots
+from .conditional import availability_api, menu_page
+from .menu_cache import ahomepage_snapshot, amenu_version, menu_cache_timeout
+from .views import availability_range_params, menu_categories
+
+logger = logging.getLogger(__name__)
+
+arender = sync_to_async(render)
+
+
+def alogin_required(view):
+    """``login_required`` for async views (Django 4.2's is sync only)."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # Loading the user reads the session, so it runs in a thread
+        authenticated = await sync_to_async(
+            lambda: request.user.is_authenticated
+        )()
+        if not authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@menu_page
+async def index(request):
+    """Async version of :func:`reservations.views.index`."""
+    try:
+        categories = await ahomepage_snapshot()
+    except Exception as e:
+        logger.error(f"CRITICAL ERROR in index view: {str(e)}", exc_info=True)
+        categories = []
+
+    return await arender(request, 'index.html', {'categories': categories})
+
+
+@menu_page
+async def menu_view(request):
+    """
+    Async version of :func:`reservations.views.menu_view`.
+
+    The categories queryset stays lazy: it is only evaluated, inside the
+    render thread, when the menu fragment cache misses.
+    """
+    context = {
+        'categories': menu_categories(),
+        'menu_version': await amenu_version(),
+        'menu_cache_timeout': menu_cache_timeout(),
+    }
+    return await arender(request, 'reservations/menu.html', context)
+
+
+@alogin_required
+@availability_api
+async def get_available_slots(request):
+    """Async version of :func:`reservations.views.get_available_slots`."""
+    try:
+        selected_date = datetime.strptime(
+            request.GET.get('date'), '%Y-%m-%d'
+        ).date()
+    except (ValueError, TypeError):
+        return JsonResponse(
+            {'error': 'Invalid date format. Expected YYYY-MM-DD'},
+            status=400
+        )
+
+    available_slots = await acached_available_slots(selected_date)
+    return JsonResponse({'available_slots': available_slots})
+
+
+@alogin_required
+async def get_availability_range(request):
+    """Async version of :func:`reservations.views.get_availability_range`."""
+    try:
+        start, end = availability_range_params(request)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    return JsonResponse(await aavailability_range(start, end))
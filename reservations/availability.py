@@ -0,0 +1,539 @@
+"""
+Capacity calculations for reservation time slots.
+
+Booked guests are read from the ``SlotOccupancy`` ledger (see
+``reservations.occupancy``), so remaining capacity for every active slot
+on a date is one indexed join instead of one query per slot followed by
+summing guests in Python. Per-date results are cached and invalidated by
+the signal handlers in ``reservations.signals``.
+"""
+import time
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, FilteredRelation, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import metrics
+from .caching import is_shared
+from .models import Reservation, TimeSlot
+from .occupancy import aledger_totals, booked_guests, ledger_totals
+
+
+def slot_availability(date):
+    """
+    Return active time slots annotated with their booked guests for a date.
+
+    Each slot carries ``booked_guests`` and ``remaining_capacity``
+    annotations. Ledger rows are joined on ``date`` in the JOIN condition
+    so slots without bookings still appear with zero guests.
+
+    Args:
+        date: The reservation date to check
+
+    Returns:
+        QuerySet: Active TimeSlots ordered by start time
+    """
+    return (
+        TimeSlot.objects
+        .filter(is_active=True)
+        .annotate(day_occupancy=FilteredRelation(
+            'occupancy', condition=Q(occupancy__date=date)
+        ))
+        .annotate(booked_guests=Coalesce(
+            F('day_occupancy__booked_guests'), 0
+        ))
+        .annotate(remaining_capacity=F('max_capacity') - F('booked_guests'))
+        .order_by('start_time')
+    )
+
+
+def remaining_capacity(time_slot, date, exclude_reservation_id=None):
+    """
+    Return the number of guest spots left in one time slot on a date.
+
+    Reads the slot's ``SlotOccupancy`` row rather than summing bookings.
+
+    Args:
+        time_slot: TimeSlot instance (or primary key) to check
+        date: The reservation date to check
+        exclude_reservation_id: Reservation to leave out of the totals
+
+    Returns:
+        int: Remaining guest capacity (never below 0)
+    """
+    if not isinstance(time_slot, TimeSlot):
+        time_slot = TimeSlot.objects.filter(pk=time_slot).first()
+        if time_slot is None:
+            return 0
+
+    booked = booked_guests(date, time_slot.pk)
+
+    if exclude_reservation_id is not None:
+        # Give back the guests the excluded booking holds in this slot
+        booked -= Reservation.objects.filter(
+            pk=exclude_reservation_id,
+            date=date,
+            time_slot=time_slot,
+            is_cancelled=False
+        ).values_list('guests', flat=True).first() or 0
+
+    return max(0, time_slot.max_capacity - booked)
+
+
+def available_slots_payload(date):
+    """
+    Build the JSON-serialisable slot list used by the availability API.
+
+    Args:
+        date: The reservation date to check
+
+    Returns:
+        list: One dict per active slot with id, display name,
+        availability flag and remaining spots
+    """
+    return _payload_rows(slot_availability(date))
+
+
+def _payload_rows(slots):
+    """Turn annotated slots into the availability API's slot dicts."""
+    available_slots = []
+    for slot in slots:
+        remaining = max(0, slot.remaining_capacity)
+        available_slots.append({
+            'id': slot.id,
+            'display_name': slot.display_name,
+            'available': remaining > 0,
+            'remaining_slots': remaining,
+        })
+    return available_slots
+
+
+def available_slots_for_dates(dates):
+    """
+    Build :func:`available_slots_payload` for several dates at once.
+
+    Uses one query for the active slots and one ledger read spanning the
+    dates, however many dates are requested.
+
+    Args:
+        dates: Iterable of reservation dates
+
+    Returns:
+        dict: ``{date: slot list}``
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+
+    slots = list(_active_slot_rows())
+    booked = ledger_totals(dates[0], dates[-1])
+
+    payloads = {}
+    for day in dates:
+        payloads[day] = []
+        for slot_id, display_name, capacity in slots:
+            remaining = max(0, capacity - booked.get((day, slot_id), 0))
+            payloads[day].append({
+                'id': slot_id,
+                'display_name': display_name,
+                'available': remaining > 0,
+                'remaining_slots': remaining,
+            })
+    return payloads
+
+
+# Longest window served by the multi-day availability API
+MAX_RANGE_DAYS = 60
+
+
+def availability_range(start, end):
+    """
+    Build a compact date-by-slot matrix of remaining capacity.
+
+    Booked guests for the whole range come from one read of the
+    ``SlotOccupancy`` ledger, which already holds the ``(date, time_slot)``
+    totals; dates and slots without bookings are filled in from the
+    active ``TimeSlot`` list.
+
+    Args:
+        start: First date of the range (inclusive)
+        end: Last date of the range (inclusive)
+
+    Returns:
+        dict: ``slots`` as ``[id, display_name, max_capacity]`` rows,
+        ``dates`` as ISO strings and ``remaining`` as one row of
+        remaining guests per date, in the same order as ``slots``
+    """
+    slots = list(_active_slot_rows())
+    return _range_matrix(slots, ledger_totals(start, end), start, end)
+
+
+async def aavailability_range(start, end):
+    """Async version of :func:`availability_range`."""
+    slots = [slot async for slot in _active_slot_rows()]
+    booked = await aledger_totals(start, end)
+    return _range_matrix(slots, booked, start, end)
+
+
+def _active_slot_rows():
+    """``(id, display_name, max_capacity)`` of active slots, in order."""
+    return (
+        TimeSlot.objects
+        .filter(is_active=True)
+        .order_by('start_time')
+        .values_list('id', 'display_name', 'max_capacity')
+    )
+
+
+def _range_matrix(slots, booked, start, end):
+    """Build the :func:`availability_range` matrix from loaded rows."""
+    dates = []
+    remaining = []
+    day = start
+    while day <= end:
+        dates.append(day.isoformat())
+        remaining.append([
+            max(0, capacity - booked.get((day, slot_id), 0))
+            for slot_id, _, capacity in slots
+        ])
+        day += timedelta(days=1)
+
+    return {
+        'slots': [list(slot) for slot in slots],
+        'dates': dates,
+        'remaining': remaining,
+    }
+
+
+# -------------------------------------------------------------------
+# PER-DATE CACHE
+# -------------------------------------------------------------------
+#
+# Each date's slot list is cached as ``(slots_token, date_token, slots)``.
+# ``slots_token`` changes whenever a TimeSlot change affects every date and
+# ``date_token`` whenever a reservation for that date is written. An entry
+# is only served while both tokens still match, so invalidation never has
+# to find and delete entries, and an entry computed while an invalidation
+# was in flight is never mistaken for a fresh one.
+#
+# A per-process (local-memory) cache only sees invalidations made by its
+# own worker, so there tokens expire after AVAILABILITY_LOCAL_TOKEN_TTL
+# seconds: bookings made in other workers show up (in the data and in the
+# ETags built from the tokens) after at most that long.
+
+SLOTS_TOKEN_KEY = 'availability:slots-token'
+HITS_KEY = 'availability:hits'
+MISSES_KEY = 'availability:misses'
+STALE_HITS_KEY = 'availability:stale-hits'
+
+
+def _cache():
+    """Return the cache backend configured for availability data."""
+    return caches[getattr(settings, 'AVAILABILITY_CACHE_ALIAS', 'default')]
+
+
+def availability_cache_shared():
+    """Return whether the availability cache is shared between processes."""
+    return is_shared(_cache())
+
+
+def _timeout():
+    return getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 600)
+
+
+def _token_timeout(cache):
+    """How long ``cache`` may keep a validity token."""
+    if is_shared(cache):
+        return None
+    return getattr(settings, 'AVAILABILITY_LOCAL_TOKEN_TTL', 5)
+
+
+def _date_token_key(date):
+    return f'availability:date-token:{date.isoformat()}'
+
+
+def _entry_key(date):
+    return f'availability:slots:{date.isoformat()}'
+
+
+def _new_token():
+    return uuid.uuid4().hex
+
+
+def _token(cache, found, key):
+    """
+    Return a validity token from a ``get_many`` result.
+
+    Missing tokens (never set, or evicted) are replaced with new ones so a
+    surviving entry can never match them by accident.
+    """
+    token = found.get(key)
+    if token is None:
+        token = _new_token()
+        if not cache.add(key, token, _token_timeout(cache)):
+            token = cache.get(key, token)
+    return token
+
+
+async def _atoken(cache, found, key):
+    """Async version of :func:`_token`."""
+    token = found.get(key)
+    if token is None:
+        token = _new_token()
+        if not await cache.aadd(key, token, _token_timeout(cache)):
+            token = await cache.aget(key, token)
+    return token
+
+
+def _lookup_keys(date):
+    """Keys of both validity tokens and the entry for a date."""
+    return [SLOTS_TOKEN_KEY, _date_token_key(date), _entry_key(date)]
+
+
+def _current_tokens(cache, date):
+    """Read the entry and both validity tokens for a date in one round trip."""
+    keys = _lookup_keys(date)
+    found = cache.get_many(keys)
+    return (
+        _token(cache, found, keys[0]),
+        _token(cache, found, keys[1]),
+        found.get(keys[2]),
+    )
+
+
+def _is_fresh(entry, slots_token, date_token):
+    return entry is not None and entry[:2] == (slots_token, date_token)
+
+
+# Cache keys of the counters shown by availability_cache_stats()
+_COUNTER_KEYS = {
+    'hit': HITS_KEY, 'miss': MISSES_KEY, 'stale_hit': STALE_HITS_KEY,
+}
+
+
+def _count(result):
+    """Count a lookup in the cache counters and in ``/metrics``."""
+    metrics.record_availability_lookup(result)
+    key = _COUNTER_KEYS[result]
+    cache = _cache()
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+async def _acount(result):
+    """Async version of :func:`_count`."""
+    metrics.record_availability_lookup(result)
+    key = _COUNTER_KEYS[result]
+    cache = _cache()
+    await cache.aadd(key, 0, None)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, None)
+
+
+def _recompute_lock_key(date):
+    return f'availability:recompute-lock:{date.isoformat()}'
+
+
+def _store(cache, date, slots_token, date_token):
+    """Compute a date's availability and cache it under the given tokens."""
+    slots = available_slots_payload(date)
+    # Stored under the tokens read *before* computing: if an invalidation
+    # lands meanwhile, this entry is already stale and will not be served
+    cache.set(
+        _entry_key(date), (slots_token, date_token, slots), _timeout()
+    )
+    return slots
+
+
+def _recompute(cache, date, slots_token, date_token, entry):
+    """
+    Serve a missing or stale entry, recomputing it single-flight.
+
+    Only the caller that wins a short cache lock queries the database.
+    Other callers return the stale entry if there is one, or otherwise
+    poll briefly for the winner's result before computing it themselves.
+    """
+    lock_key = _recompute_lock_key(date)
+    lock_timeout = getattr(settings, 'AVAILABILITY_RECOMPUTE_LOCK_TIMEOUT', 10)
+    if cache.add(lock_key, True, lock_timeout):
+        _count('miss')
+        try:
+            return _store(cache, date, slots_token, date_token)
+        finally:
+            cache.delete(lock_key)
+
+    if entry is not None:
+        # Someone else is recomputing; the previous value is close enough
+        _count('stale_hit')
+        return entry[2]
+
+    # Cold entry being computed elsewhere: wait briefly for the result
+    deadline = time.monotonic() + getattr(
+        settings, 'AVAILABILITY_RECOMPUTE_WAIT', 0.5
+    )
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        entry = cache.get(_entry_key(date))
+        if entry is not None:
+            _count('hit')
+            return entry[2]
+
+    _count('miss')
+    return _store(cache, date, slots_token, date_token)
+
+
+def cached_available_slots(date):
+    """
+    Return :func:`available_slots_payload` for a date through the cache.
+
+    Recomputation is single-flight (see :func:`_recompute`).
+
+    Args:
+        date: The reservation date to check
+
+    Returns:
+        list: Same structure as :func:`available_slots_payload`
+    """
+    cache = _cache()
+    slots_token, date_token, entry = _current_tokens(cache, date)
+    if _is_fresh(entry, slots_token, date_token):
+        _count('hit')
+        return entry[2]
+    return _recompute(cache, date, slots_token, date_token, entry)
+
+
+async def acached_available_slots(date):
+    """
+    Async version of :func:`cached_available_slots`.
+
+    Hits are served with the async cache API. Misses run the same
+    single-flight :func:`_recompute` in Django's sync thread: they query
+    the database, which the async ORM would do on that thread anyway.
+    """
+    cache = _cache()
+    keys = _lookup_keys(date)
+    found = await cache.aget_many(keys)
+    slots_token = await _atoken(cache, found, keys[0])
+    date_token = await _atoken(cache, found, keys[1])
+    entry = found.get(keys[2])
+    if _is_fresh(entry, slots_token, date_token):
+        await _acount('hit')
+        return entry[2]
+    return await sync_to_async(_recompute)(
+        cache, date, slots_token, date_token, entry
+    )
+
+
+def warm_availability(days, start=None):
+    """
+    Precompute cached availability for the next ``days`` dates.
+
+    Only dates whose entry is missing or stale are recomputed, and all of
+    them together cost two queries (see :func:`available_slots_for_dates`).
+
+    Args:
+        days: Number of dates to cover, starting at ``start``
+        start: First date (defaults to today)
+
+    Returns:
+        list: The dates that were recomputed
+    """
+    start = start or timezone.localdate()
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    cache = _cache()
+
+    keys = [SLOTS_TOKEN_KEY]
+    for day in dates:
+        keys += [_date_token_key(day), _entry_key(day)]
+    found = cache.get_many(keys)
+    slots_token = _token(cache, found, SLOTS_TOKEN_KEY)
+
+    stale = {}
+    for day in dates:
+        date_token = _token(cache, found, _date_token_key(day))
+        entry = found.get(_entry_key(day))
+        if entry is None or entry[:2] != (slots_token, date_token):
+            stale[day] = date_token
+
+    payloads = available_slots_for_dates(stale)
+    cache.set_many(
+        {
+            _entry_key(day): (slots_token, date_token, payloads[day])
+            for day, date_token in stale.items()
+        },
+        _timeout()
+    )
+    return sorted(stale)
+
+
+def availability_version(date):
+    """
+    Return a string that changes whenever a date's availability may have.
+
+    Built from the same validity tokens as the cache entries, so it costs
+    one cache round trip and no queries. Used as the HTTP ETag of the
+    availability API.
+    """
+    cache = _cache()
+    keys = [SLOTS_TOKEN_KEY, _date_token_key(date)]
+    found = cache.get_many(keys)
+    return f'{_token(cache, found, keys[0])}.{_token(cache, found, keys[1])}'
+
+
+def invalidate_availability(*dates):
+    """Mark the cached availability for the given dates as stale."""
+    cache = _cache()
+    cache.set_many(
+        {_date_token_key(date): _new_token() for date in set(dates) if date},
+        _token_timeout(cache)
+    )
+
+
+def invalidate_all_availability():
+    """Mark every cached date as stale (e.g. after TimeSlot changes)."""
+    cache = _cache()
+    cache.set(SLOTS_TOKEN_KEY, _new_token(), _token_timeout(cache))
+
+
+def availability_cache_stats():
+    """
+    Return hit/miss counters for the availability cache.
+
+    Counters live in the cache itself, so they aggregate across all
+    workers only with a shared backend; ``/metrics`` counts the same
+    lookups per process (see ``reservations.metrics``).
+    """
+    found = _cache().get_many([HITS_KEY, MISSES_KEY, STALE_HITS_KEY])
+    hits = found.get(HITS_KEY, 0)
+    misses = found.get(MISSES_KEY, 0)
+    stale_hits = found.get(STALE_HITS_KEY, 0)
+    lookups = hits + misses + stale_hits
+    return {
+        'hits': hits,
+        'misses': misses,
+        'stale_hits': stale_hits,
+        'hit_ratio': (
+            round((hits + stale_hits) / lookups, 4) if lookups else None
+        ),
+    }
+
+
+async def aavailability_version(date):
+    """Async version of :func:`availability_version`."""
+    cache = _cache()
+    keys = [SLOTS_TOKEN_KEY, _date_token_key(date)]
+    found = await cache.aget_many(keys)
+    slots_token = await _atoken(cache, found, keys[0])
+    date_token = await _atoken(cache, found, keys[1])
+    return f'{slots_token}.{date_token}'
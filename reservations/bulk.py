@@ -0,0 +1,169 @@
+"""
+Set-based cancellation and rescheduling of many reservations.
+
+Closing a slot for a private event used to mean cancelling bookings one
+at a time, each with a full ``save()`` and its own ledger update. Here
+the affected reservations are read once, the occupancy ledger is
+adjusted in bulk (:func:`~reservations.occupancy.adjust_occupancy_many`)
+and the reservations are changed with ``UPDATE ... WHERE id IN (...)``,
+all in one transaction.
+
+``update()`` does not send ``post_save``, so the availability cache is
+invalidated here for every date touched, and guest emails are queued as
+one batch (see ``reservations.notifications``). Both happen only once the
+transaction commits.
+"""
+from collections import Counter
+from functools import partial
+
+from django.db import transaction
+
+from .availability import invalidate_availability
+from .models import Reservation, TimeSlot
+from .notifications import cancellation_email, move_email, queue_guest_emails
+from .occupancy import adjust_occupancy_many, ledger_transaction
+
+# Reservation ids per UPDATE statement
+BATCH_SIZE = 1000
+
+# Values read for each reservation changed
+ROW_FIELDS = ('pk', 'date', 'time_slot', 'guests', 'name', 'email')
+
+
+def _lock_rows(queryset):
+    """
+    Read (and on PostgreSQL, lock) the active reservations to change.
+
+    Only ``Reservation`` rows are locked, never ``TimeSlot`` rows (which
+    would hold up bookings): the query selects no joined columns, and
+    ``of=('self',)`` covers joins added by filters on the slot. Slot names
+    for the emails are read separately and added as
+    ``time_slot__display_name``.
+    """
+    rows = list(
+        queryset
+        .filter(is_cancelled=False)
+        .select_for_update(of=('self',))
+        .order_by()
+        .values(*ROW_FIELDS)
+    )
+    names = dict(
+        TimeSlot.objects.filter(
+            pk__in={row['time_slot'] for row in rows}
+        ).values_list('pk', 'display_name')
+    )
+    for row in rows:
+        row['time_slot__display_name'] = names[row['time_slot']]
+    return rows
+
+
+def _update(rows, **changes):
+    ids = [row['pk'] for row in rows]
+    for start in range(0, len(ids), BATCH_SIZE):
+        Reservation.objects.filter(
+            pk__in=ids[start:start + BATCH_SIZE]
+        ).update(**changes)
+
+
+def cancel_reservations(queryset, notify=True):
+    """
+    Cancel every active reservation in ``queryset``.
+
+    Args:
+        queryset: Reservations to cancel; already cancelled ones are
+            skipped
+        notify: Email each guest (one batch, after commit)
+
+    Returns:
+        int: Number of reservations cancelled
+    """
+    with ledger_transaction():
+        rows = _lock_rows(queryset)
+        if not rows:
+            return 0
+
+        released = Counter()
+        for row in rows:
+            released[row['date'], row['time_slot']] -= row['guests']
+        adjust_occupancy_many(released)
+        _update(rows, is_cancelled=True)
+
+        dates = {row['date'] for row in rows}
+        transaction.on_commit(partial(invalidate_availability, *dates))
+        if notify:
+            queue_guest_emails(cancellation_email(row) for row in rows)
+    return len(rows)
+
+
+def move_reservations(queryset, date=None, time_slot=None,
+                      enforce_capacity=False, notify=True):
+    """
+    Move every active reservation in ``queryset`` to a new date and/or
+    time slot.
+
+    Args:
+        queryset: Reservations to move; cancelled ones are skipped
+        date: New date (None keeps each reservation's date)
+        time_slot: New TimeSlot (None keeps each reservation's slot)
+        enforce_capacity: Refuse the move if it would overbook any slot
+        notify: Email each guest (one batch, after commit)
+
+    Returns:
+        int: Number of reservations moved
+
+    Raises:
+        ValueError: If neither ``date`` nor ``time_slot`` is given
+        SlotCapacityError: If ``enforce_capacity`` and a slot would be
+            overbooked; nothing is changed in that case
+    """
+    if date is None and time_slot is None:
+        raise ValueError('Give a new date, a new time slot or both')
+
+    def target(row):
+        return (
+            date or row['date'],
+            time_slot.pk if time_slot else row['time_slot'],
+        )
+
+    with ledger_transaction():
+        # Reservations already at the target are left alone
+        rows = [
+            row for row in _lock_rows(queryset)
+            if target(row) != (row['date'], row['time_slot'])
+        ]
+        if not rows:
+            return 0
+
+        deltas = Counter()
+        for row in rows:
+            deltas[row['date'], row['time_slot']] -= row['guests']
+            deltas[target(row)] += row['guests']
+
+        capacities = None
+        if enforce_capacity:
+            capacities = dict(
+                TimeSlot.objects.filter(
+                    pk__in={slot_id for _, slot_id in deltas}
+                ).values_list('pk', 'max_capacity')
+            )
+        adjust_occupancy_many(deltas, capacities)
+
+        changes = {}
+        if date is not None:
+            changes['date'] = date
+        if time_slot is not None:
+            changes['time_slot'] = time_slot
+        _update(rows, **changes)
+
+        dates = {row['date'] for row in rows} | {date}
+        transaction.on_commit(partial(invalidate_availability, *dates))
+        if notify:
+            queue_guest_emails(
+                move_email(
+                    row, date or row['date'],
+                    time_slot.display_name if time_slot
+                    else row['time_slot__display_name']
+                )
+                for row in rows
+            )
+    return len(rows)
@@ -0,0 +1,16 @@
+"""
+Helpers shared by the availability and menu caches.
+"""
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(cache):
+    """
+    Return whether ``cache`` is shared between processes.
+
+    Local-memory and dummy caches live inside one process, so what one
+    worker (or a management command) writes to them is never seen by
+    the others.
+    """
+    return not isinstance(cache, (LocMemCache, DummyCache))
@@ -0,0 +1,212 @@
+"""
+HTTP conditional GET for pages and APIs built from versioned data.
+
+ETags and Last-Modified dates come from cheap change markers (the menu
+version and the availability cache tokens) rather than from the response
+body, so a ``304 Not Modified`` is answered before the view runs any
+queries or renders a template.
+
+The decorators accept sync and async views alike (Django 4.2's own
+``condition`` only supports sync views).
+"""
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from .availability import availability_version
+from .menu_cache import menu_version
+
+
+def _audience(request):
+    """
+    Identify who a page was rendered for.
+
+    Pages differ between anonymous and signed-in visitors (navigation, and
+    the logout form's CSRF token), so the session is part of the ETag for
+    signed-in users. Logging in or out always changes it.
+    """
+    if not request.user.is_authenticated:
+        return 'anon'
+    session_key = request.session.session_key or ''
+    return hashlib.sha256(session_key.encode()).hexdigest()[:16]
+
+
+def _conditional(view, etag_func, last_modified_func=None):
+    """
+    Apply ``condition()`` to a sync or async view.
+
+    For async views the validators, which read the cache and, for
+    signed-in users, the session, run in a worker thread. The view is
+    only awaited when no 304 or 412 applies.
+    """
+    if not iscoroutinefunction(view):
+        return condition(
+            etag_func=etag_func, last_modified_func=last_modified_func
+        )(view)
+
+    def validators(request, *args, **kwargs):
+        etag = etag_func(request, *args, **kwargs)
+        modified = (
+            last_modified_func(request, *args, **kwargs)
+            if last_modified_func else None
+        )
+        return (
+            quote_etag(etag) if etag else None,
+            int(modified.timestamp()) if modified else None,
+        )
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        etag, last_modified = await sync_to_async(validators)(
+            request, *args, **kwargs
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = await view(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            if last_modified and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(last_modified)
+            if etag:
+                response.headers.setdefault('ETag', etag)
+        return response
+    return wrapper
+
+
+def _finish_with(view, conditional_view, finish):
+    """Wrap ``conditional_view`` so ``finish`` adjusts every response."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            response = await conditional_view(request, *args, **kwargs)
+            return finish(request, response)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return finish(request, conditional_view(request, *args, **kwargs))
+    return wrapper
+
+
+def versioned_page(version_func):
+    """
+    Serve a page with conditional GET keyed on ``version_func()``.
+
+    Anonymous responses are ``public`` for ``PUBLIC_PAGE_MAX_AGE`` seconds
+    so a CDN or reverse proxy can answer them; signed-in responses are
+    ``private`` and always revalidated. Both vary on ``Cookie``.
+
+    Args:
+        version_func: Zero-argument callable returning the version of
+            the data the page shows (a ``time.time_ns()`` value)
+    """
+    def etag(request, *args, **kwargs):
+        return f'{version_func()}-{_audience(request)}'
+
+    def last_modified(request, *args, **kwargs):
+        # Only anonymous pages: a signed-in page changes on login even
+        # though the data behind it does not
+        if request.user.is_authenticated:
+            return None
+        return datetime.fromtimestamp(
+            version_func() / 1e9, tz=dt_timezone.utc
+        )
+
+    def finish(request, response):
+        if response.status_code not in (200, 304):
+            return response
+        # request.user was already loaded by the ETag function
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response, public=True,
+                max_age=getattr(settings, 'PUBLIC_PAGE_MAX_AGE', 60)
+            )
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+    def decorator(view):
+        return _finish_with(
+            view, _conditional(view, etag, last_modified), finish
+        )
+    return decorator
+
+
+def versioned_public_api(version_func):
+    """
+    Serve a public API with conditional GET keyed on ``version_func()``.
+
+    The response does not depend on who asks, so it is ``public`` for
+    ``PUBLIC_PAGE_MAX_AGE`` seconds and does not vary on cookies.
+
+    Args:
+        version_func: Zero-argument callable returning the version of
+            the data the API returns (a ``time.time_ns()`` value)
+    """
+    def etag(request, *args, **kwargs):
+        return str(version_func())
+
+    def last_modified(request, *args, **kwargs):
+        return datetime.fromtimestamp(
+            version_func() / 1e9, tz=dt_timezone.utc
+        )
+
+    def finish(request, response):
+        if response.status_code in (200, 304):
+            patch_cache_control(
+                response, public=True,
+                max_age=getattr(settings, 'PUBLIC_PAGE_MAX_AGE', 60)
+            )
+        return response
+
+    def decorator(view):
+        return _finish_with(
+            view, _conditional(view, etag, last_modified), finish
+        )
+    return decorator
+
+
+menu_page = versioned_page(menu_version)
+menu_api = versioned_public_api(menu_version)
+
+
+def _availability_etag(request, *args, **kwargs):
+    """ETag for the per-date availability API (None for a bad date)."""
+    try:
+        selected_date = parse_date(request.GET.get('date') or '')
+    except ValueError:
+        return None
+    if selected_date is None:
+        return None
+    return availability_version(selected_date)
+
+
+def availability_api(view):
+    """
+    Serve the availability API with conditional GET.
+
+    The ETag combines the time slot and per-date cache tokens, which
+    change whenever a booking or slot change invalidates that date.
+    Responses are private to the signed-in user and always revalidated.
+    """
+    def finish(request, response):
+        if response.status_code in (200, 304):
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return _finish_with(
+        view, _conditional(view, _availability_etag), finish
+    )
@@ -0,0 +1,144 @@
+"""
+Streaming CSV exports of reservations.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` (a server-side
+cursor on PostgreSQL) and written out one CSV line at a time, so memory
+use does not depend on how many reservations are exported. The header
+line is produced before the query runs, which gets the first bytes to
+the client immediately.
+
+Also holds the option parsers shared by the export, bulk and ledger
+management commands.
+"""
+import csv
+from datetime import datetime
+
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from .models import Reservation, TimeSlot
+
+COLUMNS = (
+    'id', 'date', 'time', 'guests', 'name', 'email', 'phone',
+    'special_requests', 'account', 'created_at', 'cancelled',
+)
+
+# Rows fetched from the database per round trip
+CHUNK_SIZE = 2000
+
+# Byte order mark that makes Excel read the file as UTF-8
+EXCEL_BOM = '\ufeff'
+
+# Leading characters that make a spreadsheet treat a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def excel_safe(value):
+    """
+    Neutralise guest-supplied text that a spreadsheet would run as a
+    formula (CSV injection), by prefixing it with an apostrophe.
+    """
+    if value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def parse_date(value):
+    """argparse type for YYYY-MM-DD dates."""
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def find_time_slot(value):
+    """
+    Look up a time slot given as ``HH:MM`` or an id.
+
+    Returns:
+        TimeSlot or None: None when ``value`` is empty
+
+    Raises:
+        CommandError: If no slot matches
+    """
+    if not value:
+        return None
+    lookup = {'start_time': value} if ':' in value else {'pk': value}
+    time_slot = TimeSlot.objects.filter(**lookup).first()
+    if time_slot is None:
+        raise CommandError(f'No time slot matches "{value}"')
+    return time_slot
+
+
+class _Echo:
+    """File-like object whose ``write`` just returns the line written."""
+
+    def write(self, value):
+        return value
+
+
+def filter_reservations(queryset=None, start=None, end=None, time_slot=None,
+                        cancelled=None):
+    """
+    Narrow reservations to an export and join what the rows need.
+
+    Args:
+        queryset: Reservations to start from (defaults to all)
+        start: First date to include
+        end: Last date to include
+        time_slot: TimeSlot (or id) to restrict to
+        cancelled: True/False to select only cancelled or active
+            reservations, None for both
+
+    Returns:
+        QuerySet: Ordered by date, slot time and id
+    """
+    queryset = Reservation.objects.all() if queryset is None else queryset
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    if time_slot:
+        queryset = queryset.filter(time_slot=time_slot)
+    if cancelled is not None:
+        queryset = queryset.filter(is_cancelled=cancelled)
+    return (
+        queryset
+        .select_related('time_slot', 'user')
+        .only(
+            'date', 'guests', 'name', 'email', 'phone', 'special_requests',
+            'created_at', 'is_cancelled', 'time_slot__start_time',
+            'user__username',
+        )
+        .order_by('date', 'time_slot__start_time', 'pk')
+    )
+
+
+def csv_lines(queryset, excel=False, chunk_size=CHUNK_SIZE):
+    """
+    Yield an export as CSV text, one line at a time.
+
+    Args:
+        queryset: Output of :func:`filter_reservations`
+        excel: Start with a UTF-8 byte order mark for Excel and escape
+            guest-supplied cells that would start a formula
+        chunk_size: Rows fetched per database round trip
+    """
+    writer = csv.writer(_Echo())
+    header = writer.writerow(COLUMNS)
+    yield EXCEL_BOM + header if excel else header
+
+    text = excel_safe if excel else str
+    for reservation in queryset.iterator(chunk_size=chunk_size):
+        yield writer.writerow((
+            reservation.pk,
+            reservation.date.isoformat(),
+            reservation.time_slot.start_time.strftime('%H:%M'),
+            reservation.guests,
+            text(reservation.name),
+            text(reservation.email),
+            text(reservation.phone),
+            text(reservation.special_requests or ''),
+            text(reservation.user.username),
+            timezone.localtime(reservation.created_at).isoformat(
+                timespec='seconds'
+            ),
+            'yes' if reservation.is_cancelled else 'no',
+        ))
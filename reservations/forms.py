@@ -2,6 +2,7 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from .models import Reservation, TimeSlot
+from .availability import remaining_capacity
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserChangeForm
 
@@ -58,17 +59,16 @@ class ReservationForm(forms.ModelForm):
         time_slot = cleaned_data.get('time_slot')
 
         if date and time_slot:
-            bookings = Reservation.objects.filter(
-                date=date,
-                time_slot=time_slot,
-                is_cancelled=False
-            ).count()
+            # Leave the booking being edited out of the slot's totals
+            remaining = remaining_capacity(
+                time_slot, date, exclude_reservation_id=self.instance.pk
+            )
 
-            if bookings >= time_slot.max_capacity:
-                remaining = time_slot.max_capacity - bookings
+            if remaining <= 0:
                 raise ValidationError(
                     f"No seats remaining ({remaining}). Please choose "
-                    "another time slot."
+                    "another time slot.",
+                    code='full'
                 )
 
 
@@ -0,0 +1,80 @@
+"""
+Responsive Cloudinary image URLs.
+
+Menu images are stored as full-size originals. Pages ask Cloudinary for a
+width-limited copy instead (``c_limit``, so images are never upscaled),
+in the best format and quality the browser accepts (``f_auto,q_auto``:
+WebP or AVIF where supported). ``srcset`` lists a few widths so the
+browser downloads the smallest one that fills the layout.
+
+Building a URL is pure string work (no API call), but it is repeated for
+every image on every admin page, so URLs are memoised per public id,
+version and size. The version changes when an image is replaced, so a
+memoised URL never points at an old upload.
+"""
+from functools import lru_cache
+
+from cloudinary import CloudinaryResource
+
+# Widths (px) offered in srcset; the largest covers 2x displays of the
+# widest menu card
+SRCSET_WIDTHS = (320, 480, 640, 960)
+
+# Width used for ``src`` by browsers that ignore srcset
+DEFAULT_WIDTH = 480
+
+
+@lru_cache(maxsize=4096)
+def _build_url(public_id, version, image_format, width, height, crop):
+    """Build one transformation URL (memoised)."""
+    resource = CloudinaryResource(
+        public_id, version=version, format=image_format,
+        type='upload', resource_type='image'
+    )
+    options = {
+        'width': width,
+        'crop': crop,
+        'fetch_format': 'auto',
+        'quality': 'auto',
+        'secure': True,
+    }
+    if height:
+        options['height'] = height
+    return resource.build_url(**options)
+
+
+def sized_image_url(image, width=DEFAULT_WIDTH, height=None, crop='limit'):
+    """
+    Return a width-bounded, format-auto URL for a CloudinaryField value.
+
+    Args:
+        image: CloudinaryField value (``CloudinaryResource``) or None
+        width: Maximum width in pixels
+        height: Maximum height in pixels (optional)
+        crop: Cloudinary crop mode; ``limit`` only ever shrinks, ``fill``
+            crops to exactly ``width`` x ``height`` (for thumbnails)
+
+    Returns:
+        str or None: Transformation URL, or None when there is no image
+    """
+    if not image:
+        return None
+    public_id = getattr(image, 'public_id', None) or str(image)
+    return _build_url(
+        public_id, getattr(image, 'version', None),
+        getattr(image, 'format', None), width, height, crop
+    )
+
+
+def image_srcset(image, widths=SRCSET_WIDTHS):
+    """Return a ``srcset`` value listing the image at each width."""
+    if not image:
+        return ''
+    return ', '.join(
+        f'{sized_image_url(image, width)} {width}w' for width in widths
+    )
+
+
+def clear_url_cache():
+    """Forget memoised URLs (e.g. after changing the Cloudinary config)."""
+    _build_url.cache_clear()
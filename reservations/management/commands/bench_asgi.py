@@ -0,0 +1,218 @@
+"""
+Compare throughput and tail latency of a WSGI and an ASGI deployment.
+
+Both servers must already be running against the same database, e.g.::
+
+    gunicorn savouryheaven.wsgi -b 127.0.0.1:8001 -w 4
+    ASYNC_VIEWS=1 gunicorn savouryheaven.asgi -b 127.0.0.1:8002 \\
+        -c savouryheaven/gunicorn_asgi.py -w 4
+    python manage.py bench_asgi --wsgi-url http://127.0.0.1:8001 \\
+        --asgi-url http://127.0.0.1:8002 --username demo
+
+Each endpoint is hit ``--requests`` times over ``--concurrency``
+keep-alive connections, first on one server and then on the other, by a
+small asyncio HTTP/1.1 client (no extra dependencies, and one client
+process can hold hundreds of connections). The availability APIs need a
+login: ``--username`` signs that user in by creating a session for it,
+whose cookie is sent with every request.
+"""
+import asyncio
+import time
+from datetime import date, timedelta
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY,
+    HASH_SESSION_KEY,
+    SESSION_KEY,
+    get_user_model,
+)
+from django.core.management.base import BaseCommand, CommandError
+
+
+class _Target:
+    """Host and port of one server under test."""
+
+    def __init__(self, label, url):
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise CommandError(f'{label} URL must be http://host[:port]')
+        self.label = label
+        self.host = parts.hostname
+        self.port = parts.port or 80
+
+
+async def _read_response(reader):
+    """Read one response; return ``(status, keep_alive)``."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed by server')
+    version, status = status_line.split(b' ', 2)[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get(b'transfer-encoding', b'').lower() == b'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    elif b'content-length' in headers:
+        await reader.readexactly(int(headers[b'content-length']))
+    elif int(status) not in (204, 304):
+        # No length: the body runs until the server closes
+        await reader.read()
+        return int(status), False
+
+    connection = headers.get(b'connection', b'').lower()
+    keep_alive = connection != b'close' and (
+        version == b'HTTP/1.1' or connection == b'keep-alive'
+    )
+    return int(status), keep_alive
+
+
+async def _run(target, path, total, concurrency, cookie):
+    """
+    Send ``total`` GET requests for ``path`` over ``concurrency``
+    connections.
+
+    Returns:
+        tuple: ``(latencies, errors, seconds)``
+    """
+    request = (
+        f'GET {path} HTTP/1.1\r\n'
+        f'Host: {target.host}:{target.port}\r\n'
+        f'Cookie: {cookie}\r\n'
+        f'Connection: keep-alive\r\n\r\n'
+    ).encode()
+    latencies = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        reader = writer = None
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(
+                        target.host, target.port
+                    )
+                writer.write(request)
+                await writer.drain()
+                status, keep_alive = await _read_response(reader)
+            except (OSError, ConnectionError, ValueError,
+                    asyncio.IncompleteReadError):
+                errors += 1
+                keep_alive = False
+            else:
+                latencies.append(time.perf_counter() - started)
+                # A redirect usually means the login was not accepted
+                if status >= 300 and status != 304:
+                    errors += 1
+            if not keep_alive and writer is not None:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return float('nan')
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/s and p99 latency of running WSGI and ASGI '
+        'servers on the read-heavy endpoints'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', required=True,
+                            help='Base URL of the WSGI server')
+        parser.add_argument('--asgi-url', required=True,
+                            help='Base URL of the ASGI server')
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=5000,
+                            help='Requests per endpoint and server')
+        parser.add_argument('--warmup', type=int, default=200,
+                            help='Untimed requests sent first')
+        parser.add_argument('--username',
+                            help='User to sign in as for the availability '
+                                 'APIs (skipped without it)')
+        parser.add_argument('--date', type=date.fromisoformat,
+                            help='Day to query (default: tomorrow)')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--concurrency and --requests must be >= 1')
+        targets = [
+            _Target('wsgi', options['wsgi_url']),
+            _Target('asgi', options['asgi_url']),
+        ]
+        day = options['date'] or date.today() + timedelta(days=1)
+        paths = ['/', '/menu/']
+        cookie = ''
+        if options['username']:
+            cookie = (
+                f'{settings.SESSION_COOKIE_NAME}='
+                f'{self._session_key(options["username"])}'
+            )
+            paths += [
+                f'/api/available-slots/?date={day}',
+                f'/api/availability/?start={day}'
+                f'&end={day + timedelta(days=6)}',
+            ]
+
+        self.stdout.write(
+            f'{"server":<6} {"path":<50} {"req/s":>9} {"median":>9} '
+            f'{"p99":>9} {"errors":>7}'
+        )
+        for path in paths:
+            for target in targets:
+                if options['warmup']:
+                    asyncio.run(_run(
+                        target, path, options['warmup'],
+                        min(options['concurrency'], options['warmup']),
+                        cookie
+                    ))
+                latencies, errors, seconds = asyncio.run(_run(
+                    target, path, options['requests'],
+                    options['concurrency'], cookie
+                ))
+                latencies.sort()
+                self.stdout.write(
+                    f'{target.label:<6} {path:<50} '
+                    f'{len(latencies) / seconds:>9.1f} '
+                    f'{_percentile(latencies, 0.5) * 1000:>7.1f}ms '
+                    f'{_percentile(latencies, 0.99) * 1000:>7.1f}ms '
+                    f'{errors:>7}'
+                )
+
+    def _session_key(self, username):
+        """Create a logged-in session for ``username``; return its key."""
+        try:
+            user = get_user_model().objects.get_by_natural_key(username)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user named {username!r}')
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return session.session_key
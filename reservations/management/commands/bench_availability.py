@@ -0,0 +1,102 @@
+"""
+Benchmark the slot availability query against a large synthetic dataset.
+
+Seeds time slots and reservations inside a transaction, times the legacy
+per-slot loop against the ledger-backed query, then rolls everything
+back so the database is left untouched.
+"""
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from reservations.availability import available_slots_payload
+from reservations.models import Reservation, TimeSlot
+from reservations.seeding import seed as seed_data
+
+
+class _Rollback(Exception):
+    """Raised to discard the benchmark data."""
+
+
+def legacy_available_slots(selected_date):
+    """Per-slot implementation kept for comparison only."""
+    available_slots = []
+    for slot in TimeSlot.objects.filter(is_active=True).order_by('start_time'):
+        existing_bookings = Reservation.objects.filter(
+            date=selected_date,
+            time_slot=slot,
+            is_cancelled=False
+        )
+        total_booked_guests = sum(
+            booking.guests for booking in existing_bookings
+        )
+        remaining = max(0, slot.max_capacity - total_booked_guests)
+        available_slots.append({
+            'id': slot.id,
+            'display_name': slot.display_name,
+            'available': remaining > 0,
+            'remaining_slots': remaining
+        })
+    return available_slots
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare query count and latency of the availability lookup '
+        '(data is rolled back afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, default=24)
+        parser.add_argument('--reservations', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=60)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(**options)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write('Benchmark data rolled back.')
+
+    def _run(self, slots, reservations, days, repeat, seed, **options):
+        start_date = date.today() + timedelta(days=1)
+
+        # Only the benchmark's own slots take part
+        TimeSlot.objects.all().update(is_active=False)
+
+        self.stdout.write(
+            f'Seeding {reservations} reservations over {days} days '
+            f'and {slots} slots...'
+        )
+        seed_data(
+            seed=seed, users=200, slots=slots, capacity=5000, categories=0,
+            reservations=reservations, days=days, start=start_date
+        )
+
+        target = start_date + timedelta(days=days // 2)
+        assert legacy_available_slots(target) == \
+            available_slots_payload(target), 'Implementations disagree'
+
+        for label, func in (
+            ('per-slot loop', legacy_available_slots),
+            ('ledger query', available_slots_payload),
+        ):
+            with CaptureQueriesContext(connection) as ctx:
+                func(target)
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func(target)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            self.stdout.write(
+                f'{label:>14}: {len(ctx.captured_queries):>3} queries, '
+                f'median {timings[len(timings) // 2] * 1000:.2f} ms, '
+                f'max {timings[-1] * 1000:.2f} ms'
+            )
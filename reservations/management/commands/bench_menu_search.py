@@ -0,0 +1,130 @@
+"""
+Benchmark menu search against a large synthetic catalogue.
+
+Seeds menu items inside a transaction, times the search backend for this
+database against the admin's former ``icontains`` scans over name,
+description and ingredients, and times the whole public search endpoint
+(lookup plus loading and serializing the returned items). Everything is
+rolled back afterwards so the database is left untouched.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test import RequestFactory
+
+from reservations.menu_cache import bump_menu_version
+from reservations.models import MenuItem
+from reservations.search import search_index, search_menu
+from reservations.seeding import seed as seed_data
+from reservations.views import search_menu_view
+
+# (query, ingredients, free_from) combinations timed by the benchmark
+QUERIES = (
+    ('risotto', (), ()),
+    ('sea bass lemon', (), ()),
+    ('truff', (), ()),
+    ('', ('garlic',), ('milk', 'nuts')),
+    ('duck', ('thyme',), ('gluten',)),
+)
+
+
+class _Rollback(Exception):
+    """Raised to discard the benchmark data."""
+
+
+def icontains_search(query):
+    """The admin's previous search: every word in any of three fields."""
+    items = MenuItem.objects.all()
+    for word in query.split():
+        items = items.filter(
+            Q(name__icontains=word)
+            | Q(description__icontains=word)
+            | Q(ingredients__icontains=word)
+        )
+    return list(items.values_list('id', flat=True))
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare menu search latency on a large catalogue '
+        '(data is rolled back afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=50000)
+        parser.add_argument('--categories', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(**options)
+                raise _Rollback
+        except _Rollback:
+            bump_menu_version()
+            self.stdout.write('Benchmark data rolled back.')
+
+    def _time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return result, timings
+
+    def _run(self, items, categories, repeat, seed, **options):
+        per_category = max(1, items // categories)
+        self.stdout.write(
+            f'Seeding {categories * per_category} menu items '
+            f'({connection.vendor})...'
+        )
+        seed_data(
+            seed=seed, users=0, slots=0, categories=categories,
+            items_per_category=per_category, reservations=0
+        )
+        bump_menu_version()
+
+        if connection.vendor != 'postgresql':
+            started = time.perf_counter()
+            search_index()
+            self.stdout.write(
+                f'In-process index built in '
+                f'{(time.perf_counter() - started) * 1000:.0f} ms'
+            )
+
+        for query, ingredients, free_from in QUERIES:
+            label = query or '(filters only)'
+            found, timings = self._time(
+                lambda: search_menu(query, ingredients, free_from), repeat
+            )
+            self.stdout.write(
+                f'{label:>16}: {len(found):>6} hits, '
+                f'median {timings[len(timings) // 2] * 1000:.2f} ms, '
+                f'max {timings[-1] * 1000:.2f} ms'
+            )
+            request = RequestFactory().get('/api/menu/search/', {
+                'q': query,
+                'ingredient': ','.join(ingredients),
+                'free_from': ','.join(free_from),
+            })
+            response, timings = self._time(
+                lambda: search_menu_view(request), repeat
+            )
+            assert response.status_code == 200, response.content
+            self.stdout.write(
+                f'{"endpoint":>16}: {len(response.content):>6} bytes, '
+                f'median {timings[len(timings) // 2] * 1000:.2f} ms, '
+                f'max {timings[-1] * 1000:.2f} ms'
+            )
+            if query and not ingredients and not free_from:
+                found, timings = self._time(
+                    lambda: icontains_search(query), repeat
+                )
+                self.stdout.write(
+                    f'{"icontains":>16}: {len(found):>6} hits, '
+                    f'median {timings[len(timings) // 2] * 1000:.2f} ms'
+                )
@@ -0,0 +1,81 @@
+"""
+Cancel or move every reservation for a date, slot or date range at once.
+
+Examples::
+
+    manage.py bulk_reservations cancel --date 2025-06-14 --slot 19:00
+    manage.py bulk_reservations move --date 2025-06-14 --slot 19:00 \\
+        --to-slot 20:30
+
+The reservations, occupancy ledger and availability cache are updated in
+one transaction (see ``reservations.bulk``) and each guest is emailed
+unless ``--no-notify`` is given.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations.bulk import cancel_reservations, move_reservations
+from reservations.exports import find_time_slot, parse_date
+from reservations.models import Reservation
+from reservations.occupancy import SlotCapacityError
+
+
+class Command(BaseCommand):
+    help = 'Cancel or move all reservations for a date, slot or date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument('operation', choices=('cancel', 'move'))
+        parser.add_argument('--date', type=parse_date)
+        parser.add_argument('--start', type=parse_date)
+        parser.add_argument('--end', type=parse_date)
+        parser.add_argument(
+            '--slot', help='Only this time slot (start time HH:MM or id)'
+        )
+        parser.add_argument('--to-date', type=parse_date)
+        parser.add_argument('--to-slot', help='Start time HH:MM or id')
+        parser.add_argument(
+            '--enforce-capacity', action='store_true',
+            help='Refuse a move that would overbook a slot'
+        )
+        parser.add_argument(
+            '--no-notify', action='store_true',
+            help='Do not email the guests'
+        )
+
+    def handle(self, *args, **options):
+        start = options['date'] or options['start']
+        end = options['date'] or options['end']
+        if start is None or end is None:
+            raise CommandError('Give --date, or both --start and --end')
+        if start > end:
+            raise CommandError('--start must not be after --end')
+
+        queryset = Reservation.objects.filter(date__range=(start, end))
+        time_slot = find_time_slot(options['slot'])
+        if time_slot:
+            queryset = queryset.filter(time_slot=time_slot)
+        notify = not options['no_notify']
+
+        started = time.perf_counter()
+        if options['operation'] == 'cancel':
+            count = cancel_reservations(queryset, notify=notify)
+            verb = 'Cancelled'
+        else:
+            to_slot = find_time_slot(options['to_slot'])
+            if options['to_date'] is None and to_slot is None:
+                raise CommandError('Give --to-date, --to-slot or both')
+            try:
+                count = move_reservations(
+                    queryset, date=options['to_date'], time_slot=to_slot,
+                    enforce_capacity=options['enforce_capacity'],
+                    notify=notify
+                )
+            except SlotCapacityError as e:
+                raise CommandError(f'Nothing moved: {e}')
+            verb = 'Moved'
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {count} reservations in {elapsed:.0f} ms'
+        ))
@@ -0,0 +1,28 @@
+"""
+Export the whole menu as CSV or JSON.
+
+The output can be edited and loaded back with ``import_menu``.
+"""
+from django.core.management.base import BaseCommand
+
+from reservations.menu_io import FORMATS, export_menu
+
+
+class Command(BaseCommand):
+    help = 'Export menu categories and items as CSV or JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument(
+            '--output', help='File to write (defaults to standard output)'
+        )
+
+    def handle(self, *args, **options):
+        content = export_menu(options['format'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as output:
+                output.write(content)
+            self.stdout.write(f'Menu written to {options["output"]}')
+        else:
+            self.stdout.write(content, ending='')
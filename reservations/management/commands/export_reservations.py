@@ -0,0 +1,64 @@
+"""
+Export reservations as CSV for manifests and month-end reports.
+
+Rows are streamed from the database in chunks and written as they
+arrive, so exports of any size run in constant memory.
+"""
+from django.core.management.base import BaseCommand
+
+from reservations.exports import (
+    CHUNK_SIZE,
+    csv_lines,
+    filter_reservations,
+    find_time_slot,
+    parse_date,
+)
+
+CANCELLED_CHOICES = {'all': None, 'yes': True, 'no': False}
+
+
+class Command(BaseCommand):
+    help = 'Stream reservations as CSV, optionally filtered'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=parse_date)
+        parser.add_argument('--end', type=parse_date)
+        parser.add_argument(
+            '--slot', help='Time slot start time (HH:MM) or id'
+        )
+        parser.add_argument(
+            '--cancelled', choices=CANCELLED_CHOICES, default='no',
+            help='Include cancelled reservations (default: no)'
+        )
+        parser.add_argument(
+            '--excel', action='store_true',
+            help='Start the file with a UTF-8 byte order mark for Excel'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            '--output', help='File to write (defaults to standard output)'
+        )
+
+    def handle(self, *args, **options):
+        time_slot = find_time_slot(options['slot'])
+        queryset = filter_reservations(
+            start=options['start'], end=options['end'], time_slot=time_slot,
+            cancelled=CANCELLED_CHOICES[options['cancelled']]
+        )
+        lines = csv_lines(
+            queryset, excel=options['excel'],
+            chunk_size=options['chunk_size']
+        )
+
+        if options['output']:
+            rows = -1
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as output:
+                for line in lines:
+                    output.write(line)
+                    rows += 1
+            self.stderr.write(f'{rows} reservations written to '
+                              f'{options["output"]}')
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,32 @@
+"""
+Mark menu images stuck in ``pending`` as failed.
+
+Background uploads (``reservations.uploads``) are held in a web worker's
+memory, so a worker restart loses them and leaves their items pending
+forever. Run this from a scheduler (e.g. every 15 minutes with Heroku
+Scheduler or cron); staff then see "Upload failed" and can choose the
+image again.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations.uploads import fail_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Mark menu images pending for too long as failed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutes', type=int,
+            default=getattr(settings, 'MENU_IMAGE_UPLOAD_STALE_MINUTES', 15),
+            help='Age after which a pending upload counts as lost'
+        )
+
+    def handle(self, *args, **options):
+        if options['minutes'] < 1:
+            raise CommandError('--minutes must be at least 1')
+        failed = fail_stale_uploads(options['minutes'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{failed} pending uploads marked failed.'
+        ))
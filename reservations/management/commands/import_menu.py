@@ -0,0 +1,64 @@
+"""
+Import the menu from a CSV or JSON file written by ``export_menu``.
+
+Only rows that differ from the database are written, in one transaction,
+and the menu cache version is bumped once at the end.
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations.menu_io import (
+    FORMATS,
+    MenuImportError,
+    import_menu,
+    parse_menu,
+)
+
+
+class Command(BaseCommand):
+    help = 'Create, update (and optionally delete) menu items from a file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='File format (defaults to the file extension)'
+        )
+        parser.add_argument(
+            '--delete-missing', action='store_true',
+            help='Delete items and categories that are not in the file'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report the changes without saving them'
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or os.path.splitext(
+            options['path']
+        )[1].lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise CommandError('Use --format csv or --format json')
+
+        with open(options['path'], encoding='utf-8-sig') as source:
+            text = source.read()
+
+        started = time.perf_counter()
+        try:
+            rows = parse_menu(text, fmt)
+        except MenuImportError as e:
+            raise CommandError(f'Nothing imported:\n{e}')
+        stats = import_menu(
+            rows, delete_missing=options['delete_missing'],
+            dry_run=options['dry_run']
+        )
+
+        for label, count in stats.items():
+            self.stdout.write(f'{label.replace("_", " "):>20}: {count}')
+        self.stdout.write(
+            f'{"Checked" if options["dry_run"] else "Imported"} '
+            f'{len(rows)} rows in {time.perf_counter() - started:.2f}s'
+            + (' (dry run, nothing saved)' if options['dry_run'] else '')
+        )
@@ -0,0 +1,86 @@
+"""
+Generate large volumes of deterministic synthetic data for benchmarking.
+
+Example::
+
+    python manage.py seed_data --reservations 2000000 --users 50000
+
+See ``reservations.seeding`` for the traffic shape that is generated.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from reservations.availability import invalidate_all_availability
+from reservations.seeding import seed
+
+
+class Command(BaseCommand):
+    help = 'Seed users, time slots, menu items and reservations in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Random seed (same seed, same data)')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--slots', type=int, default=30)
+        parser.add_argument('--capacity', type=int, default=200,
+                            help='max_capacity of the generated slots')
+        parser.add_argument('--categories', type=int, default=12)
+        parser.add_argument('--items-per-category', type=int, default=15)
+        parser.add_argument('--reservations', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=90,
+                            help='Spread reservations over this many days')
+        parser.add_argument(
+            '--start',
+            type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+            help='First reservation date (YYYY-MM-DD, defaults to today)'
+        )
+        parser.add_argument('--cancel-rate', type=float, default=0.08)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Use bulk_create even on PostgreSQL'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['slots'] < 1:
+            raise CommandError('--users and --slots must be at least 1')
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+
+        use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        self.stdout.write(
+            'Writing reservations with '
+            + ('COPY' if use_copy else 'bulk_create') + '...'
+        )
+
+        try:
+            stats = seed(
+                seed=options['seed'],
+                users=options['users'],
+                slots=options['slots'],
+                capacity=options['capacity'],
+                categories=options['categories'],
+                items_per_category=options['items_per_category'],
+                reservations=options['reservations'],
+                days=options['days'],
+                start=options['start'],
+                cancel_rate=options['cancel_rate'],
+                batch_size=options['batch_size'],
+                use_copy=use_copy,
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        invalidate_all_availability()
+
+        for label, (rows, seconds) in stats.items():
+            rate = rows / seconds if seconds else 0
+            self.stdout.write(
+                f'{label:>13}: {rows:>9} rows in {seconds:7.2f} s '
+                f'({rate:,.0f} rows/s)'
+            )
+        self.stdout.write(self.style.SUCCESS('Seeding complete.'))
@@ -0,0 +1,54 @@
+"""
+Precompute cached slot availability for the coming days.
+
+Run from a scheduler (e.g. Heroku Scheduler or cron) so the first guest
+of the morning hits a warm cache. Only dates whose entry is missing or
+stale are recomputed.
+
+The command refuses to run against a per-process cache (the default
+local-memory one): it would only warm its own short-lived process. Use
+``AVAILABILITY_PREWARM_INTERVAL`` there instead, which warms each web
+worker from inside it.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations.availability import (
+    availability_cache_shared,
+    warm_availability,
+)
+
+
+class Command(BaseCommand):
+    help = 'Precompute cached availability for the next N days'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            default=getattr(settings, 'AVAILABILITY_PREWARM_DAYS', 14),
+            help='Number of days to warm, starting at --start'
+        )
+        parser.add_argument(
+            '--start',
+            type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+            help='First date to warm (YYYY-MM-DD, defaults to today)'
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        if not availability_cache_shared():
+            raise CommandError(
+                'The availability cache is local to each process, so '
+                'this would not warm the web workers. Configure a shared '
+                'cache (REDIS_URL) or set AVAILABILITY_PREWARM_INTERVAL.'
+            )
+
+        refreshed = warm_availability(options['days'], options['start'])
+        for day in refreshed:
+            self.stdout.write(f'Refreshed {day}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(refreshed)} of {options["days"]} dates recomputed.'
+        ))
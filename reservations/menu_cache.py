@@ -0,0 +1,380 @@
+"""
+Versioned caching for menu data.
+
+A single menu version is replaced whenever a ``MenuCategory`` or
+``MenuItem`` is saved or deleted (see ``reservations.signals``). Anything
+derived from the menu is cached under a key that includes this version,
+so a menu change makes every derived entry unreachable at once without
+having to find and delete them.
+
+The version is stored in the ``MenuVersion`` row, which every worker
+process sees, and copied into the cache so most requests never query it.
+A shared cache is updated by every change and keeps its copy until the
+next one. A per-process cache (the default local-memory one) only hears
+about changes made by its own process, so it keeps its copy for just
+``MENU_VERSION_LOCAL_TTL`` seconds; changes made in other workers show
+up after at most that long.
+"""
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .caching import is_shared
+from .images import image_srcset, sized_image_url
+from .models import MenuCategory, MenuItem, MenuVersion
+
+MENU_VERSION_KEY = 'menu:version'
+
+# Item fields the public menu API can return, in output order
+MENU_API_FIELDS = (
+    'id', 'name', 'description', 'price', 'category', 'ingredients',
+    'allergens', 'calories', 'is_available', 'is_featured', 'order',
+    'image_url',
+)
+
+# Featured dishes shown per category on the homepage
+FEATURED_PER_CATEGORY = 3
+
+# Last homepage snapshot built or fetched by this process: (version, data)
+_homepage_memo = (None, None)
+_homepage_lock = threading.Lock()
+
+# Per-thread nesting depth of single_menu_version() blocks
+_batch = threading.local()
+
+
+def _cache():
+    """Return the cache backend configured for menu data."""
+    return caches[getattr(settings, 'MENU_CACHE_ALIAS', 'default')]
+
+
+def menu_cache_timeout():
+    """Lifetime (seconds) of cached menu data for one version."""
+    return getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def _version_timeout(cache):
+    """How long ``cache`` may keep its copy of the menu version."""
+    if is_shared(cache):
+        return None
+    return getattr(settings, 'MENU_VERSION_LOCAL_TTL', 1)
+
+
+def _stored_menu_version():
+    """Read the version row, starting a version on first use."""
+    versions = MenuVersion.objects.filter(pk=1).values_list(
+        'version', flat=True
+    )
+    version = versions.first()
+    if version is None:
+        MenuVersion.objects.bulk_create(
+            [MenuVersion(pk=1, version=time.time_ns())],
+            ignore_conflicts=True
+        )
+        version = versions.get()
+    return version
+
+
+def menu_version():
+    """
+    Return the current menu version.
+
+    Versions are nanosecond timestamps of the last change. The database
+    row is only read when the cache has no copy of it.
+    """
+    cache = _cache()
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        version = _stored_menu_version()
+        cache.set(MENU_VERSION_KEY, version, _version_timeout(cache))
+    return version
+
+
+async def amenu_version():
+    """Async version of :func:`menu_version`."""
+    cache = _cache()
+    version = await cache.aget(MENU_VERSION_KEY)
+    if version is None:
+        version = await sync_to_async(_stored_menu_version)()
+        await cache.aset(MENU_VERSION_KEY, version, _version_timeout(cache))
+    return version
+
+
+def bump_menu_version():
+    """Start a new menu version after a menu change."""
+    if getattr(_batch, 'depth', 0):
+        # Inside single_menu_version(): bumped once when the block ends
+        return
+    version = time.time_ns()
+    if not MenuVersion.objects.filter(pk=1).update(version=version):
+        MenuVersion.objects.bulk_create(
+            [MenuVersion(pk=1, version=version)], ignore_conflicts=True
+        )
+    cache = _cache()
+    cache.set(MENU_VERSION_KEY, version, _version_timeout(cache))
+
+
+@contextmanager
+def single_menu_version():
+    """
+    Collapse every menu version bump inside the block into one.
+
+    For bulk changes: per-row signal handlers (and their on-commit
+    callbacks, when the block wraps the transaction) would otherwise
+    start a new version for each row. The version is bumped once when
+    the block exits normally; nothing is bumped if it raises.
+    """
+    depth = getattr(_batch, 'depth', 0)
+    _batch.depth = depth + 1
+    try:
+        yield
+    finally:
+        _batch.depth = depth
+    if not depth:
+        bump_menu_version()
+
+
+def image_url(image):
+    """Return the URL of a CloudinaryField value, or None if empty."""
+    return image.url if image else None
+
+
+def build_homepage_snapshot():
+    """
+    Build the homepage menu preview as plain data.
+
+    Featured items are ranked within each category with a
+    ``ROW_NUMBER() OVER (PARTITION BY category)`` window and filtered to
+    the top :data:`FEATURED_PER_CATEGORY` in a single query, so every
+    category keeps its own featured dishes.
+
+    Returns:
+        list: One dict per category with ``id``, ``name`` and
+        ``featured_items`` (dicts of the fields the template shows)
+    """
+    return _snapshot(
+        _featured_items(), MenuCategory.objects.only('id', 'name')
+    )
+
+
+async def abuild_homepage_snapshot():
+    """Async version of :func:`build_homepage_snapshot`."""
+    featured = [item async for item in _featured_items()]
+    categories = [
+        category async for category in MenuCategory.objects.only('id', 'name')
+    ]
+    return _snapshot(featured, categories)
+
+
+def _featured_items():
+    """Top featured, available items of each category (one query)."""
+    return (
+        MenuItem.objects
+        .filter(is_available=True, is_featured=True)
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=F('category_id'),
+            order_by=[F('order').asc(), F('name').asc()]
+        ))
+        .filter(rank__lte=FEATURED_PER_CATEGORY)
+        .order_by('category_id', 'order', 'name')
+    )
+
+
+def _snapshot(featured, categories):
+    """Group loaded featured items under their categories."""
+    items_by_category = {}
+    for item in featured:
+        items_by_category.setdefault(item.category_id, []).append({
+            'name': item.name,
+            'description': item.description,
+            'price': item.price,
+            'ingredients': item.ingredients,
+            'calories': item.calories,
+            'is_featured': item.is_featured,
+            'image_url': sized_image_url(item.image),
+            'image_srcset': image_srcset(item.image),
+        })
+
+    return [
+        {
+            'id': category.id,
+            'name': category.name,
+            'featured_items': items_by_category.get(category.id, []),
+        }
+        for category in categories
+    ]
+
+
+def homepage_snapshot():
+    """
+    Return the homepage menu preview for the current menu version.
+
+    The snapshot is served from process memory while the version is
+    unchanged, then from the shared cache, and is only rebuilt from the
+    database once per menu version.
+    """
+    global _homepage_memo
+
+    version = menu_version()
+    memo_version, data = _homepage_memo
+    if memo_version == version:
+        return data
+
+    with _homepage_lock:
+        cache = _cache()
+        key = f'menu:homepage:{version}'
+        data = cache.get(key)
+        if data is None:
+            data = build_homepage_snapshot()
+            cache.set(key, data, menu_cache_timeout())
+        _homepage_memo = (version, data)
+    return data
+
+
+async def ahomepage_snapshot():
+    """
+    Async version of :func:`homepage_snapshot`.
+
+    Shares the process memo and cache entries. The memo is read without
+    the thread lock (it is replaced in one assignment); a cold version
+    may then be built twice concurrently, which is harmless.
+    """
+    global _homepage_memo
+
+    version = await amenu_version()
+    memo_version, data = _homepage_memo
+    if memo_version == version:
+        return data
+
+    cache = _cache()
+    key = f'menu:homepage:{version}'
+    data = await cache.aget(key)
+    if data is None:
+        data = await abuild_homepage_snapshot()
+        await cache.aset(key, data, menu_cache_timeout())
+    _homepage_memo = (version, data)
+    return data
+
+
+def build_menu_api_data():
+    """
+    Load every category and item for the menu API as plain data.
+
+    Uses two ``values()`` queries and resolves each Cloudinary image URL
+    once, so filtered payloads can be cut from the result without
+    touching the database again.
+
+    Returns:
+        dict: ``categories`` and ``items`` lists in menu order
+    """
+    categories = list(
+        MenuCategory.objects.values('id', 'name', 'description', 'order')
+    )
+    items = _api_items(
+        MenuItem.objects.order_by('category__order', 'order', 'name')
+    )
+    return {'categories': categories, 'items': items}
+
+
+def _api_items(queryset):
+    """Read menu API item dicts from a ``MenuItem`` queryset."""
+    columns = [field for field in MENU_API_FIELDS if field != 'image_url']
+    items = []
+    for row in queryset.values(*columns, 'image'):
+        row['image_url'] = image_url(row.pop('image'))
+        items.append(row)
+    return items
+
+
+def menu_api_items(ids):
+    """
+    Return menu API item dicts for ``ids``, in that order (one query).
+
+    For callers that need only a few items, such as a page of search
+    results: loading the whole per-version catalogue with
+    :func:`menu_api_data` would cost far more than the lookup itself.
+    """
+    by_id = {
+        item['id']: item
+        for item in _api_items(MenuItem.objects.filter(pk__in=ids))
+    }
+    return [by_id[item_id] for item_id in ids if item_id in by_id]
+
+
+def menu_api_data(cache=None, version=None):
+    """Return :func:`build_menu_api_data` cached for the menu version."""
+    cache = cache or _cache()
+    version = version or menu_version()
+    key = f'menu:api-data:{version}'
+    data = cache.get(key)
+    if data is None:
+        data = build_menu_api_data()
+        cache.set(key, data, menu_cache_timeout())
+    return data
+
+
+def menu_api_payload(fields=MENU_API_FIELDS, categories=None, available=None):
+    """
+    Return the serialized menu API response for the current menu version.
+
+    Each distinct combination of arguments is serialized once per menu
+    version and then served as a ready JSON string from the
+    ``MENU_API_CACHE_ALIAS`` cache. Arguments come from public query
+    strings, so that cache is kept apart from the one holding the menu
+    version and availability tokens: filling it can only evict other
+    payloads.
+
+    Args:
+        fields: Item fields to include, a subset of :data:`MENU_API_FIELDS`
+        categories: Category ids to restrict items to (None for all)
+        available: Only available (True) or unavailable (False) items,
+            or None for both
+
+    Returns:
+        str: JSON with ``version``, ``categories`` and ``items``
+    """
+    fields = [field for field in MENU_API_FIELDS if field in fields]
+    categories = sorted(set(categories)) if categories is not None else None
+
+    cache = caches[getattr(
+        settings, 'MENU_API_CACHE_ALIAS',
+        getattr(settings, 'MENU_CACHE_ALIAS', 'default')
+    )]
+    version = menu_version()
+    params = hashlib.md5(
+        repr((fields, categories, available)).encode()
+    ).hexdigest()
+    key = f'menu:api:{version}:{params}'
+
+    payload = cache.get(key)
+    if payload is None:
+        data = menu_api_data(version=version)
+        items = [
+            {field: item[field] for field in fields}
+            for item in data['items']
+            if (categories is None or item['category'] in categories)
+            and (available is None or item['is_available'] == available)
+        ]
+        payload = json.dumps(
+            {
+                'version': str(version),
+                'categories': [
+                    category for category in data['categories']
+                    if categories is None or category['id'] in categories
+                ],
+                'items': items,
+            },
+            cls=DjangoJSONEncoder
+        )
+        cache.set(key, payload, menu_cache_timeout())
+    return payload
@@ -0,0 +1,343 @@
+"""
+Bulk menu import and export as CSV or JSON.
+
+Both formats hold one row per menu item with its category's name, order
+and description repeated on each row. Categories are matched by name and
+items by ``(category, name)``, so a file exported, edited in a
+spreadsheet and imported again only touches the rows that changed.
+
+An import is validated completely before anything is written, then
+applied in one transaction with ``bulk_create``/``bulk_update`` and a
+single menu version bump (see ``reservations.menu_cache``).
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+from contextlib import nullcontext
+from decimal import Decimal, InvalidOperation
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .menu_cache import single_menu_version
+from .models import MenuCategory, MenuItem
+from .search import parse_allergens
+
+FORMATS = ('csv', 'json')
+
+COLUMNS = (
+    'category', 'category_order', 'category_description', 'name',
+    'description', 'price', 'ingredients', 'allergens', 'calories',
+    'is_available', 'is_featured', 'order',
+)
+
+# Item fields compared and written by an import
+ITEM_FIELDS = (
+    'description', 'price', 'ingredients', 'allergens', 'calories',
+    'is_available', 'is_featured', 'order',
+)
+
+BATCH_SIZE = 500
+
+_TRUE = {'true', '1', 'yes', 'y'}
+_FALSE = {'false', '0', 'no', 'n', ''}
+
+
+class MenuImportError(ValueError):
+    """Raised when an import file is malformed; nothing is written."""
+
+
+def export_rows(items=None):
+    """
+    Return menu items as import/export rows, in menu order.
+
+    Args:
+        items: MenuItem queryset to export (defaults to the whole menu)
+    """
+    items = MenuItem.objects.all() if items is None else items
+    rows = (
+        items
+        .order_by('category__order', 'category__name', 'order', 'name')
+        .values('name', *ITEM_FIELDS, 'category__name', 'category__order',
+                'category__description')
+    )
+    return [
+        {
+            'category': row['category__name'],
+            'category_order': row['category__order'],
+            'category_description': row['category__description'],
+            **{column: row[column] for column in ('name',) + ITEM_FIELDS},
+        }
+        for row in rows
+    ]
+
+
+def export_menu(fmt, items=None):
+    """
+    Serialise menu items as CSV or JSON text.
+
+    Args:
+        fmt: ``csv`` or ``json``
+        items: MenuItem queryset to export (defaults to the whole menu)
+    """
+    rows = export_rows(items)
+    if fmt == 'json':
+        return json.dumps(
+            [{column: row[column] for column in COLUMNS} for row in rows],
+            cls=DjangoJSONEncoder, indent=2
+        )
+
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            column: (str(value).lower() if isinstance(value, bool)
+                     else '' if value is None else value)
+            for column, value in row.items()
+        })
+    return output.getvalue()
+
+
+def _text(row, column, max_length=None, required=False):
+    value = str(row.get(column) or '').strip()
+    if required and not value:
+        raise ValueError(f'{column} is required')
+    if max_length and len(value) > max_length:
+        raise ValueError(f'{column} is longer than {max_length} characters')
+    return value
+
+
+def _integer(row, column, default=None):
+    value = row.get(column)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{column} must be a whole number')
+    if value < 0:
+        raise ValueError(f'{column} cannot be negative')
+    return value
+
+
+def _boolean(row, column, default):
+    value = row.get(column)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise ValueError(f'{column} must be true or false')
+
+
+def _price(row):
+    try:
+        price = Decimal(str(row.get('price', '')).strip())
+    except InvalidOperation:
+        raise ValueError('price must be a number')
+    if price < Decimal('0.01') or price >= Decimal('10000'):
+        raise ValueError('price must be between 0.01 and 9999.99')
+    return price.quantize(Decimal('0.01'))
+
+
+def clean_row(row):
+    """
+    Validate one import row and convert it to model values.
+
+    Raises:
+        ValueError: Describing the first invalid column
+    """
+    allergens = ', '.join(parse_allergens(row.get('allergens')))
+    return {
+        'category': _text(row, 'category', 100, required=True),
+        'category_order': _integer(row, 'category_order', 0),
+        'category_description': _text(row, 'category_description'),
+        'name': _text(row, 'name', 200, required=True),
+        'description': _text(row, 'description'),
+        'price': _price(row),
+        'ingredients': _text(row, 'ingredients'),
+        'allergens': allergens,
+        'calories': _integer(row, 'calories'),
+        'is_available': _boolean(row, 'is_available', True),
+        'is_featured': _boolean(row, 'is_featured', False),
+        'order': _integer(row, 'order', 0),
+    }
+
+
+def parse_menu(text, fmt):
+    """
+    Read and validate an import file.
+
+    Args:
+        text: File contents
+        fmt: ``csv`` or ``json``
+
+    Returns:
+        list: Cleaned rows (see :func:`clean_row`)
+
+    Raises:
+        MenuImportError: Listing every invalid row (up to 20)
+    """
+    if fmt == 'json':
+        try:
+            rows = json.loads(text)
+        except ValueError as e:
+            raise MenuImportError(f'Invalid JSON: {e}')
+        if not isinstance(rows, list) or not all(
+            isinstance(row, dict) for row in rows
+        ):
+            raise MenuImportError('JSON must be a list of objects')
+        first_line = 1
+    else:
+        reader = csv.DictReader(io.StringIO(text.lstrip('\ufeff')))
+        missing = {'category', 'name', 'price'} - set(reader.fieldnames or ())
+        if missing:
+            raise MenuImportError(
+                f'Missing columns: {", ".join(sorted(missing))}'
+            )
+        rows = list(reader)
+        first_line = 2
+
+    cleaned = []
+    errors = []
+    seen = set()
+    for line, row in enumerate(rows, start=first_line):
+        try:
+            row = clean_row(row)
+        except ValueError as e:
+            errors.append(f'Row {line}: {e}')
+            continue
+        key = (row['category'], row['name'])
+        if key in seen:
+            errors.append(f'Row {line}: duplicate item "{key[1]}" '
+                          f'in "{key[0]}"')
+        seen.add(key)
+        cleaned.append(row)
+
+    if errors:
+        raise MenuImportError('\n'.join(errors[:20]))
+    return cleaned
+
+
+def import_menu(rows, delete_missing=False, dry_run=False):
+    """
+    Apply cleaned rows to the menu, writing only what changed.
+
+    Args:
+        rows: Output of :func:`parse_menu`
+        delete_missing: Delete items (and categories) not in ``rows``
+        dry_run: Work out the changes, then roll them back
+
+    Returns:
+        dict: Counts of created, updated, unchanged and deleted
+        categories and items
+    """
+    stats = dict.fromkeys((
+        'categories_created', 'categories_updated', 'categories_deleted',
+        'items_created', 'items_updated', 'items_unchanged',
+        'items_deleted',
+    ), 0)
+
+    # One bump for the whole import, none if it is rolled back
+    versioning = nullcontext() if dry_run else single_menu_version()
+    with versioning, transaction.atomic():
+        categories = _apply_categories(rows, stats)
+        _apply_items(rows, categories, stats, delete_missing)
+
+        if delete_missing:
+            wanted = {row['category'] for row in rows}
+            stale = MenuCategory.objects.exclude(name__in=wanted)
+            stats['categories_deleted'] = stale.count()
+            stale.delete()
+
+        if dry_run:
+            transaction.set_rollback(True)
+    return stats
+
+
+def _apply_categories(rows, stats):
+    """Create or update categories; return ``{name: MenuCategory}``."""
+    existing = {category.name: category
+                for category in MenuCategory.objects.all()}
+    new, changed, seen = [], [], set()
+    for row in rows:
+        name = row['category']
+        # The first row of each category sets its order and description
+        if name in seen:
+            continue
+        seen.add(name)
+        if name in existing:
+            category = existing[name]
+            if (category.order, category.description) != (
+                row['category_order'], row['category_description']
+            ):
+                category.order = row['category_order']
+                category.description = row['category_description']
+                changed.append(category)
+        else:
+            existing[name] = MenuCategory(
+                name=name, order=row['category_order'],
+                description=row['category_description']
+            )
+            new.append(existing[name])
+
+    MenuCategory.objects.bulk_create(new, batch_size=BATCH_SIZE)
+    MenuCategory.objects.bulk_update(
+        changed, ['order', 'description'], batch_size=BATCH_SIZE
+    )
+    stats['categories_created'] = len(new)
+    stats['categories_updated'] = len(changed)
+    return existing
+
+
+def _apply_items(rows, categories, stats, delete_missing):
+    """Create, update and optionally delete items to match ``rows``."""
+    existing = {
+        (item.category.name, item.name): item
+        for item in MenuItem.objects.select_related('category').only(
+            'name', 'category__name', *ITEM_FIELDS
+        )
+    }
+    new = []
+    # Changed items grouped by which fields changed, so each bulk_update
+    # only rewrites those columns (a price change touches one column)
+    changed = defaultdict(list)
+    for row in rows:
+        key = (row['category'], row['name'])
+        item = existing.pop(key, None)
+        if item is None:
+            new.append(MenuItem(
+                name=row['name'], category=categories[row['category']],
+                **{field: row[field] for field in ITEM_FIELDS}
+            ))
+            continue
+        fields = tuple(
+            field for field in ITEM_FIELDS
+            if getattr(item, field) != row[field]
+        )
+        if fields:
+            for field in fields:
+                setattr(item, field, row[field])
+            changed[fields].append(item)
+        else:
+            stats['items_unchanged'] += 1
+
+    MenuItem.objects.bulk_create(new, batch_size=BATCH_SIZE)
+    for fields, items in changed.items():
+        MenuItem.objects.bulk_update(items, fields, batch_size=BATCH_SIZE)
+    stats['items_created'] = len(new)
+    stats['items_updated'] = sum(len(items) for items in changed.values())
+
+    if delete_missing and existing:
+        stale = [item.pk for item in existing.values()]
+        for start in range(0, len(stale), BATCH_SIZE):
+            MenuItem.objects.filter(
+                pk__in=stale[start:start + BATCH_SIZE]
+            ).delete()
+        stats['items_deleted'] = len(stale)
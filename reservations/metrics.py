@@ -0,0 +1,360 @@
+"""
+Prometheus-style metrics without an external client library.
+
+Each process counts requests per URL name, method and status, request
+latency per URL name (a histogram), booking form outcomes and
+availability cache lookups. The ``/metrics`` view serves them in the
+Prometheus text format.
+
+With several gunicorn workers, each worker sees only its own requests,
+so set ``METRICS_DIR`` to a directory shared by the workers: every
+process then writes its samples to ``<pid>-<start time>.json`` there (at
+most once per ``METRICS_FLUSH_INTERVAL`` seconds, and at exit), and a
+scrape adds up all the files. The start time keeps a new process that
+reuses an old pid from overwriting its file. Samples of exited workers
+are kept so counters never go backwards, but not file by file: the
+gunicorn configs' ``child_exit`` hook folds each exited worker's file
+into one aggregate file (:func:`merge_exited_worker`), so the directory
+holds one file per live worker plus one, however often workers are
+recycled. Clear the directory when deploying.
+
+Everything is off unless ``METRICS_ENABLED`` is set.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+# Upper bounds (seconds) of the request latency histogram buckets
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+BOOKING_OUTCOMES = ('success', 'capacity_rejected', 'invalid', 'error')
+
+AVAILABILITY_RESULTS = ('hit', 'miss', 'stale_hit')
+
+# name: (type, help) for every metric family this module exports
+FAMILIES = {
+    'http_requests_total': (
+        'counter', 'Requests by URL name, method and status code'
+    ),
+    'http_request_duration_seconds': (
+        'histogram', 'Request latency by URL name'
+    ),
+    'booking_outcomes_total': (
+        'counter', 'Booking form submissions by outcome'
+    ),
+    'availability_cache_lookups_total': (
+        'counter', 'Availability cache lookups by result'
+    ),
+    'availability_cache_hit_ratio': (
+        'gauge', 'Share of availability lookups served from the cache'
+    ),
+}
+
+
+# Samples of exited workers, written by merge_exited_worker()
+AGGREGATE_FILE = 'exited-workers.json'
+
+
+def enabled():
+    return getattr(settings, 'METRICS_ENABLED', False)
+
+
+class MetricsRegistry:
+    """
+    Samples counted by this process, optionally mirrored to a file.
+
+    Samples are stored flat as ``{(name, labels): value}``, where
+    ``labels`` is a tuple of ``(label, value)`` pairs; histograms are
+    kept as their ``_bucket``, ``_sum`` and ``_count`` samples. This makes
+    merging processes a plain sum.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._samples = defaultdict(float)
+        self._pid = None
+        self._flushed = 0.0
+        self._check_fork()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _check_fork(self):
+        # A forked worker must not report its parent's samples as its own
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._filename = f'{self._pid}-{time.time_ns()}.json'
+            self._samples.clear()
+
+    def inc(self, name, labels=(), amount=1):
+        """Add ``amount`` to a counter."""
+        with self._lock:
+            self._check_fork()
+            self._samples[name, labels] += amount
+        self._maybe_flush()
+
+    def observe(self, name, labels, value, buckets=DURATION_BUCKETS):
+        """Record one histogram observation."""
+        with self._lock:
+            self._check_fork()
+            samples = self._samples
+            for bound in buckets:
+                if value <= bound:
+                    samples[f'{name}_bucket', labels + (('le', bound),)] += 1
+            samples[f'{name}_bucket', labels + (('le', '+Inf'),)] += 1
+            samples[f'{name}_sum', labels] += value
+            samples[f'{name}_count', labels] += 1
+        self._maybe_flush()
+
+    def snapshot(self):
+        """Return a copy of this process's samples."""
+        with self._lock:
+            self._check_fork()
+            return dict(self._samples)
+
+    def _maybe_flush(self):
+        if self.directory and (
+            time.monotonic() - self._flushed >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """Write this process's samples to its file (atomically)."""
+        if not self.directory:
+            return
+        self._flushed = time.monotonic()
+        _write_json(
+            self.directory, self._filename, _to_rows(self.snapshot())
+        )
+
+    def collect(self):
+        """
+        Return samples summed over every process sharing the directory.
+
+        This process's own samples are read live rather than from its
+        (possibly stale) file.
+        """
+        own = self.snapshot()
+        totals = defaultdict(float)
+        if self.directory:
+            # A worker file merged away mid-read would be missed; the
+            # next read sees it in the aggregate instead
+            for _ in range(2):
+                totals, complete = self._read_files()
+                if complete:
+                    break
+        for key, value in own.items():
+            totals[key] += value
+        return totals
+
+    def _read_files(self):
+        """Sum the other processes' files; also say if none vanished."""
+        totals = defaultdict(float)
+        aggregate = _read_json(self.directory, AGGREGATE_FILE) or {
+            'merged': [], 'rows': []
+        }
+        _add_rows(totals, aggregate['rows'])
+        # Files already counted in the aggregate, but not yet deleted
+        skip = set(aggregate['merged']) | {self._filename, AGGREGATE_FILE}
+        complete = True
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json') or filename in skip:
+                continue
+            rows = _read_json(self.directory, filename)
+            if rows is None:
+                complete = False
+                continue
+            _add_rows(totals, rows)
+        return totals, complete
+
+
+def _to_rows(samples):
+    return [
+        [name, [list(pair) for pair in labels], value]
+        for (name, labels), value in samples.items()
+    ]
+
+
+def _add_rows(totals, rows):
+    for name, labels, value in rows:
+        totals[name, tuple(tuple(pair) for pair in labels)] += value
+
+
+def _read_json(directory, filename):
+    """Return a file's JSON content, or None if it is gone or unreadable."""
+    try:
+        with open(os.path.join(directory, filename)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(directory, filename, data):
+    """Replace a file atomically, so readers see old or new content."""
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(handle, 'w') as output:
+        json.dump(data, output)
+    os.replace(temporary, os.path.join(directory, filename))
+
+
+def merge_exited_worker(directory, pid):
+    """
+    Fold the files of an exited worker process into the aggregate file.
+
+    Called by the gunicorn master (a single process) when a worker exits,
+    so ``directory`` does not grow with every recycled worker. The
+    aggregate is written, listing the merged files, before they are
+    deleted: a concurrent scrape skips them once the new aggregate is in
+    place, so it never counts a worker twice.
+    """
+    present = set(os.listdir(directory))
+    aggregate = _read_json(directory, AGGREGATE_FILE) or {
+        'merged': [], 'rows': []
+    }
+    exited = [
+        filename for filename in present
+        if filename.startswith(f'{pid}-') and filename.endswith('.json')
+        and filename not in aggregate['merged']
+    ]
+    if not exited:
+        return
+
+    totals = defaultdict(float)
+    _add_rows(totals, aggregate['rows'])
+    for filename in exited:
+        _add_rows(totals, _read_json(directory, filename) or [])
+    _write_json(directory, AGGREGATE_FILE, {
+        # Names deleted by earlier merges no longer need listing
+        'merged': [
+            filename for filename in aggregate['merged']
+            if filename in present
+        ] + exited,
+        'rows': _to_rows(totals),
+    })
+    for filename in exited:
+        try:
+            os.remove(os.path.join(directory, filename))
+        except OSError:
+            pass
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def registry():
+    """Return this process's registry, creating it on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry(
+                getattr(settings, 'METRICS_DIR', None),
+                getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)
+            )
+            atexit.register(_registry.flush)
+        return _registry
+
+
+def record_request(view, method, status, seconds):
+    """Count one request and its latency."""
+    metrics = registry()
+    metrics.inc('http_requests_total', (
+        ('view', view), ('method', method), ('status', str(status)),
+    ))
+    metrics.observe('http_request_duration_seconds', (('view', view),),
+                    seconds)
+
+
+def record_booking(outcome):
+    """Count one booking form submission (no-op when disabled)."""
+    if enabled():
+        registry().inc('booking_outcomes_total', (('outcome', outcome),))
+
+
+def record_availability_lookup(result):
+    """Count one availability cache lookup (no-op when disabled)."""
+    if enabled():
+        registry().inc(
+            'availability_cache_lookups_total', (('result', result),)
+        )
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _family(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        base = name[:-len(suffix)]
+        if name.endswith(suffix) and base in FAMILIES:
+            return base
+    return name
+
+
+def render():
+    """Return every metric in the Prometheus text exposition format."""
+    samples = registry().collect()
+    # Keep every outcome visible, even before it first happens
+    for outcome in BOOKING_OUTCOMES:
+        samples.setdefault(
+            ('booking_outcomes_total', (('outcome', outcome),)), 0
+        )
+    lookups = {
+        result: samples.setdefault(
+            ('availability_cache_lookups_total', (('result', result),)), 0
+        )
+        for result in AVAILABILITY_RESULTS
+    }
+    total = sum(lookups.values())
+    if total:
+        samples['availability_cache_hit_ratio', ()] = round(
+            (lookups['hit'] + lookups['stale_hit']) / total, 4
+        )
+
+    grouped = defaultdict(list)
+    for (name, labels), value in samples.items():
+        grouped[_family(name)].append((name, labels, value))
+
+    lines = []
+    for family in sorted(grouped):
+        if family in FAMILIES:
+            kind, description = FAMILIES[family]
+            lines.append(f'# HELP {family} {description}')
+            lines.append(f'# TYPE {family} {kind}')
+        for name, labels, value in sorted(
+            grouped[family], key=lambda sample: _sort_key(*sample[:2])
+        ):
+            lines.append(
+                f'{name}{_format_labels(labels)} {_format_value(value)}'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+def _sort_key(name, labels):
+    # Buckets in numeric order, with +Inf last
+    return name, [
+        (label, float('inf') if value == '+Inf' else value)
+        if label == 'le' else (label, str(value))
+        for label, value in labels
+    ]
@@ -0,0 +1,359 @@
+"""
+Per-request instrumentation: timing and metrics.
+
+:class:`RequestTimingMiddleware` records, for each request, the number of
+SQL queries and the time spent in them, the time spent rendering
+templates, the time spent in the view and the total. The figures are
+logged as one JSON line on the ``reservations.timing`` logger; requests
+slower than ``SLOW_REQUEST_THRESHOLD_MS`` are logged as warnings together
+with their slowest queries. Staff users also get them as a
+``Server-Timing`` header (shown in the browser's network panel); set
+``SERVER_TIMING_PUBLIC`` to send it to everyone, e.g. in staging.
+
+The view time is measured by :class:`ViewTimingMiddleware`, which sits
+last in ``MIDDLEWARE`` so its ``process_view`` runs after every other
+one: it covers the view and its template response, not other middleware.
+
+It is off unless ``REQUEST_TIMING_ENABLED`` is set. When off, Django drops
+the middleware at startup (``MiddlewareNotUsed``) and no database or
+template hooks are installed, so there is no per-request cost at all.
+
+Measurements are held in a context variable, so they follow the request
+into ``sync_to_async`` threads under ASGI.
+
+:class:`MetricsMiddleware` feeds the request counters and latency
+histograms served at ``/metrics`` (see ``reservations.metrics``).
+
+:class:`ProfilingMiddleware` runs single staff requests under a profiler
+on demand (see ``reservations.profiling``).
+"""
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+
+from . import metrics, profiling
+
+logger = logging.getLogger('reservations.timing')
+
+# Characters of SQL kept for each slow query in the log
+SQL_PREVIEW_LENGTH = 500
+
+_current = contextvars.ContextVar('request_timings', default=None)
+_install_lock = threading.Lock()
+_installed = False
+
+
+class RequestTimings:
+    """Figures collected for one request."""
+
+    def __init__(self, slow_query_count):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_finished = None
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self._template_depth = 0
+        self._slow_query_count = slow_query_count
+        # Min-heap of (ms, n, sql) holding the slowest queries so far
+        self._slowest = []
+        self._order = itertools.count()
+
+    def add_query(self, sql, ms):
+        self.queries += 1
+        self.db_ms += ms
+        if not self._slow_query_count:
+            return
+        entry = (ms, next(self._order), sql)
+        if len(self._slowest) < self._slow_query_count:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heappushpop(self._slowest, entry)
+
+    def slowest_queries(self):
+        """Return ``[{'ms': ..., 'sql': ...}]``, slowest first."""
+        return [
+            {'ms': round(ms, 2), 'sql': sql[:SQL_PREVIEW_LENGTH]}
+            for ms, _, sql in sorted(self._slowest, reverse=True)
+        ]
+
+
+def _time_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the request."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(sql, (time.perf_counter() - started) * 1000)
+
+
+def _wrap_connection(connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _timed_render(render):
+    """Wrap ``Template.render``, counting only outermost renders."""
+
+    def timed_render(self, context):
+        timings = _current.get()
+        if timings is None:
+            return render(self, context)
+        # {% include %} renders nested templates; count the outer one only
+        timings._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            timings._template_depth -= 1
+            if not timings._template_depth:
+                timings.template_ms += (
+                    (time.perf_counter() - started) * 1000
+                )
+
+    return timed_render
+
+
+def install_hooks():
+    """Hook query execution and template rendering (once per process)."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        # Connections are per thread; wrap each one as it connects, plus
+        # any this thread has already opened
+        connection_created.connect(_wrap_connection)
+        for connection in connections.all(initialized_only=True):
+            _wrap_connection(connection)
+        Template.render = _timed_render(Template.render)
+        _installed = True
+
+
+class RequestTimingMiddleware:
+    """Report SQL, template and view time per request (see module doc)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500)
+        self.slow_query_count = getattr(
+            settings, 'SLOW_REQUEST_QUERY_COUNT', 5
+        )
+        install_hooks()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings(self.slow_query_count)
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._report(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings(self.slow_query_count)
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._report(request, response, timings)
+
+    def _report(self, request, response, timings):
+        """Log the request and add the Server-Timing header if allowed."""
+        total_ms = (time.perf_counter() - timings.started) * 1000
+        view_ms = None
+        # Unset when a middleware answered before the view was called
+        if timings.view_finished is not None:
+            view_ms = (timings.view_finished - timings.view_started) * 1000
+
+        if self._show_header(request):
+            entries = [
+                f'db;dur={timings.db_ms:.1f};'
+                f'desc="{timings.queries} queries"',
+                f'tpl;dur={timings.template_ms:.1f};desc="Templates"',
+            ]
+            if view_ms is not None:
+                entries.append(f'view;dur={view_ms:.1f};desc="View"')
+            entries.append(f'total;dur={total_ms:.1f};desc="Total"')
+            response['Server-Timing'] = ', '.join(entries)
+
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'view_ms': round(view_ms, 1) if view_ms is not None else None,
+            'db_ms': round(timings.db_ms, 1),
+            'queries': timings.queries,
+            'template_ms': round(timings.template_ms, 1),
+        }
+        if total_ms >= self.slow_ms:
+            record['slow_queries'] = timings.slowest_queries()
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+        return response
+
+    def _show_header(self, request):
+        """
+        Whether the client may see the timings.
+
+        They reveal how much work a page does, which helps anyone trying
+        to find slow (expensive to request) URLs, so only staff get them.
+        """
+        if getattr(settings, 'SERVER_TIMING_PUBLIC', False):
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+
+class ViewTimingMiddleware:
+    """
+    Time the view for :class:`RequestTimingMiddleware`.
+
+    Must be last in ``MIDDLEWARE``: middleware ``process_view`` hooks run
+    in order, so this one runs just before the view is called, and its
+    ``get_response`` returns as soon as the view's response is rendered.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self._finish()
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self._finish()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = _current.get()
+        if timings is not None:
+            timings.view_started = time.perf_counter()
+
+    def _finish(self):
+        timings = _current.get()
+        if timings is not None and timings.view_started is not None:
+            timings.view_finished = time.perf_counter()
+
+
+class MetricsMiddleware:
+    """
+    Count requests and their latency per URL name for ``/metrics``.
+
+    Removed at startup unless ``METRICS_ENABLED`` is set.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics.enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, started)
+        return response
+
+    def _record(self, request, response, started):
+        match = getattr(request, 'resolver_match', None)
+        # Label by URL name, never by path, to keep the series bounded
+        view = (match.view_name or 'unnamed') if match else 'unmatched'
+        metrics.record_request(
+            view, request.method, response.status_code,
+            time.perf_counter() - started
+        )
+
+
+class ProfilingMiddleware:
+    """
+    Profile a request when a staff user asks for it.
+
+    Removed at startup unless ``PROFILING_ENABLED`` is set; other
+    requests only pay for a header and query string lookup. Async
+    capable, so it adds no sync/async switch to an ASGI chain; profiled
+    requests run on the view's thread (see ``reservations.profiling``).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = profiling.requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        return profiling.profile_request(mode, request, self.get_response)
+
+    async def __acall__(self, request):
+        # Only requests asking for a profile load the user from the session
+        if profiling.asked_mode(request) is None:
+            return await self.get_response(request)
+        mode = await sync_to_async(profiling.requested_mode)(request)
+        if mode is None:
+            return await self.get_response(request)
+        return await profiling.aprofile_request(
+            mode, request, self.get_response
+        )
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_occupancy(apps, schema_editor):
+    """Build the ledger from existing non-cancelled reservations."""
+    Reservation = apps.get_model('reservations', 'Reservation')
+    SlotOccupancy = apps.get_model('reservations', 'SlotOccupancy')
+
+    totals = (
+        Reservation.objects
+        .filter(is_cancelled=False)
+        .order_by()
+        .values('date', 'time_slot')
+        .annotate(total=models.Sum('guests'))
+    )
+    SlotOccupancy.objects.bulk_create(
+        [
+            SlotOccupancy(
+                date=row['date'],
+                time_slot_id=row['time_slot'],
+                booked_guests=row['total']
+            )
+            for row in totals.iterator()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0005_alter_menuitem_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Reservation date (YYYY-MM-DD)')),
+                ('booked_guests', models.PositiveIntegerField(default=0, help_text='Guests held by non-cancelled reservations')),
+                ('time_slot', models.ForeignKey(help_text='Time slot the total applies to', on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='reservations.timeslot')),
+            ],
+            options={
+                'verbose_name': 'Slot Occupancy',
+                'verbose_name_plural': 'Slot Occupancy',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='slotoccupancy',
+            constraint=models.UniqueConstraint(fields=('date', 'time_slot'), name='unique_slot_occupancy'),
+        ),
+        migrations.RunPython(populate_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:35
+
+from django.db import migrations, models
+import reservations.models
+
+SEARCH_INDEX = 'menuitem_search_idx'
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Add a GIN full-text index on PostgreSQL.
+
+    The expression must stay identical to ``SEARCH_DOCUMENT`` in
+    ``reservations.search`` for the planner to use it. Other databases
+    use the in-process search index instead.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f"CREATE INDEX {SEARCH_INDEX} ON reservations_menuitem USING GIN "
+        "(to_tsvector('english', "
+        "coalesce(name, '') || ' ' || "
+        "coalesce(description, '') || ' ' || "
+        "coalesce(ingredients, '') || ' ' || "
+        "coalesce(allergens, '')))"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0007_reservation_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='allergens',
+            field=models.CharField(blank=True, help_text="Comma-separated allergens (e.g. 'gluten, milk, nuts')", max_length=200, validators=[reservations.models.validate_allergens]),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
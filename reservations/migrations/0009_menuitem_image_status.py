@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0008_menuitem_allergens_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Ready'), ('pending', 'Uploading'), ('failed', 'Upload failed')], default='ready', editable=False, help_text='Set while a new image is uploaded in the background', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0010_menuversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='image_pending_since',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
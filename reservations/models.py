@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 from cloudinary.models import CloudinaryField
@@ -88,6 +89,29 @@ class Reservation(models.Model):
         ordering = ['date', 'time_slot__start_time']  # Earliest first
         verbose_name = "Reservation"
         verbose_name_plural = "Reservations"
+        indexes = [
+            # Capacity totals and ledger rebuilds only count live bookings
+            models.Index(
+                fields=['date', 'time_slot'],
+                condition=models.Q(is_cancelled=False),
+                name='reservation_active_slot_idx'
+            ),
+            # Admin date filtering and cancelled/all lookups by date
+            models.Index(
+                fields=['date', 'time_slot', 'is_cancelled'],
+                name='reservation_date_slot_idx'
+            ),
+            # success_view: latest booking for a user
+            models.Index(
+                fields=['user', '-created_at'],
+                name='reservation_user_created_idx'
+            ),
+            # my_reservations: a user's bookings, newest date first
+            models.Index(
+                fields=['user', '-date'],
+                name='reservation_user_date_idx'
+            ),
+        ]
 
     @property
     def time(self):
@@ -95,6 +119,55 @@ class Reservation(models.Model):
         return self.time_slot.start_time
 
 
+class SlotOccupancy(models.Model):
+    """Running total of booked guests for a time slot on a given date."""
+    date = models.DateField(help_text="Reservation date (YYYY-MM-DD)")
+    time_slot = models.ForeignKey(
+        TimeSlot,
+        on_delete=models.CASCADE,
+        related_name='occupancy',
+        help_text="Time slot the total applies to"
+    )
+    booked_guests = models.PositiveIntegerField(
+        default=0,
+        help_text="Guests held by non-cancelled reservations"
+    )
+
+    def __str__(self):
+        """Admin/list view representation."""
+        return f"{self.date} {self.time_slot_id}: {self.booked_guests}"
+
+    class Meta:
+        """Metadata options."""
+        constraints = [
+            # One ledger row per slot and date (also the lookup index)
+            models.UniqueConstraint(
+                fields=['date', 'time_slot'],
+                name='unique_slot_occupancy'
+            )
+        ]
+        verbose_name = "Slot Occupancy"
+        verbose_name_plural = "Slot Occupancy"
+
+
+# The major food allergens that must be declared on a menu
+ALLERGENS = (
+    'celery', 'crustaceans', 'eggs', 'fish', 'gluten', 'lupin', 'milk',
+    'molluscs', 'mustard', 'nuts', 'peanuts', 'sesame', 'soya', 'sulphites',
+)
+
+
+def validate_allergens(value):
+    """Reject allergen lists containing entries not in ALLERGENS."""
+    given = {part.strip().lower() for part in value.split(',')} - {''}
+    unknown = sorted(given - set(ALLERGENS))
+    if unknown:
+        raise ValidationError(
+            f"Unknown allergens: {', '.join(unknown)}. "
+            f"Choose from: {', '.join(ALLERGENS)}"
+        )
+
+
 class MenuCategory(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -109,6 +182,15 @@ class MenuCategory(models.Model):
 
 
 class MenuItem(models.Model):
+    IMAGE_READY = 'ready'
+    IMAGE_PENDING = 'pending'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_PENDING, 'Uploading'),
+        (IMAGE_FAILED, 'Upload failed'),
+    ]
+
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     price = models.DecimalField(
@@ -129,7 +211,24 @@ class MenuItem(models.Model):
         folder='menu_items',
         blank=True, null=True
     )
+    image_status = models.CharField(
+        max_length=10,
+        choices=IMAGE_STATUS_CHOICES,
+        default=IMAGE_READY,
+        editable=False,
+        help_text="Set while a new image is uploaded in the background"
+    )
+    # When the current upload was queued; see fail_stale_uploads
+    image_pending_since = models.DateTimeField(
+        null=True, blank=True, editable=False
+    )
     ingredients = models.TextField(blank=True)
+    allergens = models.CharField(
+        max_length=200,
+        blank=True,
+        validators=[validate_allergens],
+        help_text="Comma-separated allergens (e.g. 'gluten, milk, nuts')"
+    )
     calories = models.PositiveIntegerField(blank=True, null=True)
 
     class Meta:
@@ -137,3 +236,17 @@ class MenuItem(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class MenuVersion(models.Model):
+    """
+    Single row holding the current menu version (see
+    ``reservations.menu_cache``), so every worker process sees the same
+    version whatever cache backend is configured.
+    """
+    version = models.BigIntegerField(
+        help_text="Nanosecond timestamp of the last menu change"
+    )
+
+    def __str__(self):
+        return str(self.version)
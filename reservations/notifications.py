@@ -0,0 +1,111 @@
+"""
+Batched guest emails for bulk reservation changes.
+
+When staff cancel or move many reservations at once, each guest gets one
+email, but the whole batch is sent with ``send_mass_mail`` over a single
+connection, and only after the change commits. Sending happens on a
+background worker (``RESERVATION_EMAIL_WORKERS``) so the admin request is
+not held up by the mail server.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _describe(day, slot_name, guests):
+    party = f'{guests} guest{"s" if guests != 1 else ""}'
+    return f'{day:%A %d %B %Y} at {slot_name} for {party}'
+
+
+def cancellation_email(row):
+    """
+    Build the email telling a guest their reservation was cancelled.
+
+    Args:
+        row: Reservation values with ``name``, ``email``, ``date``,
+            ``guests`` and ``time_slot__display_name``
+
+    Returns:
+        tuple: ``(subject, message, from_email, recipients)``
+    """
+    booking = _describe(
+        row['date'], row['time_slot__display_name'], row['guests']
+    )
+    return (
+        'Your Savoury Heaven reservation has been cancelled',
+        f'Dear {row["name"]},\n\n'
+        f'We are sorry, but your reservation on {booking} has had to be '
+        'cancelled. Please get in touch or book another time on our '
+        'website.\n\nSavoury Heaven',
+        None,
+        [row['email']],
+    )
+
+
+def move_email(row, day, slot_name):
+    """
+    Build the email telling a guest their reservation was moved.
+
+    Args:
+        row: Reservation values as for :func:`cancellation_email`
+        day: New reservation date
+        slot_name: Display name of the new time slot
+
+    Returns:
+        tuple: ``(subject, message, from_email, recipients)``
+    """
+    before = _describe(
+        row['date'], row['time_slot__display_name'], row['guests']
+    )
+    after = _describe(day, slot_name, row['guests'])
+    return (
+        'Your Savoury Heaven reservation has been moved',
+        f'Dear {row["name"]},\n\n'
+        f'Your reservation on {before} has been moved to {after}. If the '
+        'new time does not suit you, you can change or cancel it from '
+        'My Reservations.\n\nSavoury Heaven',
+        None,
+        [row['email']],
+    )
+
+
+def _send(messages):
+    try:
+        sent = send_mass_mail(messages, fail_silently=False)
+    except Exception as e:
+        logger.error(f'Could not send {len(messages)} guest emails: {e}')
+    else:
+        logger.info(f'Sent {sent} guest emails')
+
+
+def _submit(messages):
+    global _executor
+    workers = getattr(settings, 'RESERVATION_EMAIL_WORKERS', 1)
+    if not workers:
+        _send(messages)
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                workers, thread_name_prefix='guest-email'
+            )
+    _executor.submit(_send, messages)
+
+
+def queue_guest_emails(messages):
+    """
+    Send ``send_mass_mail`` messages as one batch once the transaction
+    commits; nothing is sent if it rolls back.
+    """
+    messages = tuple(message for message in messages if message[3][0])
+    if messages:
+        transaction.on_commit(lambda: _submit(messages))
@@ -0,0 +1,386 @@
+"""
+Slot occupancy ledger.
+
+``SlotOccupancy`` keeps the booked guest total for each ``(date,
+time_slot)`` pair so capacity checks read one indexed row instead of
+summing ``Reservation`` rows. Reservation writes that affect capacity go
+through :func:`save_reservation`, which updates the ledger in the same
+transaction as the reservation itself.
+
+Seats are claimed with a conditional ``UPDATE ... WHERE booked_guests <=
+capacity - guests`` on the ledger row. The row lock taken by that
+statement serialises concurrent bookings for a slot and date, so the
+check and the increment cannot interleave across threads or worker
+processes.
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+
+from .models import Reservation, SlotOccupancy
+
+
+class SlotCapacityError(Exception):
+    """Raised when a booking would exceed its time slot's capacity."""
+
+    def __init__(self, remaining):
+        self.remaining = remaining
+        super().__init__(
+            f'Only {remaining} guest spots left in this time slot.'
+        )
+
+
+def footprint(reservation):
+    """
+    Return the ``(date, time_slot_id, guests)`` a reservation holds.
+
+    Cancelled reservations hold no capacity, so ``None`` is returned.
+    """
+    if reservation.is_cancelled:
+        return None
+    return (reservation.date, reservation.time_slot_id, reservation.guests)
+
+
+def _ensure_row(date, time_slot_id):
+    """
+    Create the ledger row for a slot and date if it does not exist yet.
+
+    ``INSERT ... ON CONFLICT DO NOTHING`` needs no savepoint and does not
+    fail when a concurrent transaction inserts the same row first.
+    """
+    SlotOccupancy.objects.bulk_create(
+        [SlotOccupancy(date=date, time_slot_id=time_slot_id)],
+        ignore_conflicts=True
+    )
+
+
+def adjust_occupancy(date, time_slot_id, delta):
+    """
+    Add ``delta`` guests (may be negative) to one ledger row.
+
+    Like :func:`adjust_occupancy_many`, a release never takes the row
+    below zero (a drifted ledger is left to ``--rebuild``) and never
+    creates a row just to release seats from it.
+    """
+    if not delta:
+        return
+    row = SlotOccupancy.objects.filter(date=date, time_slot_id=time_slot_id)
+    change = {'booked_guests': Greatest(F('booked_guests') + delta, 0)}
+    if not row.update(**change) and delta > 0:
+        _ensure_row(date, time_slot_id)
+        row.update(**change)
+
+
+def adjust_occupancy_many(deltas, capacities=None):
+    """
+    Apply many ledger changes with a fixed number of queries.
+
+    Used by bulk cancellations and moves; call it inside
+    :func:`ledger_transaction`.
+
+    Args:
+        deltas: ``{(date, time_slot_id): guests}``; negative to release
+        capacities: ``{time_slot_id: max_capacity}``; when given, any
+            increase that would overbook its slot is rejected
+
+    Raises:
+        SlotCapacityError: If a slot in ``capacities`` would be exceeded;
+            rolling back the enclosing transaction undoes every write
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    # Rows that do not exist yet cannot be locked, and a concurrent
+    # booking may insert one at any moment: create every row that gains
+    # guests first (skipping existing ones), then lock and re-read them
+    SlotOccupancy.objects.bulk_create(
+        [
+            SlotOccupancy(date=day, time_slot_id=slot_id)
+            for (day, slot_id), delta in deltas.items() if delta > 0
+        ],
+        batch_size=1000, ignore_conflicts=True
+    )
+    days = [day for day, _ in deltas]
+    rows = {
+        (row.date, row.time_slot_id): row
+        for row in SlotOccupancy.objects.select_for_update().filter(
+            date__range=(min(days), max(days)),
+            time_slot_id__in={slot_id for _, slot_id in deltas}
+        )
+    }
+
+    changed = []
+    for (day, slot_id), delta in deltas.items():
+        row = rows.get((day, slot_id))
+        if row is None:
+            # Releasing seats the ledger never held: it had drifted
+            continue
+        held = row.booked_guests
+        if capacities and delta > 0 and slot_id in capacities:
+            capacity = capacities[slot_id]
+            if held + delta > capacity:
+                raise SlotCapacityError(max(0, capacity - held))
+        # A release larger than the row holds means the ledger had
+        # drifted; stop at zero and leave the rest to --rebuild
+        row.booked_guests = max(0, held + delta)
+        changed.append(row)
+
+    SlotOccupancy.objects.bulk_update(
+        changed, ['booked_guests'], batch_size=1000
+    )
+
+
+def claim_seats(date, time_slot_id, guests, capacity):
+    """
+    Add guests to a ledger row only if they fit within ``capacity``.
+
+    Raises:
+        SlotCapacityError: If the slot does not have ``guests`` spots left
+    """
+    for attempt in range(2):
+        claimed = SlotOccupancy.objects.filter(
+            date=date,
+            time_slot_id=time_slot_id,
+            booked_guests__lte=capacity - guests
+        ).update(booked_guests=F('booked_guests') + guests)
+        if claimed:
+            return
+        if attempt or guests > capacity:
+            break
+        # No row yet (first booking for this slot and date) or it is full
+        _ensure_row(date, time_slot_id)
+
+    raise SlotCapacityError(
+        max(0, capacity - booked_guests(date, time_slot_id))
+    )
+
+
+def apply_change(previous, current, capacity=None):
+    """
+    Move guests in the ledger from one footprint to another.
+
+    Args:
+        previous: Footprint before the change (None if nothing was held)
+        current: Footprint after the change (None if nothing is held)
+        capacity: Maximum guests for the new slot; when given, any
+            increase is claimed with :func:`claim_seats`
+
+    Raises:
+        SlotCapacityError: If ``capacity`` is given and exceeded
+    """
+    if previous == current:
+        return
+
+    if previous and current and previous[:2] == current[:2]:
+        # Same slot and date: only the party size changed
+        delta = current[2] - previous[2]
+        if delta > 0 and capacity is not None:
+            claim_seats(current[0], current[1], delta, capacity)
+        else:
+            adjust_occupancy(current[0], current[1], delta)
+        return
+
+    # Claim the new seats first so a full slot fails before anything moves
+    if current:
+        if capacity is not None:
+            claim_seats(current[0], current[1], current[2], capacity)
+        else:
+            adjust_occupancy(current[0], current[1], current[2])
+    if previous:
+        adjust_occupancy(previous[0], previous[1], -previous[2])
+
+
+def _lock_for_write():
+    """
+    Take the database write lock up front on SQLite.
+
+    SQLite has no row locks (``select_for_update`` is a no-op) and a
+    deferred transaction that reads before writing can fail to upgrade
+    its lock. Issuing a no-op write first behaves like ``BEGIN
+    IMMEDIATE``: other writers wait on the busy timeout instead of
+    interleaving. Other backends rely on row locks instead.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {SlotOccupancy._meta.db_table} '
+                'SET booked_guests = booked_guests WHERE 0 = 1'
+            )
+
+
+@contextmanager
+def ledger_transaction():
+    """
+    Open a transaction holding the ledger write lock.
+
+    For code that changes reservations and ledger rows outside
+    :func:`save_reservation`, such as bulk cancellations.
+    """
+    with transaction.atomic():
+        _lock_for_write()
+        yield
+
+
+def save_reservation(reservation, enforce_capacity=True):
+    """
+    Save a reservation and update the occupancy ledger atomically.
+
+    Handles new bookings, edits (guest count, slot or date moves) and
+    cancellations. For existing reservations the stored row is re-read
+    under a row lock so the ledger is adjusted by what was actually held.
+
+    Args:
+        reservation: Reservation instance with the new values applied
+        enforce_capacity: Reject changes that would overbook the slot
+
+    Raises:
+        SlotCapacityError: If ``enforce_capacity`` and the slot is full;
+            nothing is saved in that case
+    """
+    capacity = None
+    if enforce_capacity:
+        capacity = reservation.time_slot.max_capacity
+
+    with transaction.atomic():
+        _lock_for_write()
+
+        previous = None
+        if not reservation._state.adding:
+            stored = (
+                Reservation.objects
+                .select_for_update()
+                .filter(pk=reservation.pk)
+                .only('date', 'time_slot', 'guests', 'is_cancelled')
+                .first()
+            )
+            if stored is not None:
+                previous = footprint(stored)
+
+        apply_change(previous, footprint(reservation), capacity)
+        reservation.save()
+
+
+def delete_reservation(reservation):
+    """Delete a reservation and release its guests from the ledger."""
+    with transaction.atomic():
+        _lock_for_write()
+        held = footprint(reservation)
+        reservation.delete()
+        apply_change(held, None)
+
+
+def release_reservations(queryset):
+    """
+    Release the seats held by reservations that are about to be deleted
+    without going through :func:`delete_reservation` (for example by a
+    cascade from their user). Call it inside the deleting transaction.
+    """
+    totals = (
+        queryset
+        .filter(is_cancelled=False)
+        .order_by()
+        .values('date', 'time_slot')
+        .annotate(total=Sum('guests'))
+    )
+    deltas = {
+        (row['date'], row['time_slot']): -row['total'] for row in totals
+    }
+    if deltas:
+        _lock_for_write()
+        adjust_occupancy_many(deltas)
+
+
+def booked_guests(date, time_slot_id):
+    """Return the ledger total for one slot on a date (0 if no row)."""
+    return SlotOccupancy.objects.filter(
+        date=date, time_slot_id=time_slot_id
+    ).values_list('booked_guests', flat=True).first() or 0
+
+
+def actual_totals(start, end):
+    """
+    Sum guests straight from ``Reservation`` for a date range.
+
+    Returns:
+        dict: ``{(date, time_slot_id): guests}`` for non-cancelled bookings
+    """
+    rows = (
+        Reservation.objects
+        .filter(date__range=(start, end), is_cancelled=False)
+        .order_by()
+        .values('date', 'time_slot')
+        .annotate(total=Sum('guests'))
+    )
+    return {(row['date'], row['time_slot']): row['total'] for row in rows}
+
+
+def ledger_totals(start, end):
+    """
+    Read ledger rows for a date range.
+
+    Returns:
+        dict: ``{(date, time_slot_id): booked_guests}``
+    """
+    rows = SlotOccupancy.objects.filter(
+        date__range=(start, end)
+    ).values_list('date', 'time_slot', 'booked_guests')
+    return {(day, slot_id): total for day, slot_id, total in rows}
+
+
+async def aledger_totals(start, end):
+    """Async version of :func:`ledger_totals`."""
+    rows = SlotOccupancy.objects.filter(
+        date__range=(start, end)
+    ).values_list('date', 'time_slot', 'booked_guests')
+    return {(day, slot_id): total async for day, slot_id, total in rows}
+
+
+def occupancy_drift(start, end):
+    """
+    Compare the ledger against ``Reservation`` for a date range.
+
+    Returns:
+        list: ``(date, time_slot_id, ledger, actual)`` for every pair that
+        disagrees (a missing ledger row counts as 0)
+    """
+    actual = actual_totals(start, end)
+    ledger = ledger_totals(start, end)
+    drift = []
+    for key in sorted(set(actual) | set(ledger)):
+        expected = actual.get(key, 0)
+        recorded = ledger.get(key, 0)
+        if expected != recorded:
+            drift.append((key[0], key[1], recorded, expected))
+    return drift
+
+
+def rebuild_occupancy(start, end):
+    """
+    Replace ledger rows for a date range with totals from ``Reservation``.
+
+    Returns:
+        int: Number of ledger rows written
+    """
+    with transaction.atomic():
+        SlotOccupancy.objects.filter(date__range=(start, end)).delete()
+        rows = SlotOccupancy.objects.bulk_create(
+            [
+                SlotOccupancy(date=day, time_slot_id=slot_id,
+                              booked_guests=total)
+                for (day, slot_id), total in actual_totals(start, end).items()
+            ],
+            batch_size=1000
+        )
+    return len(rows)
+
+
+def date_chunks(start, end, days):
+    """Yield ``(chunk_start, chunk_end)`` windows covering a date range."""
+    while start <= end:
+        chunk_end = min(end, start + timedelta(days=days - 1))
+        yield start, chunk_end
+        start = chunk_end + timedelta(days=1)
@@ -0,0 +1,84 @@
+"""
+Optional in-process scheduler that keeps upcoming availability cached.
+
+Enabled by setting ``AVAILABILITY_PREWARM_INTERVAL`` (seconds). Each
+web worker process then runs a daemon thread that calls
+:func:`reservations.availability.warm_availability` for the next
+``AVAILABILITY_PREWARM_DAYS`` dates on that interval, and immediately after
+time slot changes. Only dates whose cache entry is missing or stale are
+recomputed, so extra workers sharing a cache mostly find nothing to do.
+
+The thread is started by the gunicorn configs (``post_worker_init`` in
+``savouryheaven/gunicorn_wsgi.py`` and ``gunicorn_asgi.py``), so
+management commands, tests and the gunicorn master never run one.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .availability import warm_availability
+
+logger = logging.getLogger(__name__)
+
+_prewarmer = None
+_prewarmer_lock = threading.Lock()
+
+
+class AvailabilityPrewarmer(threading.Thread):
+    """Daemon thread that refreshes stale availability on a schedule."""
+
+    def __init__(self, days, interval):
+        super().__init__(name='availability-prewarm', daemon=True)
+        self.days = days
+        self.interval = interval
+        self._wake = threading.Event()
+
+    def wake(self):
+        """Run the next refresh now instead of waiting for the interval."""
+        self._wake.set()
+
+    def run(self):
+        while True:
+            # Sleeping first keeps DB access out of process start-up
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                refreshed = warm_availability(self.days)
+                if refreshed:
+                    logger.debug(
+                        'Prewarmed availability for %d dates', len(refreshed)
+                    )
+            except Exception:
+                logger.exception('Availability prewarm failed')
+            finally:
+                close_old_connections()
+
+
+def start_prewarmer():
+    """
+    Start the scheduler thread if enabled in settings (idempotent).
+
+    Call it from server worker processes only.
+    """
+    global _prewarmer
+
+    interval = getattr(settings, 'AVAILABILITY_PREWARM_INTERVAL', None)
+    if not interval:
+        return None
+
+    with _prewarmer_lock:
+        if _prewarmer is None:
+            _prewarmer = AvailabilityPrewarmer(
+                days=getattr(settings, 'AVAILABILITY_PREWARM_DAYS', 14),
+                interval=interval
+            )
+            _prewarmer.start()
+    return _prewarmer
+
+
+def request_prewarm():
+    """Wake the scheduler thread, if one is running in this process."""
+    if _prewarmer is not None:
+        _prewarmer.wake()
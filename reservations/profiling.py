@@ -0,0 +1,317 @@
+"""
+On-demand profiling of single requests, for staff.
+
+With ``PROFILING_ENABLED`` set, a staff user can add ``?profile=cprofile``
+or ``?profile=sample`` to a URL (or send an ``X-Profile`` header with the
+same values) to run that one request under a profiler:
+
+``cprofile``
+    Deterministic profile of every call. Saved as ``<id>.prof`` (open with
+    ``python -m pstats``, snakeviz or similar) plus a ``<id>.txt`` summary
+    of the most expensive functions.
+
+``sample``
+    Samples the request thread's stack every ``PROFILING_SAMPLE_INTERVAL``
+    seconds from a background thread. Much lower overhead, so timings are
+    closer to production. Saved as ``<id>.folded`` (collapsed stacks, the
+    input format of flamegraph.pl and speedscope) plus a ``<id>.txt``
+    summary.
+
+Each capture also writes ``<id>.json`` with the view name, path, status
+and duration, which the "Profiles" admin page lists. Only the newest
+``PROFILING_KEEP`` captures are kept in ``PROFILING_DIR`` (by default a
+``savouryheaven-profiles`` directory in the system temporary directory).
+
+Under ASGI, both profilers follow the thread the view runs on. A
+coroutine view is profiled on the event loop thread, so a capture also
+includes whatever other requests that loop ran meanwhile. A sync view
+runs in Django's sync thread, so for profiled requests only the rest of
+the chain is run from that thread, as a sync-only middleware would.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tempfile
+import uuid
+from collections import Counter
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+MODES = ('cprofile', 'sample')
+
+# Capture ids and file names accepted by the admin download view
+CAPTURE_FILE = re.compile(r'^[\w-]+\.(json|prof|folded|txt)$')
+
+# Lines in each text summary
+SUMMARY_LINES = 40
+
+# Only one cProfile profiler can be active per process
+_cprofile_lock = threading.Lock()
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILING_DIR', None) or os.path.join(
+        tempfile.gettempdir(), 'savouryheaven-profiles'
+    )
+
+
+def asked_mode(request):
+    """Return the profiler named by the request, without checking who."""
+    mode = request.headers.get('X-Profile') or request.GET.get('profile')
+    return mode if mode in MODES else None
+
+
+def requested_mode(request):
+    """
+    Return the profiler a staff request asked for, or None.
+
+    Requires ``request.user``, so the middleware must come after
+    ``AuthenticationMiddleware``. Loading the user may query the
+    database, so async callers should check :func:`asked_mode` first.
+    """
+    mode = asked_mode(request)
+    if mode is None:
+        return None
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_staff:
+        return None
+    return mode
+
+
+def _frame_label(code):
+    # Last two path components keep labels short but unambiguous
+    path = '/'.join(code.co_filename.replace('\\', '/').split('/')[-2:])
+    return f'{code.co_name} ({path}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """
+    Periodically record one thread's call stack from another thread.
+
+    Samples are kept as collapsed stacks: ``{"root;...;leaf": count}``.
+    """
+
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='profile-sampler', daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    # Same interface as cProfile.Profile
+    enable = start
+    disable = stop
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        """Return the samples in collapsed-stack format."""
+        return ''.join(
+            f'{stack} {count}\n'
+            for stack, count in self.samples.most_common()
+        )
+
+    def summary(self):
+        """Return the functions most often on top of the stack."""
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        lines = [f'{total} samples every {self.interval * 1000:g} ms',
+                 '', 'Self samples  Function']
+        lines += [
+            f'{count:>6} {count * 100 / total:5.1f}%  {label}'
+            for label, count in leaves.most_common(SUMMARY_LINES)
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write(text)
+
+
+def view_is_async(request):
+    """Return whether the request's URL resolves to a coroutine view."""
+    try:
+        match = resolve(request.path_info, getattr(request, 'urlconf', None))
+    except Resolver404:
+        return False
+    return iscoroutinefunction(match.func)
+
+
+def profile_request(mode, request, get_response):
+    """
+    Run ``get_response(request)`` under a profiler and save the capture.
+
+    A ``cprofile`` request that arrives while another is being profiled
+    runs unprofiled.
+
+    Returns:
+        HttpResponse: The response, with an ``X-Profile-Id`` header when
+        a capture was saved
+    """
+    if mode == 'cprofile' and not _cprofile_lock.acquire(blocking=False):
+        return get_response(request)
+    try:
+        profiler = _start(mode)
+        started = time.perf_counter()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+    finally:
+        if mode == 'cprofile':
+            _cprofile_lock.release()
+    return _save(mode, profiler, request, response, duration)
+
+
+async def aprofile_request(mode, request, get_response):
+    """
+    Async version of :func:`profile_request`, for async middleware chains.
+
+    Coroutine views are profiled on the event loop thread. Sync views
+    run in another thread, so the rest of the chain is called through
+    ``async_to_sync`` from Django's sync thread, where the view will run,
+    and profiled there.
+    """
+    if not view_is_async(request):
+        return await sync_to_async(profile_request)(
+            mode, request, async_to_sync(get_response)
+        )
+    if mode == 'cprofile' and not _cprofile_lock.acquire(blocking=False):
+        return await get_response(request)
+    try:
+        profiler = _start(mode)
+        started = time.perf_counter()
+        try:
+            response = await get_response(request)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+    finally:
+        if mode == 'cprofile':
+            _cprofile_lock.release()
+    return _save(mode, profiler, request, response, duration)
+
+
+def _start(mode):
+    """Start profiling the calling thread; stop with ``disable()``."""
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+    else:
+        profiler = SamplingProfiler(
+            getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.001)
+        )
+    profiler.enable()
+    return profiler
+
+
+def _save(mode, profiler, request, response, duration):
+    """Write a capture's files and tag the response with its id."""
+    capture_id = (
+        f'{timezone.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:6]}'
+    )
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, capture_id)
+
+    if mode == 'cprofile':
+        profiler.dump_stats(f'{base}.prof')
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats(
+            'cumulative'
+        ).print_stats(SUMMARY_LINES)
+        _write(f'{base}.txt', summary.getvalue())
+        files = [f'{capture_id}.prof', f'{capture_id}.txt']
+    else:
+        _write(f'{base}.folded', profiler.folded())
+        _write(f'{base}.txt', profiler.summary())
+        files = [f'{capture_id}.folded', f'{capture_id}.txt']
+
+    match = getattr(request, 'resolver_match', None)
+    _write(f'{base}.json', json.dumps({
+        'id': capture_id,
+        'mode': mode,
+        'view': match.view_name if match else None,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 1),
+        'user': request.user.get_username(),
+        'created': timezone.now().isoformat(timespec='seconds'),
+        'files': files,
+    }))
+    prune_captures(getattr(settings, 'PROFILING_KEEP', 50))
+
+    response['X-Profile-Id'] = capture_id
+    return response
+
+
+def list_captures(limit=None):
+    """Return capture metadata, newest first."""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    # Ids start with a timestamp, so names sort by age
+    names = sorted(
+        (name for name in os.listdir(directory) if name.endswith('.json')),
+        reverse=True
+    )[:limit]
+    captures = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                captures.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return captures
+
+
+def prune_captures(keep):
+    """Delete all but the newest ``keep`` captures."""
+    directory = profile_dir()
+    for capture in list_captures()[keep:]:
+        for name in capture['files'] + [f'{capture["id"]}.json']:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def capture_file_path(name):
+    """
+    Return the path of a saved capture file, or None if ``name`` is not
+    a capture file name (guards against path traversal).
+    """
+    if not CAPTURE_FILE.match(name):
+        return None
+    path = os.path.join(profile_dir(), name)
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,309 @@
+"""
+Full-text menu search with ingredient and allergen filters.
+
+On PostgreSQL, items are matched with ``to_tsvector`` / ``websearch_to_
+tsquery`` against a GIN expression index created by migration 0008, and
+ranked with ``ts_rank``. Other databases have no usable full-text index,
+so an in-process inverted index is built from one query and kept per menu
+version: a menu change (see ``reservations.menu_cache``) makes the next
+search rebuild it.
+
+Both backends return item ids in relevance order, so callers (the admin
+and the public search API) do not care which one ran.
+"""
+import json
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+from .menu_cache import menu_version
+from .models import ALLERGENS, MenuItem
+
+# Text search configuration; must match the index in migration 0008
+SEARCH_CONFIG = 'english'
+
+# Search document; must match the GIN index expression in migration 0008
+SEARCH_DOCUMENT = (
+    "to_tsvector('english', "
+    "coalesce({table}.name, '') || ' ' || "
+    "coalesce({table}.description, '') || ' ' || "
+    "coalesce({table}.ingredients, '') || ' ' || "
+    "coalesce({table}.allergens, ''))"
+)
+
+# Relevance weight of a term found in each field (in-process index)
+FIELD_WEIGHTS = (
+    ('name', 4),
+    ('ingredients', 2),
+    ('allergens', 2),
+    ('description', 1),
+)
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Split text into lower-case word tokens."""
+    return _WORD.findall((text or '').lower())
+
+
+def parse_allergens(text):
+    """
+    Normalise a comma-separated allergen list.
+
+    Returns:
+        list: Known allergens in :data:`ALLERGENS` order
+
+    Raises:
+        ValueError: If an entry is not one of :data:`ALLERGENS`
+    """
+    given = {part.strip().lower() for part in (text or '').split(',')}
+    given.discard('')
+    unknown = given - set(ALLERGENS)
+    if unknown:
+        raise ValueError(f'Unknown allergens: {", ".join(sorted(unknown))}')
+    return [allergen for allergen in ALLERGENS if allergen in given]
+
+
+class MenuSearchIndex:
+    """
+    Inverted index over menu item text, built once per menu version.
+
+    Terms match whole tokens or, for type-ahead, token prefixes; every
+    query term must match for an item to be returned.
+    """
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows: Dicts with ``id``, ``name``, ``description``,
+                ``ingredients``, ``allergens`` and ``is_available``
+        """
+        postings = defaultdict(dict)
+        by_allergen = defaultdict(set)
+        by_ingredient = defaultdict(set)
+        self.ingredients = {}
+        self.available = {}
+        self.order = {}
+
+        for position, row in enumerate(rows):
+            item_id = row['id']
+            self.order[item_id] = position
+            self.ingredients[item_id] = (row['ingredients'] or '').lower()
+            for token in tokenize(row['ingredients']):
+                by_ingredient[token].add(item_id)
+            for allergen in tokenize(row['allergens']):
+                by_allergen[allergen].add(item_id)
+            self.available[item_id] = row['is_available']
+            for field, weight in FIELD_WEIGHTS:
+                for token in tokenize(row[field]):
+                    if postings[token].get(item_id, 0) < weight:
+                        postings[token][item_id] = weight
+
+        self.postings = dict(postings)
+        self.by_allergen = dict(by_allergen)
+        self.by_ingredient = dict(by_ingredient)
+        self.tokens = sorted(self.postings)
+
+    def _matches(self, term):
+        """Score items with a token equal to, or starting with, ``term``."""
+        found = {}
+        start = bisect_left(self.tokens, term)
+        for token in self.tokens[start:]:
+            if not token.startswith(term):
+                break
+            for item_id, weight in self.postings[token].items():
+                # Exact token matches outrank prefix matches
+                score = weight if token == term else weight / 2
+                if found.get(item_id, 0) < score:
+                    found[item_id] = score
+        return found
+
+    def search(self, query='', ingredients=(), free_from=(), available=None):
+        """
+        Return matching item ids, best match first.
+
+        Args:
+            query: Free text; every word must match (empty matches all)
+            ingredients: Ingredients every item must contain, as whole
+                words of its ingredient list
+            free_from: Allergens items must not contain
+            available: Restrict to available (True) or unavailable
+                (False) items, or None for both
+        """
+        scores = None
+        for term in set(tokenize(query)):
+            matches = self._matches(term)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    item_id: score + matches[item_id]
+                    for item_id, score in scores.items()
+                    if item_id in matches
+                }
+            if not scores:
+                return []
+
+        if scores is None:
+            # No text query: every item, already in menu order
+            candidates = self.order
+        else:
+            candidates = sorted(
+                scores,
+                key=lambda item_id: (-scores[item_id], self.order[item_id])
+            )
+
+        excluded = set().union(*(
+            self.by_allergen.get(allergen, ()) for allergen in free_from
+        ))
+
+        # Items whose ingredients hold every word of every ingredient;
+        # the phrase itself is then checked on this narrower set
+        ingredients = [ingredient.lower() for ingredient in ingredients]
+        required = None
+        for word in tokenize(' '.join(ingredients)):
+            having = self.by_ingredient.get(word, set())
+            required = having if required is None else required & having
+
+        return [
+            item_id for item_id in candidates
+            if (required is None or item_id in required)
+            and item_id not in excluded
+            and (available is None or self.available[item_id] == available)
+            and all(
+                ingredient in self.ingredients[item_id]
+                for ingredient in ingredients
+            )
+        ]
+
+
+def build_search_index():
+    """Build a :class:`MenuSearchIndex` over every menu item (one query)."""
+    return MenuSearchIndex(
+        MenuItem.objects
+        .order_by('category__order', 'order', 'name')
+        .values('id', 'name', 'description', 'ingredients', 'allergens',
+                'is_available')
+    )
+
+
+# Index built by this process for one menu version: (version, index)
+_index_memo = (None, None)
+_index_lock = threading.Lock()
+
+
+def search_index():
+    """Return the in-process index, rebuilding it if the menu changed."""
+    global _index_memo
+
+    version = menu_version()
+    memo_version, index = _index_memo
+    if memo_version == version:
+        return index
+
+    with _index_lock:
+        memo_version, index = _index_memo
+        if memo_version != version:
+            index = build_search_index()
+            _index_memo = (version, index)
+    return index
+
+
+def allergen_pattern(allergen):
+    """Regex matching ``allergen`` as a whole entry of the allergens list."""
+    return rf'(^|,)\s*{re.escape(allergen)}\s*(,|$)'
+
+
+def _full_text(query):
+    """
+    Return the PostgreSQL search document and ``tsquery`` SQL.
+
+    The document names the ``MenuItem`` table directly, so it must only
+    be used on a queryset whose base table is not aliased (not inside a
+    subquery), or it would refer to the outer query instead.
+    """
+    document = SEARCH_DOCUMENT.format(
+        table=connection.ops.quote_name(MenuItem._meta.db_table)
+    )
+    return document, f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+
+
+def search_queryset(query='', ingredients=(), free_from=(), available=None):
+    """
+    Filter ``MenuItem`` with the PostgreSQL full-text index.
+
+    Arguments are as for :meth:`MenuSearchIndex.search`. Ranked by
+    ``ts_rank`` when there is a query, otherwise in menu order.
+    """
+    items = MenuItem.objects.all()
+    if query.strip():
+        document, tsquery = _full_text(query)
+        items = items.filter(RawSQL(
+            f'{document} @@ {tsquery}', (query,), output_field=BooleanField()
+        )).annotate(rank=RawSQL(
+            f'ts_rank({document}, {tsquery})', (query,),
+            output_field=FloatField()
+        )).order_by('-rank', 'category__order', 'order', 'name')
+    else:
+        items = items.order_by('category__order', 'order', 'name')
+
+    for ingredient in ingredients:
+        items = items.filter(ingredients__icontains=ingredient)
+    for allergen in free_from:
+        items = items.exclude(allergens__iregex=allergen_pattern(allergen))
+    if available is not None:
+        items = items.filter(is_available=available)
+    return items
+
+
+def search_menu(query='', ingredients=(), free_from=(), available=None):
+    """
+    Search menu items, using the best backend for the database.
+
+    Args:
+        query: Free text matched against name, description, ingredients
+            and allergens
+        ingredients: Ingredients every item must contain
+        free_from: Allergens (from :data:`ALLERGENS`) to exclude
+        available: Restrict to available (True) or unavailable (False)
+            items, or None for both
+
+    Returns:
+        list: Matching item ids, best match first
+    """
+    if connection.vendor == 'postgresql':
+        return list(search_queryset(
+            query, ingredients, free_from, available
+        ).values_list('id', flat=True))
+    return search_index().search(query, ingredients, free_from, available)
+
+
+def filter_by_search(queryset, query):
+    """
+    Restrict a ``MenuItem`` queryset to items matching ``query``.
+
+    Used by the admin changelist, which applies its own ordering. On
+    PostgreSQL the full-text match is added to the queryset itself, so
+    it can use the GIN index; on SQLite the in-process index's ids are
+    passed as a single JSON parameter, which avoids SQLite's limit on
+    bound variables.
+    """
+    if connection.vendor == 'postgresql':
+        if not query.strip():
+            return queryset
+        document, tsquery = _full_text(query)
+        return queryset.filter(RawSQL(
+            f'{document} @@ {tsquery}', (query,), output_field=BooleanField()
+        ))
+    ids = search_index().search(query)
+    if connection.vendor == 'sqlite':
+        return queryset.filter(pk__in=RawSQL(
+            'SELECT value FROM json_each(%s)', (json.dumps(ids),)
+        ))
+    return queryset.filter(pk__in=ids)
@@ -0,0 +1,108 @@
+"""
+Signal handlers that keep cached availability in step with the database.
+
+Reservation writes invalidate only the dates they touch (both the old and
+new date when a booking is moved). TimeSlot changes that alter the
+availability payload invalidate every date. Menu category and item
+changes start a new menu version. Invalidation runs after the
+surrounding transaction commits so a concurrent request cannot re-cache
+data that is about to change.
+
+Deleting a user releases the ledger seats of the reservations that are
+cascade-deleted with them.
+"""
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from .availability import invalidate_all_availability, invalidate_availability
+from .menu_cache import bump_menu_version
+from .models import MenuCategory, MenuItem, Reservation, TimeSlot
+from .occupancy import release_reservations
+from .prewarm import request_prewarm
+
+# TimeSlot fields that appear in (or order) the availability payload
+AVAILABILITY_SLOT_FIELDS = (
+    'start_time', 'display_name', 'is_active', 'max_capacity'
+)
+
+
+def _loaded_values(instance, fields):
+    """Snapshot already-loaded field values without hitting deferred ones."""
+    return {
+        field: instance.__dict__[field]
+        for field in fields
+        if field in instance.__dict__
+    }
+
+
+def _invalidate_all_and_prewarm():
+    """Invalidate every date, then let the prewarm thread refresh them."""
+    invalidate_all_availability()
+    request_prewarm()
+
+
+@receiver(post_init, sender=Reservation)
+def remember_reservation_date(sender, instance, **kwargs):
+    """Keep the date a reservation was loaded with, to catch date moves."""
+    instance._loaded_date = instance.__dict__.get('date')
+
+
+@receiver(post_save, sender=Reservation)
+def reservation_saved(sender, instance, **kwargs):
+    """Invalidate the reservation's current and previous dates."""
+    dates = {instance.date, getattr(instance, '_loaded_date', None)}
+    transaction.on_commit(partial(invalidate_availability, *dates))
+    instance._loaded_date = instance.date
+
+
+@receiver(post_delete, sender=Reservation)
+def reservation_deleted(sender, instance, **kwargs):
+    """Invalidate the date a deleted reservation was booked for."""
+    transaction.on_commit(partial(invalidate_availability, instance.date))
+
+
+@receiver(pre_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    """Release the seats of reservations deleted along with their user."""
+    release_reservations(Reservation.objects.filter(user=instance))
+
+
+@receiver(post_init, sender=TimeSlot)
+def remember_slot_values(sender, instance, **kwargs):
+    """Keep the availability-relevant values a slot was loaded with."""
+    instance._loaded_values = _loaded_values(
+        instance, AVAILABILITY_SLOT_FIELDS
+    )
+
+
+@receiver(post_save, sender=TimeSlot)
+def time_slot_saved(sender, instance, created, **kwargs):
+    """Invalidate every date when a slot's capacity, status or name moves."""
+    current = _loaded_values(instance, AVAILABILITY_SLOT_FIELDS)
+    if created or current != instance._loaded_values:
+        transaction.on_commit(_invalidate_all_and_prewarm)
+    instance._loaded_values = current
+
+
+@receiver(post_delete, sender=TimeSlot)
+def time_slot_deleted(sender, instance, **kwargs):
+    """Invalidate every date when a slot disappears."""
+    transaction.on_commit(_invalidate_all_and_prewarm)
+
+
+@receiver(post_save, sender=MenuCategory)
+@receiver(post_delete, sender=MenuCategory)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def menu_changed(sender, **kwargs):
+    """Start a new menu version once the change is committed."""
+    transaction.on_commit(bump_menu_version)
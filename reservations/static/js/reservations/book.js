@@ -156,19 +156,93 @@ document.addEventListener('DOMContentLoaded', function() {
         try {
             timeSlotsContainer.innerHTML = '<div class="time-slot">Loading available times...</div>';
             
-            const response = await fetch(`/api/available-slots/?date=${date}`);
-            const data = await response.json();
-            
-            if (response.ok) {
-                renderTimeSlots(data.available_slots);
-            } else {
-                timeSlotsContainer.innerHTML = '<div class="time-slot unavailable">Error loading times</div>';
+            // Fetch a two-week window and answer later clicks locally
+            // until it is AVAILABILITY_MAX_AGE_MS old
+            if (!cachedSlots(date)) {
+                const response = await fetch(`/api/availability/?start=${date}&end=${addDays(date, AVAILABILITY_WINDOW_DAYS - 1)}`);
+                const data = await response.json();
+                
+                if (!response.ok) {
+                    timeSlotsContainer.innerHTML = '<div class="time-slot unavailable">Error loading times</div>';
+                    return;
+                }
+                cacheAvailability(data);
             }
+            
+            renderTimeSlots(cachedSlots(date));
         } catch (error) {
             timeSlotsContainer.innerHTML = '<div class="time-slot unavailable">Network error</div>';
         }
     }
 
+    /* ============================================= */
+    /* Availability Range Cache */
+    /* ============================================= */
+    const AVAILABILITY_WINDOW_DAYS = 14;
+    const AVAILABILITY_MAX_AGE_MS = 60 * 1000;
+    const availabilityCache = new Map();
+
+    /**
+     * Returns the cached slots for a date, or undefined when missing or stale
+     * @param {string} date - The date in YYYY-MM-DD format
+     * @returns {Array|undefined} Array of time slot objects
+     */
+    function cachedSlots(date) {
+        const entry = availabilityCache.get(date);
+        if (!entry || Date.now() - entry.fetchedAt > AVAILABILITY_MAX_AGE_MS) {
+            return undefined;
+        }
+        return entry.slots;
+    }
+
+    /**
+     * Re-reads one date from /api/available-slots/, revalidating with its
+     * ETag (a cheap 304 when nothing changed), and updates the cache
+     * @param {string} date - The date in YYYY-MM-DD format
+     * @returns {Promise<Array>} Array of time slot objects
+     */
+    async function refreshDate(date) {
+        const response = await fetch(`/api/available-slots/?date=${date}`, { cache: 'no-cache' });
+        if (!response.ok) {
+            throw new Error(`Availability request failed: ${response.status}`);
+        }
+        const data = await response.json();
+        availabilityCache.set(date, { slots: data.available_slots, fetchedAt: Date.now() });
+        return data.available_slots;
+    }
+
+    /**
+     * Returns the YYYY-MM-DD date a number of days after the given one
+     * @param {string} date - The date in YYYY-MM-DD format
+     * @param {number} days - Number of days to add
+     * @returns {string} The shifted date in YYYY-MM-DD format
+     */
+    function addDays(date, days) {
+        const shifted = new Date(`${date}T00:00:00Z`);
+        shifted.setUTCDate(shifted.getUTCDate() + days);
+        return shifted.toISOString().split('T')[0];
+    }
+
+    /**
+     * Expands the compact availability matrix into per-date slot lists
+     * @param {Object} data - Response from /api/availability/
+     */
+    function cacheAvailability(data) {
+        const fetchedAt = Date.now();
+        data.dates.forEach((date, row) => {
+            const slots = data.slots.map(([id, displayName], column) => {
+                const remaining = data.remaining[row][column];
+                return {
+                    id: id,
+                    display_name: displayName,
+                    available: remaining > 0,
+                    remaining_slots: remaining
+                };
+            });
+            availabilityCache.set(date, { slots: slots, fetchedAt: fetchedAt });
+        });
+    }
+
     /**
      * Renders available time slots to the UI
      * @param {Array} slots - Array of time slot objects
@@ -273,11 +347,42 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 
     // Form submission handler
-    form.addEventListener('submit', function(e) {
+    form.addEventListener('submit', async function(e) {
+        // Re-check the chosen slot first: the counts shown may come from a
+        // range fetched a while ago, and others may have booked since
+        e.preventDefault();
+        
         // Show loading state
         submitBtn.disabled = true;
         submitText.style.display = 'none';
         loadingText.style.display = 'inline';
+        
+        const date = dateInput.value;
+        const slotId = timeSlotInput.value;
+        if (date && slotId) {
+            let slots;
+            try {
+                slots = await refreshDate(date);
+            } catch (error) {
+                // The server checks capacity again anyway
+                slots = null;
+            }
+            const chosen = slots && slots.find(slot => String(slot.id) === slotId);
+            if (slots && (!chosen || !chosen.available || chosen.remaining_slots < currentGuests)) {
+                renderTimeSlots(slots);
+                const timeSlotError = document.querySelector('#id_time_slot + .field-error');
+                if (timeSlotError) timeSlotError.remove();
+                timeSlotInput.insertAdjacentHTML(
+                    'afterend',
+                    '<div class="field-error">That time no longer has room for your party. Please choose another.</div>'
+                );
+                submitBtn.disabled = false;
+                submitText.style.display = '';
+                loadingText.style.display = 'none';
+                return;
+            }
+        }
+        form.submit();
     });
 
     /* ============================================= */
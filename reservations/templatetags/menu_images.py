@@ -0,0 +1,35 @@
+"""
+Template helpers for responsive menu images.
+
+Usage::
+
+    {% load menu_images %}
+    {% responsive_image item.image item.name %}
+    <img src="{{ item.image|sized_url:100 }}">
+"""
+from django import template
+from django.utils.html import format_html
+
+from reservations.images import image_srcset, sized_image_url
+
+register = template.Library()
+
+# Menu cards are full width on phones and one of three columns on desktop
+DEFAULT_SIZES = '(max-width: 768px) 100vw, 33vw'
+
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes=DEFAULT_SIZES, loading='lazy'):
+    """Render an ``<img>`` with a width-limited ``src`` and ``srcset``."""
+    if not image:
+        return ''
+    return format_html(
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" loading="{}">',
+        sized_image_url(image), image_srcset(image), sizes, alt, loading
+    )
+
+
+@register.filter
+def sized_url(image, width):
+    """Return the image URL limited to ``width`` pixels."""
+    return sized_image_url(image, int(width)) or ''
@@ -1,3 +1,2089 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import pstats
+import tempfile
+import time as clock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import cloudinary
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection, models, transaction
+from django.db.models import F
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import AnonymousUser, Permission
+from django.test import (
+    AsyncRequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from io import StringIO
+
+from django.core.cache import cache, caches
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+
+from . import async_views
+from .availability import (
+    aavailability_range,
+    acached_available_slots,
+    availability_cache_stats,
+    availability_range,
+    cached_available_slots,
+    invalidate_all_availability,
+    invalidate_availability,
+    remaining_capacity,
+    slot_availability,
+    warm_availability,
+)
+from .bulk import cancel_reservations, move_reservations
+from .exports import COLUMNS, EXCEL_BOM, csv_lines, filter_reservations
+from .images import _build_url, clear_url_cache, sized_image_url
+from .menu_cache import (
+    MENU_VERSION_KEY,
+    ahomepage_snapshot,
+    bump_menu_version,
+    homepage_snapshot,
+)
+from .menu_io import MenuImportError, export_menu, import_menu, parse_menu
+from .metrics import (
+    AGGREGATE_FILE,
+    MetricsRegistry,
+    merge_exited_worker,
+)
+from .middleware import ProfilingMiddleware
+from .models import (
+    MenuCategory,
+    MenuItem,
+    MenuVersion,
+    Reservation,
+    SlotOccupancy,
+    TimeSlot,
+)
+from .occupancy import (
+    SlotCapacityError,
+    adjust_occupancy_many,
+    booked_guests,
+    ledger_transaction,
+    occupancy_drift,
+    save_reservation,
+)
+from .profiling import SamplingProfiler, list_captures
+from .search import filter_by_search, search_menu
+from .seeding import seed
+from .uploads import (
+    ImageUploadQueue,
+    LocalUploadBackend,
+    save_with_deferred_image,
+)
+
+
+class BookingTestCase(TestCase):
+    """Shared time slots and reservations for booking tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='guest', email='guest@example.com', password='pass1234'
+        )
+        cls.day = date.today() + timedelta(days=7)
+        cls.early = TimeSlot.objects.create(
+            start_time=time(17, 30), display_name='5:30 PM', max_capacity=10
+        )
+        cls.late = TimeSlot.objects.create(
+            start_time=time(20, 0), display_name='8:00 PM', max_capacity=6
+        )
+        TimeSlot.objects.create(
+            start_time=time(22, 0), display_name='10:00 PM',
+            max_capacity=6, is_active=False
+        )
+        cls.booking = cls.make_reservation(cls.early, guests=4)
+        cls.make_reservation(cls.early, guests=3)
+        cls.make_reservation(cls.early, guests=2, is_cancelled=True)
+        cls.make_reservation(cls.early, guests=5, day=cls.day + timedelta(1))
+
+    @classmethod
+    def make_reservation(cls, slot, guests, day=None, is_cancelled=False):
+        reservation = Reservation(
+            user=cls.user, time_slot=slot, date=day or cls.day,
+            name='Guest', email='guest@example.com', phone='123',
+            guests=guests, is_cancelled=is_cancelled
+        )
+        save_reservation(reservation)
+        return reservation
+
+    def setUp(self):
+        cache.clear()
+
+
+class AvailabilityTests(BookingTestCase):
+    """Capacity calculations used by the booking views and API."""
+
+    def test_slot_availability_single_query(self):
+        with self.assertNumQueries(1):
+            slots = list(slot_availability(self.day))
+
+        self.assertEqual([slot.pk for slot in slots],
+                         [self.early.pk, self.late.pk])
+        self.assertEqual([slot.remaining_capacity for slot in slots], [3, 6])
+
+    def test_remaining_capacity_excludes_reservation(self):
+        self.assertEqual(remaining_capacity(self.early, self.day), 3)
+        self.assertEqual(
+            remaining_capacity(
+                self.early, self.day, exclude_reservation_id=self.booking.pk
+            ),
+            7
+        )
+
+    def test_available_slots_endpoint(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('available_slots'), {'date': self.day.isoformat()}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['available_slots'], [
+            {'id': self.early.pk, 'display_name': '5:30 PM',
+             'available': True, 'remaining_slots': 3},
+            {'id': self.late.pk, 'display_name': '8:00 PM',
+             'available': True, 'remaining_slots': 6},
+        ])
+
+    def test_availability_range_matrix(self):
+        self.client.force_login(self.user)
+        with self.assertNumQueries(4):  # session, user, slots, aggregate
+            response = self.client.get(reverse('availability_range'), {
+                'start': self.day.isoformat(),
+                'end': (self.day + timedelta(days=2)).isoformat(),
+            })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'slots': [[self.early.pk, '5:30 PM', 10],
+                      [self.late.pk, '8:00 PM', 6]],
+            'dates': [(self.day + timedelta(days=i)).isoformat()
+                      for i in range(3)],
+            'remaining': [[3, 6], [5, 6], [10, 6]],
+        })
+
+    def test_availability_range_rejects_long_ranges(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('availability_range'), {
+            'start': self.day.isoformat(),
+            'end': (self.day + timedelta(days=60)).isoformat(),
+        })
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_booking_rejected_over_capacity(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('book'), {
+            'name': 'Guest', 'email': 'guest@example.com', 'phone': '123',
+            'date': self.day.isoformat(), 'time_slot': self.early.pk,
+            'guests': 4,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            Reservation.objects.filter(time_slot=self.early,
+                                       date=self.day).count(),
+            3
+        )
+
+
+class OccupancyLedgerTests(BookingTestCase):
+    """The SlotOccupancy ledger follows every reservation write."""
+
+    def test_ledger_tracks_bookings(self):
+        self.assertEqual(booked_guests(self.day, self.early.pk), 7)
+        self.assertEqual(
+            booked_guests(self.day + timedelta(1), self.early.pk), 5
+        )
+
+    def test_edit_moves_guests(self):
+        self.booking.guests = 2
+        save_reservation(self.booking)
+        self.assertEqual(booked_guests(self.day, self.early.pk), 5)
+
+        self.booking.time_slot = self.late
+        self.booking.date = self.day + timedelta(1)
+        save_reservation(self.booking)
+        self.assertEqual(booked_guests(self.day, self.early.pk), 3)
+        self.assertEqual(
+            booked_guests(self.day + timedelta(1), self.late.pk), 2
+        )
+
+    def test_cancel_view_releases_guests(self):
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('cancel_reservation', args=[self.booking.pk])
+        )
+        self.assertEqual(booked_guests(self.day, self.early.pk), 3)
+
+    def test_cancel_with_drifted_ledger_stops_at_zero(self):
+        SlotOccupancy.objects.filter(
+            date=self.day, time_slot=self.early
+        ).update(booked_guests=1)
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('cancel_reservation', args=[self.booking.pk])
+        )
+        self.assertRedirects(response, reverse('my_reservations'))
+        self.assertEqual(booked_guests(self.day, self.early.pk), 0)
+
+        # Releasing from a missing row does not create one
+        other = self.make_reservation(self.late, guests=2)
+        SlotOccupancy.objects.all().delete()
+        other.is_cancelled = True
+        save_reservation(other)
+        self.assertFalse(SlotOccupancy.objects.exists())
+
+    def test_deleting_user_releases_their_seats(self):
+        other = User.objects.create_user(username='other', password='x')
+        for slot, guests in ((self.early, 2), (self.late, 4)):
+            save_reservation(Reservation(
+                user=other, time_slot=slot, date=self.day, name='Other',
+                email='other@example.com', phone='1', guests=guests
+            ))
+        self.assertEqual(booked_guests(self.day, self.early.pk), 9)
+
+        other.delete()
+        self.assertEqual(booked_guests(self.day, self.early.pk), 7)
+        self.assertEqual(booked_guests(self.day, self.late.pk), 0)
+        self.assertEqual(
+            occupancy_drift(self.day, self.day + timedelta(1)), []
+        )
+
+    def test_bulk_adjust_inserts_missing_rows_without_conflicts(self):
+        later = self.day + timedelta(3)
+        # A concurrent booking inserting the row first must not make the
+        # bulk insert fail; it is skipped and the row updated instead
+        SlotOccupancy.objects.create(
+            date=later, time_slot=self.late, booked_guests=1
+        )
+        with ledger_transaction():
+            adjust_occupancy_many({
+                (later, self.late.pk): 2,
+                (later, self.early.pk): 4,
+                (self.day, self.early.pk): -3,
+            })
+        self.assertEqual(booked_guests(later, self.late.pk), 3)
+        self.assertEqual(booked_guests(later, self.early.pk), 4)
+        self.assertEqual(booked_guests(self.day, self.early.pk), 4)
+
+    def test_command_verifies_and_rebuilds(self):
+        SlotOccupancy.objects.filter(date=self.day).update(booked_guests=1)
+        SlotOccupancy.objects.filter(date=self.day + timedelta(1)).delete()
+
+        with self.assertRaises(CommandError):
+            call_command('occupancy_ledger', stdout=StringIO())
+
+        call_command('occupancy_ledger', '--rebuild', '--chunk-days=1',
+                     stdout=StringIO())
+        self.assertEqual(booked_guests(self.day, self.early.pk), 7)
+        self.assertEqual(
+            booked_guests(self.day + timedelta(1), self.early.pk), 5
+        )
+        call_command('occupancy_ledger', stdout=StringIO())
+
+
+class AvailabilityCacheTests(BookingTestCase):
+    """Per-date availability cache and its signal-driven invalidation."""
+
+    def test_second_lookup_is_served_from_cache(self):
+        first = cached_available_slots(self.day)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_available_slots(self.day), first)
+        self.assertEqual(availability_cache_stats(), {
+            'hits': 1, 'misses': 1, 'stale_hits': 0, 'hit_ratio': 0.5
+        })
+
+    def test_booking_invalidates_only_its_date(self):
+        cached_available_slots(self.day)
+        cached_available_slots(self.day + timedelta(1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_reservation(self.late, guests=2)
+
+        with self.assertNumQueries(0):
+            cached_available_slots(self.day + timedelta(1))
+        self.assertEqual(cached_available_slots(self.day)[1]
+                         ['remaining_slots'], 4)
+
+    def test_moved_booking_invalidates_old_and_new_date(self):
+        booking = Reservation.objects.get(pk=self.booking.pk)
+        later = self.day + timedelta(1)
+        cached_available_slots(self.day)
+        cached_available_slots(later)
+
+        booking.date = later
+        with self.captureOnCommitCallbacks(execute=True):
+            save_reservation(booking)
+
+        self.assertEqual(cached_available_slots(self.day)[0]
+                         ['remaining_slots'], 7)
+        self.assertEqual(cached_available_slots(later)[0]
+                         ['remaining_slots'], 1)
+
+    def test_time_slot_changes_invalidate_every_date(self):
+        cached_available_slots(self.day)
+        slot = TimeSlot.objects.get(pk=self.late.pk)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            slot.save()
+        self.assertEqual(callbacks, [])
+
+        slot.max_capacity = 8
+        with self.captureOnCommitCallbacks(execute=True):
+            slot.save()
+        self.assertEqual(cached_available_slots(self.day)[1]
+                         ['remaining_slots'], 8)
+
+    @override_settings(AVAILABILITY_LOCAL_TOKEN_TTL=0.05)
+    def test_booking_in_another_worker_shows_up(self):
+        self.client.force_login(self.user)
+        url = reverse('available_slots') + f'?date={self.day}'
+        etag = self.client.get(url)['ETag']
+
+        # Another worker's booking invalidates its own local-memory cache,
+        # not this one
+        SlotOccupancy.objects.filter(
+            date=self.day, time_slot=self.early
+        ).update(booked_guests=F('booked_guests') + 2)
+
+        clock.sleep(0.1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content)['available_slots'][0]
+            ['remaining_slots'], 1
+        )
+
+    def test_api_revalidates_with_etag(self):
+        self.client.force_login(self.user)
+        url = reverse('available_slots') + f'?date={self.day}'
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('private', response['Cache-Control'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_reservation(self.late, guests=2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class AvailabilityPrewarmTests(BookingTestCase):
+    """warm_availability only recomputes dates that changed."""
+
+    def test_warm_then_incremental_refresh(self):
+        with self.assertNumQueries(2):
+            refreshed = warm_availability(3, start=self.day)
+        self.assertEqual(len(refreshed), 3)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(warm_availability(3, start=self.day), [])
+            cached_available_slots(self.day + timedelta(2))
+
+        invalidate_availability(self.day + timedelta(1))
+        self.assertEqual(warm_availability(3, start=self.day),
+                         [self.day + timedelta(1)])
+
+        invalidate_all_availability()
+        self.assertEqual(len(warm_availability(3, start=self.day)), 3)
+
+    def test_command_reports_refreshed_dates(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        out = StringIO()
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.'
+                       'FileBasedCache',
+            'LOCATION': directory.name,
+        }}):
+            call_command('warm_availability', '--days=2',
+                         f'--start={self.day}', stdout=out)
+        self.assertIn('2 of 2 dates recomputed', out.getvalue())
+
+    def test_command_refuses_per_process_cache(self):
+        with self.assertRaisesMessage(CommandError, 'local to each process'):
+            call_command('warm_availability', stdout=StringIO())
+
+
+class QueryPlanTests(TestCase):
+    """Hot reservation queries must use an index, not a full table scan."""
+
+    seeded_reservations = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create([
+            User(username=f'plan{i}') for i in range(200)
+        ])
+        cls.slots = TimeSlot.objects.bulk_create([
+            TimeSlot(start_time=time(12 + i // 2, 30 * (i % 2)),
+                     display_name=f'Slot {i}')
+            for i in range(20)
+        ])
+        cls.day = date(2030, 1, 1)
+        Reservation.objects.bulk_create(
+            [
+                Reservation(
+                    user=cls.users[i % len(cls.users)],
+                    time_slot=cls.slots[i % len(cls.slots)],
+                    date=cls.day + timedelta(days=i % 365),
+                    name='Plan', email='plan@example.com', phone='1',
+                    guests=2, is_cancelled=i % 10 == 0
+                )
+                for i in range(cls.seeded_reservations)
+            ],
+            batch_size=2000
+        )
+        # Give the planner real statistics for the seeded table
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertIndexed(self, queryset):
+        """Fail if EXPLAIN shows a sequential scan of the reservation table."""
+        plan = queryset.explain()
+        table = Reservation._meta.db_table
+        # SQLite reports full (index) scans as "SCAN", PostgreSQL as "Seq Scan"
+        for scan in (f'SCAN {table}', f'Seq Scan on {table}'):
+            self.assertNotIn(scan, plan, f'Full table scan in plan:\n{plan}')
+
+    def test_slot_totals_use_active_index(self):
+        self.assertIndexed(
+            Reservation.objects
+            .filter(date__range=(self.day, self.day + timedelta(days=6)),
+                    is_cancelled=False)
+            .order_by()
+            .values('date', 'time_slot')
+            .annotate(total=models.Sum('guests'))
+        )
+
+    def test_slot_lookup_uses_index(self):
+        self.assertIndexed(Reservation.objects.filter(
+            date=self.day, time_slot=self.slots[0], is_cancelled=False
+        ))
+
+    def test_latest_user_booking_uses_index(self):
+        self.assertIndexed(
+            Reservation.objects.filter(user=self.users[0])
+            .order_by('-created_at')[:1]
+        )
+
+    def test_user_booking_list_uses_index(self):
+        self.assertIndexed(
+            Reservation.objects.filter(user=self.users[0])
+            .order_by('-date', 'time_slot__start_time')
+        )
+
+    def test_plan_check_detects_full_scan(self):
+        with self.assertRaises(AssertionError):
+            self.assertIndexed(Reservation.objects.filter(phone='1'))
+
+
+class AvailabilityStampedeTests(TestCase):
+    """Concurrent cache misses recompute a date only once."""
+
+    day = date(2030, 1, 4)
+    callers = 16
+
+    def setUp(self):
+        cache.clear()
+        self.computations = 0
+
+    def slow_payload(self, day):
+        """Stand-in for the database query that takes a while."""
+        self.computations += 1
+        clock.sleep(0.1)
+        return [{'computation': self.computations}]
+
+    def stampede(self):
+        with mock.patch(
+            'reservations.availability.available_slots_payload',
+            self.slow_payload
+        ):
+            with ThreadPoolExecutor(max_workers=self.callers) as pool:
+                return list(pool.map(
+                    lambda _: cached_available_slots(self.day),
+                    range(self.callers)
+                ))
+
+    def test_cold_entry_computed_once(self):
+        results = self.stampede()
+
+        self.assertEqual(self.computations, 1)
+        self.assertEqual(results, [[{'computation': 1}]] * self.callers)
+
+    def test_invalidated_entry_serves_stale_while_recomputing(self):
+        self.stampede()
+        invalidate_availability(self.day)
+
+        results = self.stampede()
+
+        self.assertEqual(self.computations, 2)
+        self.assertIn([{'computation': 2}], results)
+        self.assertEqual(availability_cache_stats()['misses'], 2)
+
+    def test_failed_recompute_releases_the_lock(self):
+        lock_key = f'availability:recompute-lock:{self.day.isoformat()}'
+        with mock.patch(
+            'reservations.availability.available_slots_payload',
+            side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                cached_available_slots(self.day)
+            self.assertIsNone(cache.get(lock_key))
+            with self.assertRaises(RuntimeError):
+                async_to_sync(acached_available_slots)(self.day)
+            self.assertIsNone(cache.get(lock_key))
+
+    def test_cancelled_async_caller_releases_the_lock(self):
+        lock_key = f'availability:recompute-lock:{self.day.isoformat()}'
+
+        async def cancel_midway():
+            task = asyncio.ensure_future(acached_available_slots(self.day))
+            await asyncio.sleep(0.02)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        with mock.patch(
+            'reservations.availability.available_slots_payload',
+            self.slow_payload
+        ):
+            async_to_sync(cancel_midway)()
+            clock.sleep(0.2)
+        self.assertIsNone(cache.get(lock_key))
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Simultaneous bookings for one slot must never oversell it."""
+
+    capacity = 50
+    attempts = 300
+    workers = 32
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Needs a file-backed or server database')
+        self.user = User.objects.create_user(username='rush')
+        self.slot = TimeSlot.objects.create(
+            start_time=time(19, 0), display_name='7:00 PM',
+            max_capacity=self.capacity
+        )
+        self.day = date.today() + timedelta(days=1)
+
+    def book(self, guests):
+        """Attempt one booking from a worker thread."""
+        try:
+            save_reservation(Reservation(
+                user=self.user, time_slot=self.slot, date=self.day,
+                name='Rush', email='rush@example.com', phone='123',
+                guests=guests
+            ))
+            return True
+        except SlotCapacityError:
+            return False
+        finally:
+            connection.close()
+
+    def test_no_overbooking_under_concurrency(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(self.book, [1] * self.attempts))
+
+        booked = Reservation.objects.filter(
+            time_slot=self.slot, date=self.day, is_cancelled=False
+        )
+        self.assertEqual(results.count(True), self.capacity)
+        self.assertEqual(booked.count(), self.capacity)
+        self.assertEqual(booked_guests(self.day, self.slot.pk), self.capacity)
+
+    def test_mixed_party_sizes_stay_within_capacity(self):
+        sizes = [(i % 4) + 1 for i in range(self.attempts)]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self.book, sizes))
+
+        total = sum(Reservation.objects.filter(
+            time_slot=self.slot, date=self.day
+        ).values_list('guests', flat=True))
+        self.assertLessEqual(total, self.capacity)
+        self.assertEqual(booked_guests(self.day, self.slot.pk), total)
+
+
+class MenuViewTests(TestCase):
+    """menu_view loads in constant queries and is cached per version."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for c in range(5):
+            category = MenuCategory.objects.create(name=f'Course {c}', order=c)
+            for i in range(4):
+                MenuItem.objects.create(
+                    name=f'Dish {c}-{i}', price='9.50', category=category,
+                    is_available=i != 3, order=i
+                )
+
+    def setUp(self):
+        cache.clear()
+        # setUpTestData changes never ran their on-commit bump
+        bump_menu_version()
+
+    def test_constant_queries_and_cached_render(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('menu'))
+        self.assertContains(response, 'Dish 4-2')
+        self.assertNotContains(response, 'Dish 4-3')
+
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(reverse('menu')), 'Dish 4-2')
+
+    def test_menu_change_bumps_version(self):
+        self.client.get(reverse('menu'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.filter(name='Dish 0-0').get().delete()
+            MenuItem.objects.create(
+                name='Special', price='12.00', order=9,
+                category=MenuCategory.objects.get(name='Course 0')
+            )
+
+        response = self.client.get(reverse('menu'))
+        self.assertContains(response, 'Special')
+        self.assertNotContains(response, 'Dish 0-0')
+
+    def test_conditional_get_skips_the_view(self):
+        first = self.client.get(reverse('menu'))
+        self.assertIn('public', first['Cache-Control'])
+        self.assertIn('Cookie', first['Vary'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse('menu'), HTTP_IF_NONE_MATCH=first['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            reverse('menu'), HTTP_IF_MODIFIED_SINCE=first['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.filter(name='Dish 0-0').get().save()
+        response = self.client.get(
+            reverse('menu'), HTTP_IF_NONE_MATCH=first['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_signing_in_changes_etag(self):
+        anonymous = self.client.get(reverse('home'))['ETag']
+        user = User.objects.create_user(username='diner', password='pass1234')
+        self.client.force_login(user)
+
+        response = self.client.get(
+            reverse('home'), HTTP_IF_NONE_MATCH=anonymous
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertFalse(response.has_header('Last-Modified'))
+
+
+class MenuApiTests(TestCase):
+    """The public menu API filters, projects and caches per version."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.starters = MenuCategory.objects.create(name='Starters', order=0)
+        cls.mains = MenuCategory.objects.create(name='Mains', order=1)
+        MenuItem.objects.create(
+            name='Soup', price='6.00', category=cls.starters, order=0
+        )
+        MenuItem.objects.create(
+            name='Salad', price='7.50', category=cls.starters, order=1,
+            is_available=False
+        )
+        MenuItem.objects.create(
+            name='Steak', price='24.00', category=cls.mains, order=0
+        )
+
+    def setUp(self):
+        cache.clear()
+        # setUpTestData changes never ran their on-commit bump
+        bump_menu_version()
+
+    def get(self, **params):
+        return self.client.get(reverse('menu_api'), params)
+
+    def test_filters_and_projection(self):
+        with self.assertNumQueries(2):
+            response = self.get(
+                fields='name,price', category=self.starters.pk,
+                available='true'
+            )
+        data = response.json()
+        self.assertEqual(data['items'], [{'name': 'Soup', 'price': '6.00'}])
+        self.assertEqual(
+            [category['name'] for category in data['categories']],
+            ['Starters']
+        )
+
+        # Other filters are cut from the same cached data
+        with self.assertNumQueries(0):
+            data = self.get(available='false').json()
+        self.assertEqual([item['name'] for item in data['items']], ['Salad'])
+        self.assertIsNone(data['items'][0]['image_url'])
+
+    def test_payloads_kept_out_of_the_shared_cache(self):
+        backend = caches['default']
+        with mock.patch.object(backend, 'set', wraps=backend.set) as set_:
+            for category in range(20):
+                self.get(category=f'{self.starters.pk},{category}')
+        self.assertFalse([
+            call for call in set_.call_args_list
+            if call.args[0].startswith('menu:api:')
+        ])
+        self.assertIsNotNone(cache.get(MENU_VERSION_KEY))
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.get(fields='name,secret').status_code, 400)
+        self.assertEqual(self.get(category='starters').status_code, 400)
+        self.assertEqual(self.get(available='maybe').status_code, 400)
+
+    def test_etag_follows_menu_version(self):
+        etag = self.get()['ETag']
+        response = self.client.get(
+            reverse('menu_api'), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('public', response['Cache-Control'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(
+                name='Tart', price='8.00', category=self.mains, order=1
+            )
+        response = self.client.get(
+            reverse('menu_api'), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'Tart', [item['name'] for item in response.json()['items']]
+        )
+
+
+class MenuSearchTests(TestCase):
+    """Menu search ranks text matches and filters on allergens."""
+
+    @classmethod
+    def setUpTestData(cls):
+        mains = MenuCategory.objects.create(name='Mains', order=0)
+        for name, ingredients, allergens in (
+            ('Truffle Risotto', 'arborio, truffle, parmesan', 'milk'),
+            ('Mushroom Tagliatelle', 'egg pasta, truffle oil',
+             'eggs, gluten'),
+            ('Pesto Gnocchi', 'potato, basil, pine nuts', 'milk, nuts'),
+            ('Sea Bass', 'sea bass, lemon, olive oil', 'fish'),
+        ):
+            MenuItem.objects.create(
+                name=name, price='15.00', category=mains,
+                ingredients=ingredients, allergens=allergens
+            )
+        cls.admin = User.objects.create_superuser(
+            username='chef', email='chef@example.com', password='pass1234'
+        )
+
+    def setUp(self):
+        cache.clear()
+        # setUpTestData changes never ran their on-commit bump
+        bump_menu_version()
+
+    def names(self, ids):
+        names = dict(MenuItem.objects.values_list('id', 'name'))
+        return [names[item_id] for item_id in ids]
+
+    def test_ranking_prefixes_and_filters(self):
+        # Name matches outrank ingredient matches; prefixes match too
+        self.assertEqual(self.names(search_menu('truffle')),
+                         ['Truffle Risotto', 'Mushroom Tagliatelle'])
+        self.assertEqual(self.names(search_menu('truf')),
+                         ['Truffle Risotto', 'Mushroom Tagliatelle'])
+        self.assertEqual(self.names(search_menu('truffle pasta')),
+                         ['Mushroom Tagliatelle'])
+        self.assertEqual(
+            self.names(search_menu(free_from=['milk', 'fish'])),
+            ['Mushroom Tagliatelle']
+        )
+        self.assertEqual(self.names(search_menu(ingredients=['olive oil'])),
+                         ['Sea Bass'])
+
+    def test_index_rebuilt_after_menu_change(self):
+        with self.assertNumQueries(1):
+            search_menu('risotto')
+        with self.assertNumQueries(0):
+            search_menu('risotto')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item = MenuItem.objects.get(name='Sea Bass')
+            item.name = 'Grilled Risotto Cake'
+            item.save()
+        self.assertEqual(len(search_menu('risotto')), 2)
+
+    def test_search_api(self):
+        response = self.client.get(
+            reverse('menu_search'), {'q': 'truffle', 'free_from': 'eggs'}
+        )
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(response.json()['items'][0]['name'],
+                         'Truffle Risotto')
+        response = self.client.get(
+            reverse('menu_search'), {'free_from': 'marmite'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_search_and_free_from_filter(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:reservations_menuitem_changelist')
+        response = self.client.get(url, {'q': 'lemon'})
+        self.assertContains(response, 'Sea Bass')
+        self.assertNotContains(response, 'Pesto Gnocchi')
+
+        response = self.client.get(url, {'free_from': 'milk'})
+        self.assertContains(response, 'Sea Bass')
+        self.assertNotContains(response, 'Truffle Risotto')
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'full-text search runs on PostgreSQL only')
+    def test_admin_search_matches_without_a_subquery(self):
+        queryset = filter_by_search(MenuItem.objects.all(), 'lemon')
+        self.assertNotIn('U0', str(queryset.query))
+        self.assertEqual([item.name for item in queryset], ['Sea Bass'])
+
+    def test_unknown_allergen_rejected(self):
+        item = MenuItem(
+            name='Mystery', price='5.00', allergens='gluten, kale',
+            category=MenuCategory.objects.get()
+        )
+        with self.assertRaises(ValidationError):
+            item.full_clean()
+
+
+@mock.patch.object(cloudinary.config(), 'cloud_name', 'test-cloud')
+class ResponsiveImageTests(TestCase):
+    """Menu images are served as width-limited, format-auto copies."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = MenuCategory.objects.create(name='Mains')
+        MenuItem.objects.create(
+            name='Soup', price='6.00', category=category, is_featured=True,
+            image='image/upload/v7/menu_items/soup.jpg'
+        )
+        cls.admin = User.objects.create_superuser(
+            username='chef', email='chef@example.com', password='pass1234'
+        )
+
+    def setUp(self):
+        cache.clear()
+        # setUpTestData changes never ran their on-commit bump
+        bump_menu_version()
+        clear_url_cache()
+        self.image = MenuItem.objects.get().image
+
+    def test_sized_url_is_memoised(self):
+        url = sized_image_url(self.image, 320)
+        self.assertEqual(
+            url,
+            'https://res.cloudinary.com/test-cloud/image/upload/'
+            'c_limit,f_auto,q_auto,w_320/v7/menu_items/soup.jpg'
+        )
+        sized_image_url(self.image, 320)
+        self.assertEqual(_build_url.cache_info().hits, 1)
+        self.assertIsNone(sized_image_url(None))
+
+    def test_pages_use_srcset(self):
+        response = self.client.get(reverse('menu'))
+        self.assertContains(response, 'w_960/v7/menu_items/soup.jpg 960w')
+        self.assertNotContains(response, 'upload/v7/menu_items/soup.jpg"')
+        self.assertContains(self.client.get(reverse('home')), 'srcset=')
+
+    def test_admin_previews(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('admin:reservations_menuitem_changelist')
+        )
+        self.assertContains(response, 'c_limit,f_auto,q_auto,w_200')
+
+        response = self.client.get(reverse(
+            'admin:reservations_menucategory_change',
+            args=[MenuCategory.objects.get().pk]
+        ))
+        self.assertContains(response, 'c_fill,f_auto,h_100,q_auto,w_100')
+
+
+class SlowUploadBackend(LocalUploadBackend):
+    """Local backend that takes a while, like a real upload."""
+
+    def upload(self, content, name):
+        clock.sleep(0.3)
+        return super().upload(content, name)
+
+
+@override_settings(
+    MENU_IMAGE_UPLOAD_BACKEND='reservations.uploads.LocalUploadBackend',
+    MENU_IMAGE_UPLOAD_BACKOFF=0
+)
+class ImageUploadTests(TestCase):
+    """New menu images upload after the save, with retries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = MenuItem.objects.create(
+            name='Soup', price='6.00',
+            category=MenuCategory.objects.create(name='Starters'),
+            image='image/upload/v1/menu_items/old.jpg'
+        )
+
+    def setUp(self):
+        # Run uploads inline so they share the test transaction
+        patcher = mock.patch('reservations.uploads._queue',
+                             ImageUploadQueue(workers=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def save_new_image(self):
+        item = MenuItem.objects.get(pk=self.item.pk)
+        item.image = SimpleUploadedFile('soup.jpg', b'jpeg bytes')
+        with self.captureOnCommitCallbacks() as callbacks:
+            save_with_deferred_image(item)
+
+        # Saved with the previous image while the upload is queued
+        item.refresh_from_db()
+        self.assertEqual(item.image_status, MenuItem.IMAGE_PENDING)
+        self.assertEqual(item.image.public_id, 'menu_items/old')
+
+        for callback in callbacks:
+            callback()
+        item.refresh_from_db()
+        return item
+
+    def test_upload_replaces_image_when_done(self):
+        item = self.save_new_image()
+        self.assertEqual(item.image_status, MenuItem.IMAGE_READY)
+        self.assertEqual(item.image.public_id, 'menu_items/soup')
+
+    def test_upload_is_retried(self):
+        with mock.patch.object(
+            LocalUploadBackend, 'upload',
+            side_effect=[ConnectionError, 'image/upload/v2/menu_items/s.jpg']
+        ):
+            item = self.save_new_image()
+        self.assertEqual(item.image.public_id, 'menu_items/s')
+
+    def test_failed_upload_keeps_previous_image(self):
+        with mock.patch.object(LocalUploadBackend, 'upload',
+                               side_effect=ConnectionError) as upload:
+            item = self.save_new_image()
+        self.assertEqual(upload.call_count, 3)
+        self.assertEqual(item.image_status, MenuItem.IMAGE_FAILED)
+        self.assertEqual(item.image.public_id, 'menu_items/old')
+
+    def test_lost_uploads_are_marked_failed(self):
+        item = MenuItem.objects.get(pk=self.item.pk)
+        item.image = SimpleUploadedFile('soup.jpg', b'jpeg bytes')
+        # The worker holding the queued upload restarts before it runs
+        with self.captureOnCommitCallbacks():
+            save_with_deferred_image(item)
+
+        stdout = StringIO()
+        call_command('fail_stale_uploads', stdout=stdout)
+        self.assertIn('0 pending uploads', stdout.getvalue())
+
+        MenuItem.objects.filter(pk=item.pk).update(
+            image_pending_since=F('image_pending_since') - timedelta(hours=1)
+        )
+        call_command('fail_stale_uploads', stdout=stdout)
+        self.assertIn('1 pending uploads', stdout.getvalue())
+        item.refresh_from_db()
+        self.assertEqual(item.image_status, MenuItem.IMAGE_FAILED)
+        self.assertIsNone(item.image_pending_since)
+
+
+@override_settings(
+    MENU_IMAGE_UPLOAD_BACKEND='reservations.tests.SlowUploadBackend'
+)
+class ParallelImageUploadTests(TransactionTestCase):
+    """Images from one inline save upload in parallel."""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Needs a file-backed or server database')
+        self.queue = ImageUploadQueue(workers=4)
+        patcher = mock.patch('reservations.uploads._queue', self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_uploads_overlap(self):
+        category = MenuCategory.objects.create(name='Mains')
+        started = clock.perf_counter()
+        with transaction.atomic():
+            for i in range(4):
+                save_with_deferred_image(MenuItem(
+                    name=f'Dish {i}', price='9.00', category=category,
+                    image=SimpleUploadedFile(f'dish{i}.jpg', b'jpeg bytes')
+                ))
+        self.queue.drain(timeout=5)
+
+        # Four 0.3 s uploads one after another would take 1.2 s
+        self.assertLess(clock.perf_counter() - started, 0.9)
+        self.assertEqual(
+            set(MenuItem.objects.values_list('image_status', flat=True)),
+            {MenuItem.IMAGE_READY}
+        )
+
+
+IMPORT_STATS = (
+    'categories_created', 'categories_updated', 'categories_deleted',
+    'items_created', 'items_updated', 'items_unchanged', 'items_deleted',
+)
+
+
+class MenuImportExportTests(TestCase):
+    """Menu files round-trip and imports write only what changed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.starters = MenuCategory.objects.create(name='Starters', order=0)
+        for i in range(3):
+            MenuItem.objects.create(
+                name=f'Starter {i}', price='6.00', category=cls.starters,
+                order=i, allergens='milk'
+            )
+        cls.admin = User.objects.create_superuser(
+            username='chef', email='chef@example.com', password='pass1234'
+        )
+
+    def setUp(self):
+        cache.clear()
+        # setUpTestData changes never ran their on-commit bump
+        bump_menu_version()
+
+    def test_round_trip_applies_only_changes(self):
+        for fmt in ('csv', 'json'):
+            with self.subTest(fmt):
+                self.assertEqual(
+                    import_menu(parse_menu(export_menu(fmt), fmt)),
+                    {**dict.fromkeys(IMPORT_STATS, 0), 'items_unchanged': 3}
+                )
+
+        rows = json.loads(export_menu('json'))
+        rows[0]['price'] = '7.25'
+        rows.append({**rows[1], 'category': 'Desserts', 'name': 'Tart'})
+        del rows[2]
+
+        stats = import_menu(parse_menu(json.dumps(rows), 'json'),
+                            delete_missing=True)
+        self.assertEqual(stats, {
+            **dict.fromkeys(IMPORT_STATS, 0),
+            'categories_created': 1, 'items_created': 1,
+            'items_updated': 1, 'items_unchanged': 1, 'items_deleted': 1,
+        })
+        self.assertEqual(
+            MenuItem.objects.get(name='Starter 0').price, Decimal('7.25')
+        )
+        self.assertFalse(MenuItem.objects.filter(name='Starter 2').exists())
+
+    def test_invalid_rows_are_all_reported(self):
+        text = (
+            'category,name,price,allergens\n'
+            'Mains,Steak,24.00,\n'
+            'Mains,Fish,cheap,\n'
+            'Mains,Curry,12.00,kale\n'
+        )
+        with self.assertRaisesMessage(MenuImportError, 'Row 3: price'):
+            parse_menu(text, 'csv')
+        with self.assertRaisesMessage(MenuImportError, 'Row 4: Unknown'):
+            parse_menu(text, 'csv')
+
+    def test_thousands_of_items_in_few_queries(self):
+        rows = parse_menu(json.dumps([
+            {'category': f'Course {i % 20}', 'name': f'Dish {i}',
+             'price': '9.99', 'order': i}
+            for i in range(3000)
+        ]), 'json')
+        with CaptureQueriesContext(connection) as queries:
+            stats = import_menu(rows)
+        self.assertEqual(stats['items_created'], 3000)
+        # Batched inserts, not one per row (SQLite's bound-variable limit
+        # allows about 80 items per INSERT)
+        self.assertLess(len(queries), 50)
+
+    def test_commands(self):
+        path = os.path.join(tempfile.mkdtemp(), 'menu.csv')
+        self.addCleanup(os.remove, path)
+        call_command('export_menu', f'--output={path}', stdout=StringIO())
+        output = StringIO()
+        call_command('import_menu', path, '--dry-run', stdout=output)
+        self.assertIn('items unchanged: 3', output.getvalue())
+
+    def test_admin_import_and_export(self):
+        self.client.force_login(self.admin)
+        changelist = reverse('admin:reservations_menuitem_changelist')
+        response = self.client.post(changelist, {
+            'action': 'export_csv',
+            '_selected_action': list(
+                MenuItem.objects.values_list('pk', flat=True)
+            ),
+        })
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn(b'Starter 2', response.content)
+
+        upload = SimpleUploadedFile(
+            'menu.csv', response.content.replace(b'Starter 2', b'Soup')
+        )
+        response = self.client.post(
+            reverse('admin:reservations_menuitem_import'),
+            {'file': upload, 'delete_missing': 'on'}
+        )
+        self.assertRedirects(response, changelist)
+        self.assertEqual(
+            sorted(MenuItem.objects.values_list('name', flat=True)),
+            ['Soup', 'Starter 0', 'Starter 1']
+        )
+
+    def test_admin_import_needs_add_change_and_delete(self):
+        editor = User.objects.create_user(
+            username='editor', password='pass1234', is_staff=True
+        )
+        editor.user_permissions.set(Permission.objects.filter(
+            codename__in=['view_menuitem', 'change_menuitem']
+        ))
+        self.client.force_login(editor)
+
+        response = self.client.get(
+            reverse('admin:reservations_menuitem_changelist')
+        )
+        self.assertNotContains(response, 'Import menu')
+        response = self.client.post(
+            reverse('admin:reservations_menuitem_import'),
+            {'file': SimpleUploadedFile('menu.csv', b'category,name,price\n'),
+             'delete_missing': 'on'}
+        )
+        self.assertRedirects(response, reverse('admin:index'))
+        self.assertEqual(MenuItem.objects.count(), 3)
+
+
+class MenuImportVersionTests(TransactionTestCase):
+    """A whole import starts exactly one new menu version."""
+
+    def test_single_bump(self):
+        category = MenuCategory.objects.create(name='Mains')
+        for i in range(5):
+            MenuItem.objects.create(
+                name=f'Dish {i}', price='9.00', category=category
+            )
+        rows = parse_menu('category,name,price\nMains,Dish 0,9.50\n', 'csv')
+
+        backend = caches['default']
+        with mock.patch.object(backend, 'set', wraps=backend.set) as set_:
+            import_menu(rows, delete_missing=True)
+        bumps = [call for call in set_.call_args_list
+                 if call.args[0] == MENU_VERSION_KEY]
+        self.assertEqual(len(bumps), 1)
+        self.assertEqual(MenuItem.objects.count(), 1)
+
+
+class HomepageSnapshotTests(TestCase):
+    """The homepage shows each category's own featured dishes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for c, featured in enumerate([5, 2, 0]):
+            category = MenuCategory.objects.create(name=f'Course {c}', order=c)
+            for i in range(featured):
+                MenuItem.objects.create(
+                    name=f'Featured {c}-{i}', price='9.50', category=category,
+                    is_featured=True, order=i
+                )
+            MenuItem.objects.create(
+                name=f'Plain {c}', price='7.00', category=category, order=9
+            )
+
+    def setUp(self):
+        cache.clear()
+        # setUpTestData changes never ran their on-commit bump
+        bump_menu_version()
+
+    def test_top_featured_items_per_category(self):
+        with self.assertNumQueries(2):
+            snapshot = homepage_snapshot()
+
+        featured = {
+            category['name']: [
+                item['name'] for item in category['featured_items']
+            ]
+            for category in snapshot
+        }
+        self.assertEqual(featured, {
+            'Course 0': ['Featured 0-0', 'Featured 0-1', 'Featured 0-2'],
+            'Course 1': ['Featured 1-0', 'Featured 1-1'],
+            'Course 2': [],
+        })
+
+    def test_rendered_from_snapshot_until_menu_changes(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Featured 1-1')
+        self.assertNotContains(response, 'Plain 1')
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('home'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.filter(name='Featured 1-1').update(name='Renamed')
+            MenuItem.objects.filter(name='Renamed').get().save()
+
+        self.assertContains(self.client.get(reverse('home')), 'Renamed')
+
+    @override_settings(MENU_VERSION_LOCAL_TTL=0.05)
+    def test_change_in_another_worker_shows_up(self):
+        cache.delete(MENU_VERSION_KEY)  # cached by setUp with the default TTL
+        self.assertContains(self.client.get(reverse('home')), 'Featured 1-1')
+
+        # Another worker renames a dish: it bumps the shared version row,
+        # but not this process's local-memory cache
+        MenuItem.objects.filter(name='Featured 1-1').update(name='Renamed')
+        MenuVersion.objects.update(version=F('version') + 1)
+
+        clock.sleep(0.1)
+        self.assertContains(self.client.get(reverse('home')), 'Renamed')
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Admin changelists run the same queries however many rows exist."""
+
+    changelists = (
+        'admin:reservations_reservation_changelist',
+        'admin:reservations_timeslot_changelist',
+        'admin:reservations_menucategory_changelist',
+        'admin:reservations_menuitem_changelist',
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='chef', email='chef@example.com', password='pass1234'
+        )
+
+    def add_rows(self, count):
+        seed(seed=count, users=count, slots=count, capacity=100,
+             categories=count, items_per_category=3, reservations=count * 5,
+             days=7, start=date(2031, 1, 1))
+
+    def query_counts(self):
+        counts = {}
+        for url in self.changelists:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(url))
+            self.assertEqual(response.status_code, 200)
+            counts[url] = len(queries)
+        return counts
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.client.force_login(self.admin)
+        self.add_rows(2)
+        small = self.query_counts()
+        self.add_rows(20)
+        self.assertEqual(self.query_counts(), small)
+
+
+class ReservationExportTests(BookingTestCase):
+    """CSV exports stream rows without loading them all at once."""
+
+    def read(self, lines):
+        return list(csv.reader(StringIO(''.join(lines))))
+
+    def test_export_rows_and_filters(self):
+        rows = self.read(csv_lines(filter_reservations(cancelled=False)))
+        self.assertEqual(tuple(rows[0]), COLUMNS)
+        self.assertEqual([row[3] for row in rows[1:]], ['4', '3', '5'])
+        self.assertEqual(rows[1][2], '17:30')
+        self.assertEqual(rows[1][8], 'guest')
+
+        rows = self.read(csv_lines(filter_reservations(
+            start=self.day, end=self.day, cancelled=True
+        )))
+        self.assertEqual([row[3] for row in rows[1:]], ['2'])
+
+    def test_header_comes_before_the_query(self):
+        lines = csv_lines(filter_reservations(), excel=True)
+        with self.assertNumQueries(0):
+            header = next(lines)
+        self.assertTrue(header.startswith(EXCEL_BOM + 'id,date'))
+        # One query for all rows, however many chunks they arrive in
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(lines)), 4)
+
+    def test_excel_export_escapes_formulas(self):
+        Reservation.objects.filter(pk=self.booking.pk).update(
+            name='=HYPERLINK("http://evil.example")', phone='+44 1234',
+            special_requests='@SUM(A1)'
+        )
+        queryset = filter_reservations().filter(pk=self.booking.pk)
+
+        row = self.read(csv_lines(queryset, excel=True))[1]
+        self.assertEqual(row[4], '\'=HYPERLINK("http://evil.example")')
+        self.assertEqual(row[6], "'+44 1234")
+        self.assertEqual(row[7], "'@SUM(A1)")
+        self.assertEqual(row[5], 'guest@example.com')
+
+        row = self.read(csv_lines(queryset))[1]
+        self.assertEqual(row[4], '=HYPERLINK("http://evil.example")')
+
+    def test_admin_action_streams_csv(self):
+        admin = User.objects.create_superuser(
+            username='chef', email='chef@example.com', password='pass1234'
+        )
+        self.client.force_login(admin)
+        response = self.client.post(
+            reverse('admin:reservations_reservation_changelist'),
+            {'action': 'export_csv', '_selected_action': [self.booking.pk]}
+        )
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual([row[0] for row in rows[1:]],
+                         [str(self.booking.pk)])
+
+    def test_command_writes_filtered_csv(self):
+        stdout = StringIO()
+        call_command('export_reservations', '--slot=17:30',
+                     '--cancelled=all', f'--start={self.day}',
+                     f'--end={self.day}', stdout=stdout)
+        rows = list(csv.reader(StringIO(stdout.getvalue())))
+        self.assertEqual([row[3] for row in rows[1:]], ['4', '3', '2'])
+
+        with self.assertRaises(CommandError):
+            call_command('export_reservations', '--slot=09:00',
+                         stdout=StringIO())
+
+
+@override_settings(RESERVATION_EMAIL_WORKERS=0)
+class BulkReservationTests(BookingTestCase):
+    """Bulk cancel and move keep the ledger, cache and guests in step."""
+
+    def assert_ledger_matches(self):
+        self.assertEqual(occupancy_drift(self.day, self.day + timedelta(1)),
+                         [])
+
+    def test_cancel_releases_seats_and_emails_guests(self):
+        cached_available_slots(self.day)
+        with self.captureOnCommitCallbacks(execute=True):
+            count = cancel_reservations(Reservation.objects.filter(
+                date=self.day, time_slot=self.early
+            ))
+
+        self.assertEqual(count, 2)
+        self.assertEqual(booked_guests(self.day, self.early.pk), 0)
+        self.assert_ledger_matches()
+        self.assertEqual(cached_available_slots(self.day)[0]
+                         ['remaining_slots'], 10)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('cancelled', mail.outbox[0].subject)
+
+    def test_move_checks_capacity_when_asked(self):
+        early = Reservation.objects.filter(date=self.day,
+                                           time_slot=self.early)
+        with self.assertRaises(SlotCapacityError):
+            move_reservations(early, time_slot=self.late,
+                              enforce_capacity=True)
+        self.assertEqual(booked_guests(self.day, self.late.pk), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            count = move_reservations(early, time_slot=self.late)
+        self.assertEqual(count, 2)
+        self.assertEqual(booked_guests(self.day, self.early.pk), 0)
+        self.assertEqual(booked_guests(self.day, self.late.pk), 7)
+        self.assert_ledger_matches()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('8:00 PM', mail.outbox[0].body)
+
+    def test_query_count_does_not_grow_with_reservations(self):
+        later = self.day + timedelta(1)
+
+        def move(guests, day):
+            Reservation.objects.bulk_create(
+                Reservation(user=self.user, time_slot=self.late, date=day,
+                            name='Guest', email='guest@example.com',
+                            phone='123', guests=guests)
+                for _ in range(500 if day == later else 5)
+            )
+            with CaptureQueriesContext(connection) as queries:
+                move_reservations(
+                    Reservation.objects.filter(date=day,
+                                               time_slot=self.late),
+                    time_slot=self.early, notify=False
+                )
+            return len(queries)
+
+        self.assertEqual(move(1, self.day), move(1, later))
+
+    def test_admin_move_action(self):
+        admin = User.objects.create_superuser(
+            username='chef', email='chef@example.com', password='pass1234'
+        )
+        self.client.force_login(admin)
+        url = reverse('admin:reservations_reservation_changelist')
+        data = {'action': 'move_selected',
+                '_selected_action': [self.booking.pk]}
+        response = self.client.post(url, data)
+        self.assertContains(response, 'Move 1 active reservation')
+
+        later = self.day + timedelta(1)
+        response = self.client.post(url, {
+            **data, 'apply': '1', 'date': later.isoformat(),
+            'time_slot': '', 'enforce_capacity': 'on',
+        })
+        self.assertRedirects(response, url)
+        self.assertEqual(Reservation.objects.get(pk=self.booking.pk).date,
+                         later)
+        self.assertEqual(booked_guests(later, self.early.pk), 9)
+        self.assertEqual(mail.outbox, [])
+
+    def test_admin_cancel_action_asks_first(self):
+        admin = User.objects.create_superuser(
+            username='chef', email='chef@example.com', password='pass1234'
+        )
+        self.client.force_login(admin)
+        url = reverse('admin:reservations_reservation_changelist')
+        data = {'action': 'cancel_selected', 'select_across': '1',
+                '_selected_action': [self.booking.pk]}
+        response = self.client.post(url, data)
+        self.assertContains(response, 'Cancel 3 active reservations?')
+        self.assertFalse(
+            Reservation.objects.get(pk=self.booking.pk).is_cancelled
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {**data, 'apply': '1'})
+        self.assertRedirects(response, url)
+        self.assertFalse(
+            Reservation.objects.filter(is_cancelled=False).exists()
+        )
+        self.assertEqual(mail.outbox, [])
+        self.assert_ledger_matches()
+
+    def test_admin_bulk_delete_releases_seats_in_bulk(self):
+        admin = User.objects.create_superuser(
+            username='chef', email='chef@example.com', password='pass1234'
+        )
+        self.client.force_login(admin)
+        ids = list(Reservation.objects.values_list('pk', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('admin:reservations_reservation_changelist'),
+                {'action': 'delete_selected', 'post': 'yes',
+                 '_selected_action': ids}
+            )
+        self.assertEqual(response.status_code, 302)
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('DELETE', 'UPDATE "reservations'))
+        ]
+        # One ledger update and one delete, whatever the selection size
+        self.assertEqual(len(writes), 2)
+        self.assertFalse(Reservation.objects.exists())
+        self.assert_ledger_matches()
+
+    def test_command_cancels_a_slot(self):
+        stdout = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('bulk_reservations', 'cancel',
+                         f'--date={self.day}', '--slot=17:30', stdout=stdout)
+        self.assertIn('Cancelled 2 reservations', stdout.getvalue())
+        self.assert_ledger_matches()
+
+        with self.assertRaises(CommandError):
+            call_command('bulk_reservations', 'move', f'--date={self.day}',
+                         stdout=StringIO())
+
+
+@override_settings(REQUEST_TIMING_ENABLED=True,
+                   SLOW_REQUEST_THRESHOLD_MS=60000)
+class RequestTimingTests(BookingTestCase):
+    """Server-Timing header and log line from RequestTimingMiddleware."""
+
+    def get(self, staff=True):
+        self.user.is_staff = staff
+        self.user.save(update_fields=['is_staff'])
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertLogs('reservations.timing', 'INFO') as logs:
+                response = self.client.get(reverse('my_reservations'))
+        self.assertEqual(len(logs.records), 1)
+        return response, json.loads(logs.records[0].getMessage()), queries
+
+    def test_header_and_log_report_queries_and_templates(self):
+        response, record, queries = self.get()
+        header = response['Server-Timing']
+        self.assertIn('db;dur=', header)
+        self.assertIn(f'desc="{len(queries)} queries"', header)
+        for metric in ('tpl;dur=', 'view;dur=', 'total;dur='):
+            self.assertIn(metric, header)
+
+        self.assertEqual(record['view'], 'my_reservations')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], len(queries))
+        self.assertGreater(record['template_ms'], 0)
+        self.assertLessEqual(record['view_ms'], record['total_ms'])
+        self.assertNotIn('slow_queries', record)
+
+    def test_header_only_for_staff(self):
+        response, record, _ = self.get(staff=False)
+        self.assertNotIn('Server-Timing', response)
+        self.assertIsNotNone(record['view_ms'])
+        with override_settings(SERVER_TIMING_PUBLIC=True):
+            response, _, _ = self.get(staff=False)
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def test_view_time_excludes_other_middleware(self):
+        def slow_process_view(middleware, request, *args):
+            clock.sleep(0.05)
+
+        # CSRF's process_view runs between the timing hooks and the view
+        with mock.patch.object(CsrfViewMiddleware, 'process_view',
+                               slow_process_view):
+            _, record, _ = self.get()
+        self.assertLess(record['view_ms'], 50)
+        self.assertGreaterEqual(record['total_ms'], 50)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0,
+                       SLOW_REQUEST_QUERY_COUNT=2)
+    def test_slow_request_logs_slowest_queries(self):
+        _, record, _ = self.get()
+        self.assertEqual(len(record['slow_queries']), 2)
+        first, second = record['slow_queries']
+        self.assertGreaterEqual(first['ms'], second['ms'])
+        self.assertIn('SELECT', first['sql'])
+
+    @override_settings(REQUEST_TIMING_ENABLED=False)
+    def test_disabled_middleware_is_removed(self):
+        response = self.client.get(reverse('about'))
+        self.assertNotIn('Server-Timing', response)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN=None)
+class MetricsTests(BookingTestCase):
+    """Prometheus metrics, aggregated across worker processes."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('reservations.metrics._registry',
+                             MetricsRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def scrape(self, **headers):
+        response = self.client.get(reverse('metrics'), **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def book(self, **data):
+        return self.client.post(reverse('book'), {
+            'name': 'Guest', 'email': 'guest@example.com', 'phone': '123',
+            'date': self.day.isoformat(), **data,
+        })
+
+    def test_requests_are_counted_per_url_name(self):
+        self.client.get(reverse('about'))
+        self.client.get(reverse('about'))
+        self.client.get('/no-such-page/')
+        text = self.scrape()
+
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_requests_total{view="about",method="GET",'
+                      'status="200"} 2', text)
+        self.assertIn('http_requests_total{view="unmatched",method="GET",'
+                      'status="404"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="about",'
+                      'le="+Inf"} 2', text)
+        self.assertIn('http_request_duration_seconds_count{view="about"} 2',
+                      text)
+
+    def test_booking_outcomes(self):
+        self.client.force_login(self.user)
+        self.book(time_slot=self.late.pk, guests=2)
+        self.book(time_slot=self.early.pk, guests=4)
+        self.book(time_slot=self.early.pk)
+        text = self.scrape()
+
+        for outcome, count in (('success', 1), ('capacity_rejected', 1),
+                               ('invalid', 1), ('error', 0)):
+            self.assertIn(
+                f'booking_outcomes_total{{outcome="{outcome}"}} {count}',
+                text
+            )
+
+    def test_availability_cache_ratio(self):
+        cached_available_slots(self.day)
+        cached_available_slots(self.day)
+        text = self.scrape()
+        self.assertIn('availability_cache_lookups_total{result="hit"} 1',
+                      text)
+        self.assertIn('availability_cache_hit_ratio 0.5', text)
+
+    def test_workers_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch('reservations.metrics.os.getpid',
+                            return_value=1):
+                other = MetricsRegistry(directory)
+                other.inc('booking_outcomes_total', (('outcome', 'success'),))
+                other.observe('http_request_duration_seconds',
+                              (('view', 'home'),), 0.2)
+                other.flush()
+
+            local = MetricsRegistry(directory)
+            local.inc('booking_outcomes_total', (('outcome', 'success'),))
+            local.flush()
+            totals = local.collect()
+
+        self.assertEqual(
+            totals['booking_outcomes_total', (('outcome', 'success'),)], 2
+        )
+        self.assertEqual(totals['http_request_duration_seconds_bucket', (
+            ('view', 'home'), ('le', 0.25)
+        )], 1)
+        self.assertEqual(totals['http_request_duration_seconds_bucket', (
+            ('view', 'home'), ('le', 0.1)
+        )], 0)
+
+    def test_availability_lookups_of_other_workers_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch('reservations.metrics.os.getpid',
+                            return_value=1):
+                other = MetricsRegistry(directory)
+                other.inc('availability_cache_lookups_total',
+                          (('result', 'hit'),), 3)
+                other.flush()
+            with mock.patch('reservations.metrics._registry',
+                            MetricsRegistry(directory)):
+                cached_available_slots(self.day)
+                text = self.scrape()
+        self.assertIn('availability_cache_lookups_total{result="hit"} 3',
+                      text)
+        self.assertIn('availability_cache_lookups_total{result="miss"} 1',
+                      text)
+        self.assertIn('availability_cache_hit_ratio 0.75', text)
+
+    def test_reused_pid_keeps_earlier_samples(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch('reservations.metrics.os.getpid',
+                            return_value=1):
+                for _ in range(2):
+                    exited = MetricsRegistry(directory)
+                    exited.inc('booking_outcomes_total',
+                               (('outcome', 'success'),))
+                    exited.flush()
+            self.assertEqual(len(os.listdir(directory)), 2)
+            totals = MetricsRegistry(directory).collect()
+        self.assertEqual(
+            totals['booking_outcomes_total', (('outcome', 'success'),)], 2
+        )
+
+    def test_exited_workers_are_merged_into_one_file(self):
+        key = 'booking_outcomes_total', (('outcome', 'success'),)
+        with tempfile.TemporaryDirectory() as directory:
+            for pid in (1, 1, 2):
+                with mock.patch('reservations.metrics.os.getpid',
+                                return_value=pid):
+                    exited = MetricsRegistry(directory)
+                    exited.inc(*key)
+                    exited.flush()
+            merge_exited_worker(directory, 1)
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertEqual(MetricsRegistry(directory).collect()[key], 3)
+
+            merge_exited_worker(directory, 2)
+            self.assertEqual(os.listdir(directory), [AGGREGATE_FILE])
+            self.assertEqual(MetricsRegistry(directory).collect()[key], 3)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_is_required_when_set(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 401)
+        self.scrape(HTTP_AUTHORIZATION='Bearer secret')
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_endpoint_is_not_found(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_KEEP=2)
+class ProfilingTests(BookingTestCase):
+    """Staff can capture request profiles on demand."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        profile_dir = override_settings(PROFILING_DIR=self.directory)
+        profile_dir.enable()
+        self.addCleanup(profile_dir.disable)
+        self.staff = User.objects.create_superuser(
+            username='chef', email='chef@example.com', password='pass1234'
+        )
+
+    def test_only_staff_can_profile(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('about'), {'profile': 'cprofile'})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_cprofile_capture_is_saved_and_listed(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('about'), {'profile': 'cprofile'})
+        capture_id = response['X-Profile-Id']
+
+        capture, = list_captures()
+        self.assertEqual(capture['id'], capture_id)
+        self.assertEqual(capture['view'], 'about')
+        self.assertEqual(capture['status'], 200)
+        pstats.Stats(os.path.join(self.directory, f'{capture_id}.prof'))
+
+        response = self.client.get(reverse('admin_profiles'))
+        self.assertContains(response, f'{capture_id}.prof')
+        response = self.client.get(
+            reverse('admin_profile_file', args=[f'{capture_id}.txt'])
+        )
+        self.assertIn(b'function calls', b''.join(response.streaming_content))
+        response = self.client.get(
+            reverse('admin_profile_file', args=['settings.py'])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_sampling_header_and_pruning(self):
+        self.client.force_login(self.staff)
+        for _ in range(3):
+            response = self.client.get(reverse('about'),
+                                       HTTP_X_PROFILE='sample')
+        captures = list_captures()
+        self.assertEqual(len(captures), 2)
+        self.assertEqual(captures[0]['id'], response['X-Profile-Id'])
+        self.assertEqual(captures[0]['mode'], 'sample')
+        self.assertEqual(len(os.listdir(self.directory)), 6)
+
+    def test_sampling_profiler_folds_stacks(self):
+        def busy():
+            deadline = clock.perf_counter() + 0.05
+            while clock.perf_counter() < deadline:
+                pass
+
+        profiler = SamplingProfiler(0.001)
+        profiler.start()
+        busy()
+        profiler.stop()
+        self.assertIn(';busy (', profiler.folded())
+        self.assertIn('busy (', profiler.summary())
+
+    async def profile_async_chain(self, view, mode):
+        async def get_response(request):
+            if asyncio.iscoroutinefunction(view):
+                return await view(request)
+            return await sync_to_async(view)(request)
+
+        request = AsyncRequestFactory().get('/', {'profile': mode})
+        request.user = self.staff
+        with mock.patch('reservations.profiling.resolve',
+                        return_value=mock.Mock(func=view)):
+            response = await ProfilingMiddleware(get_response)(request)
+        return response['X-Profile-Id']
+
+    async def test_async_views_are_profiled_on_the_event_loop(self):
+        async def busy_view(request):
+            for _ in range(5):
+                deadline = clock.perf_counter() + 0.01
+                while clock.perf_counter() < deadline:
+                    pass
+                await asyncio.sleep(0)
+            return HttpResponse()
+
+        capture_id = await self.profile_async_chain(busy_view, 'cprofile')
+        stats = pstats.Stats(os.path.join(self.directory,
+                                          f'{capture_id}.prof'))
+        self.assertIn('busy_view', {name for _, _, name in stats.stats})
+
+        capture_id = await self.profile_async_chain(busy_view, 'sample')
+        with open(os.path.join(self.directory,
+                               f'{capture_id}.folded')) as f:
+            self.assertIn('busy_view (', f.read())
+
+    async def test_sync_views_are_profiled_on_their_thread(self):
+        def busy_view(request):
+            deadline = clock.perf_counter() + 0.05
+            while clock.perf_counter() < deadline:
+                pass
+            return HttpResponse()
+
+        capture_id = await self.profile_async_chain(busy_view, 'sample')
+        with open(os.path.join(self.directory,
+                               f'{capture_id}.folded')) as f:
+            self.assertIn('busy_view (', f.read())
+
+    def test_disabled_without_setting(self):
+        self.client.force_login(self.staff)
+        with override_settings(PROFILING_ENABLED=False):
+            response = self.client.get(reverse('about'),
+                                       {'profile': 'cprofile'})
+        self.assertNotIn('X-Profile-Id', response)
+
+
+class AsyncViewTests(BookingTestCase):
+    """The async views served under ASGI match the sync ones."""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = AsyncRequestFactory()
+
+    def get(self, path, user=None, headers=None):
+        request = self.factory.get(path, headers=headers)
+        request.user = user or AnonymousUser()
+        return request
+
+    async def test_cached_slots_share_the_sync_cache(self):
+        slots = await acached_available_slots(self.day)
+        self.assertEqual(
+            slots, await sync_to_async(cached_available_slots)(self.day)
+        )
+        self.assertEqual(await acached_available_slots(self.day), slots)
+        self.assertEqual(availability_cache_stats()['hits'], 2)
+
+    async def test_range_and_snapshot_match_sync_versions(self):
+        end = self.day + timedelta(days=2)
+        self.assertEqual(
+            await aavailability_range(self.day, end),
+            await sync_to_async(availability_range)(self.day, end)
+        )
+        self.assertEqual(await ahomepage_snapshot(),
+                         await sync_to_async(homepage_snapshot)())
+
+    async def test_available_slots_revalidates_with_etag(self):
+        path = f'/api/available-slots/?date={self.day}'
+        response = await async_views.get_available_slots(
+            self.get(path, self.user)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [slot['remaining_slots']
+             for slot in json.loads(response.content)['available_slots']],
+            [3, 6]
+        )
+
+        response = await async_views.get_available_slots(self.get(
+            path, self.user, {'If-None-Match': response['ETag']}
+        ))
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('private', response['Cache-Control'])
+
+    async def test_range_endpoint_requires_login_and_valid_dates(self):
+        path = f'/api/availability/?start={self.day}&end={self.day}'
+        response = await async_views.get_availability_range(self.get(path))
+        self.assertEqual(response.status_code, 302)
+
+        response = await async_views.get_availability_range(
+            self.get(path, self.user)
+        )
+        self.assertEqual(json.loads(response.content)['remaining'], [[3, 6]])
+
+        response = await async_views.get_availability_range(
+            self.get('/api/availability/?start=soon', self.user)
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_pages_render(self):
+        await MenuItem.objects.acreate(
+            name='Soup', price='5.00', is_featured=True,
+            category=await MenuCategory.objects.acreate(name='Starters')
+        )
+        for view in (async_views.index, async_views.menu_view):
+            response = await view(self.get('/'))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'Soup', response.content)
+            self.assertIn('ETag', response)
+
+
+class SeedDataTests(TestCase):
+    """The seed_data command generates consistent, repeatable data."""
+
+    def seeded_rows(self):
+        """Seed a small dataset, return its reservations, then roll back."""
+        with transaction.atomic():
+            call_command(
+                'seed_data', '--users=20', '--slots=4', '--categories=2',
+                '--items-per-category=3', '--reservations=500',
+                '--days=14', '--start=2030-03-01', stdout=StringIO()
+            )
+            self.assertEqual(Reservation.objects.count(), 500)
+            self.assertEqual(MenuItem.objects.count(), 6)
+            call_command('occupancy_ledger', stdout=StringIO())
+
+            rows = list(Reservation.objects.order_by('pk').values_list(
+                'user__username', 'date', 'time_slot__start_time',
+                'guests', 'is_cancelled'
+            ))
+            transaction.set_rollback(True)
+        return rows
+
+    def test_same_seed_same_data(self):
+        self.assertEqual(self.seeded_rows(), self.seeded_rows())
+
+
+# Per-view performance budgets: (max SQL queries, max wall-clock ms).
+# Tighten a budget by editing its line here. Query counts are always
+# checked; wall-clock times depend on the machine, so they are only
+# checked when PERFORMANCE_TIME_BUDGETS=1 is set in the environment.
+PERFORMANCE_BUDGETS = {
+    'index': (2, 100),
+    'menu': (2, 150),
+    'menu_api': (2, 150),
+    'menu_search': (3, 150),
+    'available_slots': (3, 50),
+    'book_post': (12, 150),
+    'my_reservations': (3, 300),
+    'admin_reservations': (6, 600),
+    'admin_timeslots': (5, 300),
+    'admin_menu_categories': (5, 400),
+    'admin_menu_items': (6, 1500),
+}
+
+
+class PerformanceBudgetTests(TestCase):
+    """Query-count and latency budgets for every view on realistic data."""
+
+    categories = 24
+    items_per_category = 12
+    slots = 30
+    reservations = 100000
+    timing_runs = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = date.today() + timedelta(days=1)
+        seed(
+            seed=9, users=500, slots=cls.slots, capacity=10000,
+            categories=cls.categories,
+            items_per_category=cls.items_per_category,
+            reservations=cls.reservations, days=90, start=cls.day
+        )
+        cls.user = User.objects.filter(username='seed-user-0').get()
+        cls.admin = User.objects.create_superuser(
+            username='budget-admin', email='admin@example.com',
+            password='pass1234'
+        )
+        cls.time_slots = list(TimeSlot.objects.all())
+
+    def setUp(self):
+        cache.clear()
+        # setUpTestData changes never ran their on-commit bump
+        bump_menu_version()
+
+    def assertWithinBudget(self, name, request):
+        """
+        Run ``request`` (a zero-argument callable returning a response)
+        and check it against its entry in PERFORMANCE_BUDGETS.
+        """
+        max_queries, max_ms = PERFORMANCE_BUDGETS[name]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertIn(response.status_code, (200, 302))
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f'{name}: {len(queries)} queries (budget {max_queries})'
+        )
+
+        if os.environ.get('PERFORMANCE_TIME_BUDGETS') != '1':
+            return
+
+        # Best of several runs to keep scheduler noise out of the result
+        timings = []
+        for _ in range(self.timing_runs):
+            cache.clear()
+            started = clock.perf_counter()
+            request()
+            timings.append((clock.perf_counter() - started) * 1000)
+        self.assertLessEqual(
+            min(timings), max_ms,
+            f'{name}: {min(timings):.1f} ms (budget {max_ms} ms)'
+        )
+
+    def test_index(self):
+        self.assertWithinBudget(
+            'index', lambda: self.client.get(reverse('home'))
+        )
+
+    def test_menu(self):
+        self.assertWithinBudget(
+            'menu', lambda: self.client.get(reverse('menu'))
+        )
+
+    def test_menu_api(self):
+        self.assertWithinBudget(
+            'menu_api', lambda: self.client.get(reverse('menu_api'))
+        )
+
+    def test_menu_search(self):
+        self.assertWithinBudget('menu_search', lambda: self.client.get(
+            reverse('menu_search'), {'q': 'risotto', 'free_from': 'nuts'}
+        ))
+
+    def test_available_slots(self):
+        self.client.force_login(self.user)
+        self.assertWithinBudget('available_slots', lambda: self.client.get(
+            reverse('available_slots'), {'date': self.day.isoformat()}
+        ))
+
+    def test_book_post(self):
+        self.client.force_login(self.user)
+        self.assertWithinBudget('book_post', lambda: self.client.post(
+            reverse('book'), {
+                'name': 'Budget', 'email': 'budget@example.com',
+                'phone': '123', 'date': self.day.isoformat(),
+                'time_slot': self.time_slots[0].pk, 'guests': 2,
+            }
+        ))
+
+    def test_my_reservations(self):
+        self.client.force_login(self.user)
+        self.assertWithinBudget('my_reservations', lambda: self.client.get(
+            reverse('my_reservations')
+        ))
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin)
+        for name, url in (
+            ('admin_reservations',
+             'admin:reservations_reservation_changelist'),
+            ('admin_timeslots', 'admin:reservations_timeslot_changelist'),
+            ('admin_menu_categories',
+             'admin:reservations_menucategory_changelist'),
+            ('admin_menu_items', 'admin:reservations_menuitem_changelist'),
+        ):
+            with self.subTest(name):
+                self.assertWithinBudget(
+                    name, lambda: self.client.get(reverse(url))
+                )
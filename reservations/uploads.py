@@ -0,0 +1,253 @@
+"""
+Background uploads for menu item images.
+
+``CloudinaryField`` uploads a new image synchronously while the model is
+saved, so an admin save waits for Cloudinary, and an inline formset with
+several new images waits for each one in turn. Instead, the admin saves
+the item with its previous image and ``image_status='pending'``, and the
+file is handed to a thread pool once the transaction commits. Each upload
+is retried with exponential backoff; the item is then switched to the
+new image (``ready``) or marked ``failed``.
+
+Queued uploads are not durable: the file is held in the worker's memory,
+so a worker restart (``max_requests`` recycling, a deploy, a crash) drops
+its queue and leaves those items ``pending``. :func:`fail_stale_uploads`
+(the ``fail_stale_uploads`` command, run from a scheduler) marks items
+pending for longer than ``MENU_IMAGE_UPLOAD_STALE_MINUTES`` as failed so
+staff can choose the image again.
+
+Uploads go through a backend class named by ``MENU_IMAGE_UPLOAD_BACKEND``
+so tests and local development can use :class:`LocalUploadBackend`
+instead of Cloudinary.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .menu_cache import bump_menu_version
+from .models import MenuItem
+
+logger = logging.getLogger(__name__)
+
+
+class CloudinaryUploadBackend:
+    """Upload to Cloudinary with the options declared on the field."""
+
+    def upload(self, content, name):
+        """
+        Upload one image.
+
+        Returns:
+            str: Value to store in the ``image`` column
+        """
+        from cloudinary import uploader
+
+        field = MenuItem._meta.get_field('image')
+        options = {'type': field.type, 'resource_type': field.resource_type}
+        options.update(field.options)
+        upload = BytesIO(content)
+        upload.name = name
+        return uploader.upload_resource(upload, **options).get_prep_value()
+
+
+class LocalUploadBackend:
+    """
+    Store images on the local disk instead of Cloudinary.
+
+    For tests and offline development. Files are written to
+    ``MENU_IMAGE_LOCAL_UPLOAD_DIR`` and the stored value has the same
+    shape as a Cloudinary one, so the rest of the site is unaware.
+    """
+    _versions = itertools.count(1)
+
+    def upload(self, content, name):
+        directory = getattr(settings, 'MENU_IMAGE_LOCAL_UPLOAD_DIR', None)
+        stem, extension = os.path.splitext(os.path.basename(name))
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, os.path.basename(name)),
+                      'wb') as stored:
+                stored.write(content)
+        version = next(self._versions)
+        return (f'image/upload/v{version}/menu_items/{stem}'
+                f'{extension or ".jpg"}')
+
+
+class ImageUploadQueue:
+    """
+    Thread pool running image uploads outside the request.
+
+    Only the most recent upload for an item may update it, so an older
+    upload that finishes late never replaces a newer image.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = (
+            ThreadPoolExecutor(workers, thread_name_prefix='menu-image')
+            if workers else None
+        )
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._futures = set()
+        self._jobs = itertools.count(1)
+
+    def submit(self, item_id, content, name):
+        """Queue an upload for a menu item (runs inline with 0 workers)."""
+        with self._lock:
+            job = next(self._jobs)
+            self._latest[item_id] = job
+        if self._executor is None:
+            self._run(job, item_id, content, name)
+            return
+        future = self._executor.submit(
+            self._run, job, item_id, content, name
+        )
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+
+    def _discard(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def drain(self, timeout=None):
+        """Wait until every queued upload has finished."""
+        with self._lock:
+            pending = set(self._futures)
+        wait(pending, timeout)
+
+    def _is_latest(self, job, item_id):
+        with self._lock:
+            return self._latest.get(item_id) == job
+
+    def _run(self, job, item_id, content, name):
+        """Upload with retries, then record the outcome on the item."""
+        attempts = getattr(settings, 'MENU_IMAGE_UPLOAD_ATTEMPTS', 3)
+        backoff = getattr(settings, 'MENU_IMAGE_UPLOAD_BACKOFF', 1.0)
+        backend = import_string(getattr(
+            settings, 'MENU_IMAGE_UPLOAD_BACKEND',
+            'reservations.uploads.CloudinaryUploadBackend'
+        ))()
+
+        stored = None
+        for attempt in range(attempts):
+            if not self._is_latest(job, item_id):
+                return
+            try:
+                stored = backend.upload(content, name)
+                break
+            except Exception as e:
+                logger.warning(
+                    f'Image upload for menu item {item_id} failed '
+                    f'(attempt {attempt + 1} of {attempts}): {e}'
+                )
+                if attempt + 1 < attempts:
+                    time.sleep(backoff * 2 ** attempt)
+
+        if not self._is_latest(job, item_id):
+            return
+        try:
+            if stored is None:
+                logger.error(
+                    f'Giving up on image upload for menu item {item_id}'
+                )
+                changes = {'image_status': MenuItem.IMAGE_FAILED}
+            else:
+                changes = {
+                    'image': stored, 'image_status': MenuItem.IMAGE_READY
+                }
+            changes['image_pending_since'] = None
+            # update() bypasses post_save, so start a new menu version here
+            MenuItem.objects.filter(pk=item_id).update(**changes)
+            bump_menu_version()
+        finally:
+            # Pool threads are reused; do not keep a connection open
+            if self._executor is not None:
+                connection.close()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def upload_queue():
+    """Return this process's upload queue, creating it on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ImageUploadQueue(
+                getattr(settings, 'MENU_IMAGE_UPLOAD_WORKERS', 4)
+            )
+        return _queue
+
+
+def save_with_deferred_image(item):
+    """
+    Save a menu item, moving any newly chosen image to the upload queue.
+
+    The item keeps its previous image (if any) and is marked pending
+    until the upload finishes. The upload is queued only once the
+    surrounding transaction commits, so a rolled-back save uploads
+    nothing.
+    """
+    upload = item.image if isinstance(item.image, UploadedFile) else None
+    if upload is None:
+        item.save()
+        return
+
+    upload.seek(0)
+    content = upload.read()
+    name = upload.name
+
+    previous = None
+    if item.pk:
+        previous = MenuItem.objects.filter(pk=item.pk).values_list(
+            'image', flat=True
+        ).first()
+    item.image = previous
+    item.image_status = MenuItem.IMAGE_PENDING
+    item.image_pending_since = timezone.now()
+    item.save()
+
+    item_id = item.pk
+    transaction.on_commit(
+        lambda: upload_queue().submit(item_id, content, name)
+    )
+
+
+def fail_stale_uploads(minutes=None):
+    """
+    Mark images pending for longer than ``minutes`` as failed.
+
+    Their upload was lost with the worker that queued it; a live upload
+    (retries included) finishes well within the default 15 minutes.
+
+    Returns:
+        int: Number of menu items marked failed
+    """
+    if minutes is None:
+        minutes = getattr(settings, 'MENU_IMAGE_UPLOAD_STALE_MINUTES', 15)
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+    # Items left pending before image_pending_since existed have no time
+    failed = MenuItem.objects.filter(
+        Q(image_pending_since__lt=cutoff)
+        | Q(image_pending_since__isnull=True),
+        image_status=MenuItem.IMAGE_PENDING
+    ).update(image_status=MenuItem.IMAGE_FAILED, image_pending_since=None)
+    if failed:
+        logger.error(f'Marked {failed} lost image uploads as failed')
+        bump_menu_version()
+    return failed
@@ -1,27 +1,55 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     reservation_view,
     success_view,
     get_available_slots,
+    get_availability_range,
+    availability_cache_stats_view,
+    metrics_view,
     index,
     my_reservations,
     edit_reservation,
     cancel_reservation,
     edit_profile,
     menu_view,
+    get_menu,
+    search_menu_view,
     about,
     contact
 )
 
+if settings.ASYNC_VIEWS:
+    # Async versions of the read-heavy endpoints, for ASGI workers
+    from .async_views import (  # noqa: F811
+        get_availability_range,
+        get_available_slots,
+        index,
+        menu_view,
+    )
+
 
 urlpatterns = [
     path('', index, name='home'),
     path('book/', reservation_view, name='book'),
     path('book/success/', success_view, name='booking_success'),
     path('api/available-slots/', get_available_slots, name='available_slots'),
+    path(
+        'api/availability/',
+        get_availability_range,
+        name='availability_range'
+    ),
+    path(
+        'api/availability/cache-stats/',
+        availability_cache_stats_view,
+        name='availability_cache_stats'
+    ),
+    path('metrics', metrics_view, name='metrics'),
     path('my-reservations/', my_reservations, name='my_reservations'),
     path('edit-profile/', edit_profile, name='edit_profile'),
     path('menu/', menu_view, name='menu'),
+    path('api/menu/', get_menu, name='menu_api'),
+    path('api/menu/search/', search_menu_view, name='menu_search'),
     path(
         'edit-reservation/<int:reservation_id>/',
         edit_reservation,
@@ -2,13 +2,36 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
 from datetime import datetime
 from django.contrib import messages
+from django.core.exceptions import NON_FIELD_ERRORS
 from .forms import ReservationForm, UserProfileForm
-from .models import TimeSlot, Reservation, MenuCategory, MenuItem
-from django.http import JsonResponse
+from .models import Reservation, MenuCategory, MenuItem
+from .availability import (
+    MAX_RANGE_DAYS,
+    availability_cache_stats,
+    availability_range,
+    cached_available_slots,
+)
+from . import metrics
+from .conditional import availability_api, menu_api, menu_page
+from .menu_cache import (
+    MENU_API_FIELDS,
+    homepage_snapshot,
+    menu_api_items,
+    menu_api_payload,
+    menu_cache_timeout,
+    menu_version,
+)
+from .occupancy import SlotCapacityError, save_reservation
+from .search import parse_allergens, search_menu
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 from django.db import models
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
 from django.views.generic import TemplateView
 
 
@@ -16,35 +39,25 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+@menu_page
 def index(request):
+    """
+    Display the homepage with featured dishes from each menu category.
+
+    The featured menu preview is a snapshot rebuilt only when the menu
+    changes (see ``reservations.menu_cache.homepage_snapshot``).
+    Revalidation requests get a 304 while the menu version is unchanged.
+    """
     try:
-        logger.info("Index view started")  # This will appear in logs
-        
-        # Get categories with their featured menu items
-        categories = MenuCategory.objects.prefetch_related(
-            models.Prefetch(
-                'menu_items',
-                queryset=MenuItem.objects.filter(
-                    is_available=True,
-                    is_featured=True
-                )[:3],
-                to_attr='featured_items'
-            )
-        ).all()
-
-        logger.info(f"Found {len(categories)} categories")
-        
-        context = {
-            'menu_categories': categories,
-        }
-        return render(request, 'index.html', context)
-        
+        categories = homepage_snapshot()
     except Exception as e:
         # This will log the error even when DEBUG=False
         logger.error(f"CRITICAL ERROR in index view: {str(e)}", exc_info=True)
-        
+
         # Return a safe fallback
-        return render(request, 'index.html', {'menu_categories': []})
+        categories = []
+
+    return render(request, 'index.html', {'categories': categories})
 
 
 def about(request):
@@ -83,43 +96,39 @@ def reservation_view(request):
                 else:
                     reservation.user = None  # Allow anonymous bookings
 
-                # Calculate total guests already booked for this time slot
-                existing_bookings = Reservation.objects.filter(
-                    date=reservation.date,
-                    time_slot=reservation.time_slot,
-                    is_cancelled=False
-                )
-                total_booked_guests = sum(
-                    booking.guests for booking in existing_bookings
-                )
-
-                # Check if new booking would exceed time slot capacity
-                max_capacity = reservation.time_slot.max_capacity
-                if total_booked_guests + reservation.guests > max_capacity:
-                    # Calculate remaining spots and show error message
-                    remaining = max_capacity - total_booked_guests
-                    messages.error(request, f'Only {remaining} guest spots left in this time. Please choose another time or reduce your party.')
+                # Claim seats in the occupancy ledger and save atomically;
+                # concurrent bookings for the same slot are serialised
+                try:
+                    save_reservation(reservation)
+                except SlotCapacityError as error:
+                    metrics.record_booking('capacity_rejected')
+                    # Show remaining spots in the error message
+                    messages.error(request, f'Only {error.remaining} guest spots left in this time. Please choose another time or reduce your party.')
 
                     return render(request, 'reservations/book.html', {
                         'form': form,
                         'page_title': 'Book a Table'
                     })
 
-                # Save reservation to database
-                reservation.save()
-
                 # Store reservation ID in session for anonymous users
                 if not request.user.is_authenticated:
                     request.session['last_reservation_id'] = reservation.id
 
+                metrics.record_booking('success')
                 messages.success(request, 'Reservation confirmed!')
                 return redirect('booking_success')
 
             except Exception as e:
+                metrics.record_booking('error')
                 # Handle any database or other errors during reservation
                 error_msg = f'Error saving reservation: {str(e)}'
                 messages.error(request, error_msg)
         else:
+            # The form also rejects slots that are already full
+            metrics.record_booking(
+                'capacity_rejected' if form.has_error(NON_FIELD_ERRORS, 'full')
+                else 'invalid'
+            )
             # Display form validation errors
             for field, errors in form.errors.items():
                 for error in errors:
@@ -183,6 +192,7 @@ def success_view(request):
 
 
 @login_required
+@availability_api
 def get_available_slots(request):
     """
     API endpoint to get available time slots for a specific date.
@@ -192,6 +202,10 @@ def get_available_slots(request):
     - Whether slot is available
     - Number of remaining spots
 
+    The response carries an ETag from the availability cache tokens, so
+    the booking page's repeat requests are answered with 304 until a
+    booking or time slot change touches the date.
+
     Args:
         request: HTTP request object with 'date' parameter
 
@@ -209,50 +223,105 @@ def get_available_slots(request):
             status=400
         )
 
-    # Get all active time slots ordered by start time
-    time_slots = TimeSlot.objects.filter(
-        is_active=True
-    ).order_by('start_time')
+    # Remaining capacity for every active slot, served from the per-date
+    # cache until a reservation or time slot change invalidates it
+    available_slots = cached_available_slots(selected_date)
 
-    available_slots = []
+    return JsonResponse({'available_slots': available_slots})
 
-    for slot in time_slots:
-        # Calculate total guests already booked for this time slot
-        existing_bookings = Reservation.objects.filter(
-            date=selected_date,
-            time_slot=slot,
-            is_cancelled=False
-        )
 
-        # Sum up all guests from existing bookings
-        total_booked_guests = sum(
-            booking.guests for booking in existing_bookings
-        )
+@login_required
+def get_availability_range(request):
+    """
+    API endpoint returning remaining capacity for a range of dates.
 
-        # Calculate remaining capacity
-        remaining_capacity = slot.max_capacity - total_booked_guests
+    The response is a compact matrix rather than per-slot objects:
+    - ``slots``: ``[id, display_name, max_capacity]`` for each active slot
+    - ``dates``: ISO dates from ``start`` to ``end`` inclusive
+    - ``remaining``: one row per date, one value per slot
 
-        # Ensure remaining capacity doesn't go below 0
-        remaining_capacity = max(0, remaining_capacity)
+    Args:
+        request: HTTP request object with 'start' and 'end' parameters
 
-        # Build slot data for JSON response
-        slot_data = {
-            'id': slot.id,
-            'display_name': slot.display_name,
-            'available': remaining_capacity > 0,
-            'remaining_slots': remaining_capacity
-        }
+    Returns:
+        JsonResponse: Availability matrix or error message
+    """
+    try:
+        start, end = availability_range_params(request)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
 
-        available_slots.append(slot_data)
+    return JsonResponse(availability_range(start, end))
 
-    return JsonResponse({'available_slots': available_slots})
+
+def availability_range_params(request):
+    """
+    Parse and check the ``start`` and ``end`` range API parameters.
+
+    Args:
+        request: HTTP request object with 'start' and 'end' parameters
+
+    Returns:
+        tuple: ``(start, end)`` dates
+
+    Raises:
+        ValueError: With the error message to return to the client
+    """
+    try:
+        start = datetime.strptime(request.GET.get('start'), '%Y-%m-%d').date()
+        end = datetime.strptime(request.GET.get('end'), '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        raise ValueError('Invalid date format. Expected YYYY-MM-DD')
+
+    if end < start:
+        raise ValueError('End date must not be before start date')
+
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f'Range cannot exceed {MAX_RANGE_DAYS} days')
+
+    return start, end
+
+
+@staff_member_required
+def availability_cache_stats_view(request):
+    """
+    Staff-only endpoint reporting availability cache hits and misses.
+
+    Returns:
+        JsonResponse: Hit and miss counters plus the hit ratio
+    """
+    return JsonResponse(availability_cache_stats())
+
+
+@never_cache
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint (see ``reservations.metrics``).
+
+    Returns 404 unless ``METRICS_ENABLED`` is set. When ``METRICS_TOKEN``
+    is set, scrapers must send it as ``Authorization: Bearer <token>``.
+
+    Returns:
+        HttpResponse: Metrics in the Prometheus text format
+    """
+    if not metrics.enabled():
+        raise Http404
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponse('Unauthorized', status=401)
+    return HttpResponse(
+        metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
 
 
 @login_required
 def my_reservations(request):
     reservations = Reservation.objects.filter(
         user=request.user
-    ).order_by('-date', 'time_slot__start_time')
+    ).select_related('time_slot').order_by('-date', 'time_slot__start_time')
 
     return render(request, 'reservations/my_reservations.html', {
         'reservations': reservations
@@ -295,49 +364,29 @@ def edit_reservation(request, reservation_id):
                 # Create reservation instance without saving to database yet
                 updated_reservation = form.save(commit=False)
 
-                # Check if time slot or date has changed
-                if (
-                    updated_reservation.date != reservation.date or
-                    updated_reservation.time_slot != reservation.time_slot
-                ):
-
-                    # Calculate total guests already booked for this time slot
-                    existing_bookings = Reservation.objects.filter(
-                        date=updated_reservation.date,
-                        time_slot=updated_reservation.time_slot,
-                        is_cancelled=False
-                    ).exclude(id=reservation.id)  # Exclude current reservation
-
-                    total_booked_guests = sum(
-                        booking.guests for booking in existing_bookings
+                # Move the reservation's guests in the occupancy ledger and
+                # save atomically; the stored booking is excluded from the
+                # capacity check because its own seats are released
+                try:
+                    save_reservation(updated_reservation)
+                except SlotCapacityError as error:
+                    # Show remaining spots in the error message
+                    error_msg = (
+                        f'Only {error.remaining} guest spots left in this '
+                        'time. Please choose another time or reduce your '
+                        'party.'
+                    )
+                    messages.error(request, error_msg)
+
+                    return render(
+                        request,
+                        'reservations/edit_reservation.html',
+                        {
+                            'form': form,
+                            'reservation': reservation,
+                            'page_title': 'Edit Reservation'
+                        }
                     )
-
-                    # Check if new booking would exceed time slot capacity
-                    max_capacity = updated_reservation.time_slot.max_capacity
-                    if (
-                        total_booked_guests + updated_reservation.guests
-                        > max_capacity
-                    ):
-                        # Calculate remaining spots and show error message
-                        remaining = max_capacity - total_booked_guests
-                        error_msg = (
-                            f'Only {remaining} guest spots left in this time. '
-                            'Please choose another time or reduce your party.'
-                        )
-                        messages.error(request, error_msg)
-
-                        return render(
-                            request,
-                            'reservations/edit_reservation.html',
-                            {
-                                'form': form,
-                                'reservation': reservation,
-                                'page_title': 'Edit Reservation'
-                            }
-                        )
-
-                # Save reservation to database
-                updated_reservation.save()
 
                 messages.success(request, 'Reservation updated successfully!')
                 return redirect('my_reservations')
@@ -373,7 +422,8 @@ def cancel_reservation(request, reservation_id):
 
     if not reservation.is_cancelled:
         reservation.is_cancelled = True
-        reservation.save()
+        # Releases the reservation's guests from the occupancy ledger
+        save_reservation(reservation)
         messages.success(
             request,
             'Your reservation has been cancelled successfully.'
@@ -419,16 +469,162 @@ def edit_profile(request):
     })
 
 
-def menu_view(request):
-    categories = MenuCategory.objects.prefetch_related('menu_items').all()
+def menu_categories():
+    """
+    Return the menu page's categories, not yet evaluated.
 
-    # Only show available menu items
-    for category in categories:
-        category.available_items = (
-            category.menu_items.filter(is_available=True)
+    Only available items are shown, loaded for all categories at once.
+    """
+    return MenuCategory.objects.prefetch_related(
+        models.Prefetch(
+            'menu_items',
+            queryset=MenuItem.objects.filter(
+                is_available=True
+            ).order_by('order', 'name'),
+            to_attr='available_items'
         )
+    )
+
+
+@menu_page
+def menu_view(request):
+    """
+    Display the full menu.
+
+    The categories queryset is left unevaluated: the template renders it
+    inside a fragment cached under the current menu version, so the two
+    menu queries only run when the menu has changed.
+    Requests carrying the current ETag get a 304 without rendering at all
+    (see ``reservations.conditional``).
 
+    Args:
+        request: HTTP request object
+
+    Returns:
+        HttpResponse: Rendered menu page
+    """
     context = {
-        'categories': categories,
+        'categories': menu_categories(),
+        'menu_version': menu_version(),
+        'menu_cache_timeout': menu_cache_timeout(),
     }
     return render(request, 'reservations/menu.html', context)
+
+
+@menu_api
+def get_menu(request):
+    """
+    Public read-only API returning the menu as JSON.
+
+    Query parameters (all optional):
+    - ``fields``: comma-separated item fields to return
+    - ``category``: comma-separated category ids to restrict items to
+    - ``available``: ``true`` or ``false`` to filter on availability
+
+    The serialized response is cached per menu version and carries an
+    ETag, so polling clients are answered with 304 until the menu changes.
+
+    Args:
+        request: HTTP request object
+
+    Returns:
+        HttpResponse: JSON menu payload, or JsonResponse error message
+    """
+    fields = MENU_API_FIELDS
+    if request.GET.get('fields'):
+        fields = [
+            field.strip() for field in request.GET['fields'].split(',')
+            if field.strip()
+        ]
+        unknown = sorted(set(fields) - set(MENU_API_FIELDS))
+        if unknown:
+            return JsonResponse(
+                {'error': f'Unknown fields: {", ".join(unknown)}'},
+                status=400
+            )
+
+    categories = None
+    if request.GET.get('category'):
+        try:
+            categories = [
+                int(category)
+                for category in request.GET['category'].split(',')
+            ]
+        except ValueError:
+            return JsonResponse(
+                {'error': 'category must be a comma-separated list of ids'},
+                status=400
+            )
+
+    try:
+        available = _bool_param(request, 'available')
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    payload = menu_api_payload(fields, categories, available)
+    return HttpResponse(payload, content_type='application/json')
+
+
+# Most results returned by the menu search API
+MAX_SEARCH_RESULTS = 200
+
+
+@menu_api
+def search_menu_view(request):
+    """
+    Public API searching menu items by text, ingredient and allergen.
+
+    Query parameters (all optional):
+    - ``q``: words matched against name, description, ingredients and
+      allergens
+    - ``ingredient``: comma-separated ingredients every item must contain
+    - ``free_from``: comma-separated allergens to exclude
+    - ``available``: ``true`` or ``false`` to filter on availability
+    - ``limit``: number of results (default 50, at most 200)
+
+    Args:
+        request: HTTP request object
+
+    Returns:
+        JsonResponse: ``count`` of matches and the best ``items``
+    """
+    try:
+        free_from = parse_allergens(request.GET.get('free_from'))
+        available = _bool_param(request, 'available')
+        limit = int(request.GET.get('limit', 50))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+
+    ingredients = [
+        ingredient.strip()
+        for ingredient in request.GET.get('ingredient', '').split(',')
+        if ingredient.strip()
+    ]
+
+    ids = search_menu(
+        request.GET.get('q', ''), ingredients, free_from, available
+    )
+
+    return JsonResponse({
+        'count': len(ids),
+        'items': menu_api_items(ids[:limit]),
+    })
+
+
+def _bool_param(request, name):
+    """
+    Read an optional ``true``/``false`` query parameter.
+
+    Returns:
+        bool or None: None when the parameter is absent
+
+    Raises:
+        ValueError: If the parameter has any other value
+    """
+    value = request.GET.get(name)
+    if value is None:
+        return None
+    if value.lower() not in ('true', 'false'):
+        raise ValueError(f'{name} must be true or false')
+    return value.lower() == 'true'
@@ -3,6 +3,14 @@ ASGI config for savouryheaven project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with uvicorn workers under gunicorn (see ``gunicorn_asgi.py``)::
+
+    gunicorn savouryheaven.asgi -c savouryheaven/gunicorn_asgi.py
+
+The read-heavy endpoints have async versions (``reservations.async_views``)
+that are only used with ``ASYNC_VIEWS=1``; measure with the
+``bench_asgi`` command before turning them on.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
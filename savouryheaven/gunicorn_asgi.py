@@ -0,0 +1,50 @@
+"""
+Gunicorn settings for serving savouryheaven.asgi with uvicorn workers.
+
+    gunicorn savouryheaven.asgi -c savouryheaven/gunicorn_asgi.py
+
+Each worker is one event loop; with ``ASYNC_VIEWS=1`` a worker holds
+many slow requests (waiting on the cache) at once instead of one per
+thread.
+Settings can be overridden from the environment.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# One event loop per core is enough; more mainly adds database connections
+workers = int(os.environ.get(
+    'WEB_CONCURRENCY', multiprocessing.cpu_count() + 1
+))
+
+# Requests that take longer are almost always stuck
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+
+# Restart workers now and then to bound memory growth
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    # Only workers serve requests, so only they run the prewarm thread
+    from reservations.prewarm import start_prewarmer
+
+    start_prewarmer()
+
+
+def child_exit(server, worker):
+    # Fold the exited worker's metrics into one file, so METRICS_DIR does
+    # not grow with every recycled worker
+    directory = os.environ.get('METRICS_DIR')
+    if directory:
+        from reservations.metrics import merge_exited_worker
+
+        merge_exited_worker(directory, worker.pid)
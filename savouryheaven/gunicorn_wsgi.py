@@ -0,0 +1,23 @@
+"""
+Gunicorn settings for serving savouryheaven.wsgi (see the Procfile).
+
+    gunicorn savouryheaven.wsgi -c savouryheaven/gunicorn_wsgi.py
+"""
+import os
+
+
+def post_worker_init(worker):
+    # Only workers serve requests, so only they run the prewarm thread
+    from reservations.prewarm import start_prewarmer
+
+    start_prewarmer()
+
+
+def child_exit(server, worker):
+    # Fold the exited worker's metrics into one file, so METRICS_DIR does
+    # not grow with every recycled worker
+    directory = os.environ.get('METRICS_DIR')
+    if directory:
+        from reservations.metrics import merge_exited_worker
+
+        merge_exited_worker(directory, worker.pid)
@@ -4,6 +4,7 @@ Django settings for savouryheaven project.
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 from decouple import config
 import dj_database_url
@@ -49,8 +50,54 @@ LOGGING = {
         'handlers': ['console'],
         'level': 'WARNING',
     },
+    'loggers': {
+        # One JSON line per request from RequestTimingMiddleware
+        'reservations.timing': {
+            'level': 'INFO',
+        },
+    },
 }
 
+# Per-request SQL/template/view timing (a log line, and a Server-Timing
+# header for staff). Off by default; when off the middleware is removed
+# at startup.
+REQUEST_TIMING_ENABLED = os.environ.get('REQUEST_TIMING_ENABLED') == '1'
+# Requests slower than this (ms) are logged as warnings with their
+# SLOW_REQUEST_QUERY_COUNT slowest queries
+SLOW_REQUEST_THRESHOLD_MS = int(
+    os.environ.get('SLOW_REQUEST_THRESHOLD_MS', 500)
+)
+SLOW_REQUEST_QUERY_COUNT = 5
+# The Server-Timing header goes to staff users only unless this is set
+SERVER_TIMING_PUBLIC = os.environ.get('SERVER_TIMING_PUBLIC') == '1'
+
+# Prometheus-style /metrics endpoint (reservations.metrics). With several
+# worker processes, point METRICS_DIR at a directory they share so a
+# scrape adds up every worker. Scrapers must send METRICS_TOKEN as a
+# bearer token when it is set.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_FLUSH_INTERVAL = 1.0
+
+# Staff can profile a single request with ?profile=cprofile|sample (or an
+# X-Profile header) when this is on; captures are listed in the admin
+# under /admin/profiles/ (reservations.profiling)
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+# Outside the source tree by default, so captures are never committed
+PROFILING_DIR = os.environ.get(
+    'PROFILING_DIR',
+    os.path.join(tempfile.gettempdir(), 'savouryheaven-profiles')
+)
+PROFILING_KEEP = 50
+PROFILING_SAMPLE_INTERVAL = 0.001
+
+# Route the homepage, menu and availability APIs to their async versions
+# (reservations.async_views) under ASGI. Off by default: their template
+# rendering and ORM calls still share one thread per worker, so turn it
+# on only when the bench_asgi command shows a gain on your deployment.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS') == '1'
+
 # -------------------------------------------------------------------
 # APPLICATIONS
 # -------------------------------------------------------------------
@@ -81,6 +128,9 @@ INSTALLED_APPS = [
 # -------------------------------------------------------------------
 
 MIDDLEWARE = [
+    # First, so its total covers every other middleware
+    'reservations.middleware.RequestTimingMiddleware',
+    'reservations.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -90,7 +140,11 @@ MIDDLEWARE = [
     # Required for allauth (Django 5+)
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    # Needs request.user, so it comes after AuthenticationMiddleware
+    'reservations.middleware.ProfilingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Last, so the view time starts after every process_view hook
+    'reservations.middleware.ViewTimingMiddleware',
 ]
 
 # -------------------------------------------------------------------
@@ -136,6 +190,72 @@ DATABASES = {
     )
 }
 
+# -------------------------------------------------------------------
+# CACHING
+# -------------------------------------------------------------------
+
+# Local-memory cache per worker by default; set REDIS_URL to share one
+# cache (and its invalidations) between all gunicorn workers
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'savouryheaven',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Serialized /api/menu/ responses, one per distinct query string. They
+# get their own small per-process cache so public callers cycling through
+# parameters cannot evict the version and availability keys above.
+CACHES['menu_api'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'savouryheaven-menu-api',
+    'OPTIONS': {'MAX_ENTRIES': 500},
+}
+MENU_API_CACHE_ALIAS = 'menu_api'
+
+# Cache alias and lifetime (seconds) for per-date slot availability
+AVAILABILITY_CACHE_ALIAS = 'default'
+AVAILABILITY_CACHE_TIMEOUT = 600
+# Seconds a per-process (local-memory) cache trusts its availability
+# before recomputing, since it never sees other workers' bookings; with a
+# shared cache every booking invalidates the cached dates directly
+AVAILABILITY_LOCAL_TOKEN_TTL = 5
+
+# Single-flight recomputation: how long one worker may hold the recompute
+# lock, and how long others wait for it when no stale value is cached
+AVAILABILITY_RECOMPUTE_LOCK_TIMEOUT = 10
+AVAILABILITY_RECOMPUTE_WAIT = 0.5
+
+# Cache alias and lifetime (seconds) for data derived from the menu; entries
+# are keyed by menu version, so they never need to expire for correctness
+MENU_CACHE_ALIAS = 'default'
+MENU_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Seconds a per-process (local-memory) cache keeps the menu version
+# before re-reading it from the database; with a shared cache every
+# change updates the cached version directly
+MENU_VERSION_LOCAL_TTL = 1
+
+# How long (seconds) shared caches and browsers may reuse anonymous menu
+# and homepage responses before revalidating them with their ETag
+PUBLIC_PAGE_MAX_AGE = 60
+
+# Days of availability kept warm by the warm_availability command and the
+# optional in-process prewarm thread (enabled by a non-zero interval)
+AVAILABILITY_PREWARM_DAYS = 14
+AVAILABILITY_PREWARM_INTERVAL = int(
+    os.environ.get('AVAILABILITY_PREWARM_INTERVAL', 0)
+)
+
 # -------------------------------------------------------------------
 # PASSWORD VALIDATION
 # -------------------------------------------------------------------
@@ -224,6 +344,25 @@ CLOUDINARY_STORAGE = {
 # Use Cloudinary for media files
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Menu item images chosen in the admin are uploaded by a background thread
+# pool once the save commits (see reservations.uploads). Failed uploads are
+# retried with exponential backoff starting at MENU_IMAGE_UPLOAD_BACKOFF
+# seconds. Set the backend to reservations.uploads.LocalUploadBackend to
+# work offline.
+MENU_IMAGE_UPLOAD_BACKEND = 'reservations.uploads.CloudinaryUploadBackend'
+MENU_IMAGE_UPLOAD_WORKERS = 4
+MENU_IMAGE_UPLOAD_ATTEMPTS = 3
+MENU_IMAGE_UPLOAD_BACKOFF = 1.0
+# Queued uploads live in the worker's memory and are lost if it restarts;
+# the fail_stale_uploads command marks items still pending after this many
+# minutes as failed
+MENU_IMAGE_UPLOAD_STALE_MINUTES = 15
+
+# Guest emails for bulk cancellations and moves are sent as one batch over
+# a single connection by a background worker once the change commits (see
+# reservations.notifications). 0 workers sends inline after the commit.
+RESERVATION_EMAIL_WORKERS = 1
+
 # -------------------------------------------------------------------
 # MEDIA FILES
 # -------------------------------------------------------------------
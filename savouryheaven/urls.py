@@ -3,7 +3,23 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from reservations.admin import (
+    profile_capture_file_view,
+    profile_captures_view,
+)
+
 urlpatterns = [
+    # Staff-only pages added to the admin (before its catch-all URLs)
+    path(
+        'admin/profiles/',
+        admin.site.admin_view(profile_captures_view),
+        name='admin_profiles'
+    ),
+    path(
+        'admin/profiles/<str:name>',
+        admin.site.admin_view(profile_capture_file_view),
+        name='admin_profile_file'
+    ),
     path('admin/', admin.site.urls),
     path('', include('reservations.urls')),
     path('accounts/', include('allauth.urls')),